@@ -0,0 +1,48 @@
+"""unique wallet per currency
+
+Revision ID: 3f1c2a9b7d10
+Revises:
+Create Date: 2026-10-18 20:15:00.000000
+
+"""
+from alembic import op
+
+
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TEMPORARY TABLE wallet_keepers ON COMMIT DROP AS
+        SELECT user_id, currency, min(id) AS id,
+               sum(available_balance) AS available_balance, sum(locked_balance) AS locked_balance
+        FROM wallets
+        GROUP BY user_id, currency
+        HAVING count(*) > 1
+    """)
+    op.execute("""
+        UPDATE transactions t
+        SET wallet_id = k.id
+        FROM wallets w
+        JOIN wallet_keepers k ON k.user_id = w.user_id AND k.currency = w.currency
+        WHERE t.wallet_id = w.id AND w.id <> k.id
+    """)
+    op.execute("""
+        UPDATE wallets w
+        SET available_balance = k.available_balance, locked_balance = k.locked_balance
+        FROM wallet_keepers k
+        WHERE w.id = k.id
+    """)
+    op.execute("""
+        DELETE FROM wallets w
+        USING wallet_keepers k
+        WHERE w.user_id = k.user_id AND w.currency = k.currency AND w.id <> k.id
+    """)
+    op.create_unique_constraint("uq_wallets_user_currency", "wallets", ["user_id", "currency"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_wallets_user_currency", "wallets", type_="unique")
@@ -0,0 +1,51 @@
+"""ledger entries
+
+Revision ID: 8b4e6d2f1a37
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '8b4e6d2f1a37'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ledger_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("posting_id", sa.String(length=40), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("currency", sa.String(length=10), nullable=False),
+        sa.Column("account", sa.String(length=16), nullable=False),
+        sa.Column("amount", sa.Numeric(18, 8), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+    )
+    op.create_index("ix_ledger_entries_account", "ledger_entries", ["user_id", "currency", "id"])
+    op.add_column("wallets", sa.Column("ledger_entry_id", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute("""
+        INSERT INTO ledger_entries (posting_id, user_id, currency, account, amount, type)
+        SELECT 'opening-' || w.id, legs.user_id, w.currency, legs.account, legs.amount, 'opening'
+        FROM wallets w
+        CROSS JOIN LATERAL (VALUES
+            (w.user_id, 'available', w.available_balance),
+            (w.user_id, 'locked', w.locked_balance),
+            (NULL::integer, 'external', -(w.available_balance + w.locked_balance))
+        ) AS legs (user_id, account, amount)
+        WHERE legs.amount <> 0
+        ORDER BY w.id
+    """)
+    op.execute("UPDATE wallets SET ledger_entry_id = (SELECT coalesce(max(id), 0) FROM ledger_entries)")
+
+
+def downgrade() -> None:
+    op.drop_column("wallets", "ledger_entry_id")
+    op.drop_index("ix_ledger_entries_account", table_name="ledger_entries")
+    op.drop_table("ledger_entries")
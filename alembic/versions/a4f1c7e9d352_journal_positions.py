@@ -0,0 +1,28 @@
+"""journal positions
+
+Revision ID: a4f1c7e9d352
+Revises: e2d8b6c4a931
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a4f1c7e9d352'
+down_revision = 'e2d8b6c4a931'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "journal_positions",
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("lsn", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("name")
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("journal_positions")
@@ -0,0 +1,32 @@
+"""history pagination indexes
+
+Revision ID: c5a7e9f3b214
+Revises: 8b4e6d2f1a37
+Create Date: 2026-10-18 22:30:00.000000
+
+"""
+from alembic import op
+
+
+revision = 'c5a7e9f3b214'
+down_revision = '8b4e6d2f1a37'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_orders_user_created", "orders", ["user_id", "created_at", "id"]),
+    ("ix_trades_user_executed", "trades", ["user_id", "executed_at", "id"]),
+    ("ix_transactions_user_created", "transactions", ["user_id", "created_at", "id"]),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,23 @@
+"""wallet import admins
+
+Revision ID: e2d8b6c4a931
+Revises: c5a7e9f3b214
+Create Date: 2026-10-18 23:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'e2d8b6c4a931'
+down_revision = 'c5a7e9f3b214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("is_admin", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "is_admin")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, File, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict
+from app.core.database import get_db
+from app.api.auth import get_current_admin
+from app.models.user import User
+from app.services.wallet_import import wallet_import_service
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.post("/wallets/import")
+async def import_wallet_balances(
+    file: UploadFile = File(...),
+    format: str = "csv",
+    type: str = "adjustment",
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+) -> Dict:
+    return await wallet_import_service.import_file(file.file, format, type, db)
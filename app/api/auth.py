@@ -7,10 +7,14 @@ from typing import Optional
 from app.core.database import get_db
 from app.core.security import verify_password, get_password_hash, create_access_token, verify_token
 from app.models.user import User
+from app.core.metrics import latency_metrics
+import time
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 security = HTTPBearer()
 
+AUTH_LATENCY = latency_metrics.histogram("auth")
+
 
 class UserCreate(BaseModel):
     email: str
@@ -91,6 +95,7 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
 ):
+    started = time.perf_counter_ns()
     token = credentials.credentials
     payload = verify_token(token)
     user_id = payload.get("sub")
@@ -110,9 +115,19 @@ async def get_current_user(
             detail="User not found"
         )
     
+    AUTH_LATENCY.since(started)
     return user
 
 
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return UserResponse(
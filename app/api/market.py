@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from typing import List, Dict, Optional
 from app.services.market_data import market_data_service
+from app.services.trade_tape import trade_tape
+from app.api.trading import Symbol
 
 router = APIRouter(prefix="/market", tags=["market"])
 
@@ -20,6 +22,11 @@ async def get_historical_data(symbol: str, limit: int = 100) -> List[Dict]:
     return await market_data_service.get_historical_data(symbol, limit)
 
 
+@router.get("/trades/{symbol}")
+async def get_recent_trades(symbol: Symbol, limit: int = 50) -> List[Dict]:
+    return trade_tape.recent(symbol, limit)
+
+
 @router.get("/symbols")
 async def get_symbols() -> List[str]:
     return ["BTCUSDT", "ETHUSDT", "ADAUSDT", "DOTUSDT"]
\ No newline at end of file
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+from typing import Dict
+from app.api.auth import get_current_admin
+from app.models.user import User
+from app.core.metrics import latency_metrics, merge_histograms
+from app.services.trading_engine import trading_engine
+from app.services.balance_cache import balance_cache
+import time
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/latency")
+async def get_latency_metrics(reset: bool = False, current_user: User = Depends(get_current_admin)) -> Dict:
+    started_at, histograms = latency_metrics.collect(reset)
+    
+    for remote in await trading_engine.collect_remote_metrics(reset):
+        merge_histograms(histograms, remote)
+    
+    return {
+        "interval_started_at": started_at,
+        "interval_seconds": round(time.time() - started_at, 3),
+        "stages": {stage: histograms[stage].snapshot() for stage in sorted(histograms)}
+    }
+
+
+@router.get("/balance-cache")
+async def get_balance_cache_metrics(current_user: User = Depends(get_current_admin)) -> Dict:
+    return balance_cache.stats()
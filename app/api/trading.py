@@ -1,25 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from pydantic import BaseModel
+from sqlalchemy import select
+from pydantic import BaseModel, condecimal, constr
 from decimal import Decimal
+from datetime import datetime, timezone
 from typing import List, Optional
 from app.core.database import get_db
+from app.core.config import settings
 from app.api.auth import get_current_user
 from app.models.user import User
 from app.models.trading import Order, Trade, OrderType, OrderSide, OrderStatus
+from app.models.wallet import Wallet
 from app.services.trading_engine import trading_engine
+from app.services.trade_journal import JournalHaltedError
+from app.services.order_ids import order_ids
+from app.services.idempotency import idempotency_store
+from app.core.metrics import latency_metrics
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, set_next_cursor, split_page
+import time
 
 router = APIRouter(prefix="/trading", tags=["trading"])
 
+VALIDATION_LATENCY = latency_metrics.histogram("validation")
+ORDER_LATENCY = latency_metrics.histogram("place_order")
+ORDER_AMOUNT_TYPE = Order.__table__.c.quantity.type
+MAX_SYMBOL_LENGTH = min(Order.__table__.c.symbol.type.length, 3 + Wallet.__table__.c.currency.type.length)
+OrderAmount = condecimal(
+    gt=0,
+    lt=Decimal(10) ** (ORDER_AMOUNT_TYPE.precision - ORDER_AMOUNT_TYPE.scale),
+    decimal_places=ORDER_AMOUNT_TYPE.scale
+)
+Symbol = constr(
+    strip_whitespace=True,
+    to_upper=True,
+    min_length=4,
+    max_length=MAX_SYMBOL_LENGTH,
+    pattern=r"^[A-Za-z0-9]+$"
+)
+
 
 class OrderCreate(BaseModel):
-    symbol: str
+    symbol: Symbol
     order_type: OrderType
     side: OrderSide
-    quantity: Decimal
-    price: Optional[Decimal] = None
-    stop_price: Optional[Decimal] = None
+    quantity: OrderAmount
+    price: Optional[OrderAmount] = None
+    stop_price: Optional[OrderAmount] = None
 
 
 class OrderResponse(BaseModel):
@@ -35,6 +61,29 @@ class OrderResponse(BaseModel):
     created_at: str
 
 
+class OpenOrderResponse(BaseModel):
+    id: int
+    symbol: str
+    order_type: str
+    side: str
+    status: str
+    quantity: Decimal
+    price: Optional[Decimal]
+    stop_price: Optional[Decimal]
+    filled_quantity: Decimal
+    remaining_quantity: Decimal
+
+
+class OrderBatchCreate(BaseModel):
+    orders: List[OrderCreate]
+
+
+class OrderBatchResult(BaseModel):
+    index: int
+    order: Optional[OrderResponse] = None
+    error: Optional[str] = None
+
+
 class TradeResponse(BaseModel):
     id: int
     symbol: str
@@ -47,49 +96,41 @@ class TradeResponse(BaseModel):
 
 class OrderBookResponse(BaseModel):
     symbol: str
+    sequence: int
     bids: List[dict]
     asks: List[dict]
     best_bid: float
     best_ask: float
 
 
-@router.post("/orders", response_model=OrderResponse)
-async def place_order(
-    order_data: OrderCreate,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
-):
+def validate_order_data(order_data: OrderCreate) -> Optional[str]:
     if order_data.order_type in [OrderType.LIMIT, OrderType.STOP_LOSS, OrderType.TAKE_PROFIT]:
         if order_data.price is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Price is required for limit orders"
-            )
-    
-    order = Order(
-        user_id=current_user.id,
+            return "Price is required for limit orders"
+    if order_data.order_type in [OrderType.STOP_LOSS, OrderType.TAKE_PROFIT]:
+        if order_data.stop_price is None:
+            return "Stop price is required for stop orders"
+    return None
+
+
+def build_order(order_id: int, user_id: int, order_data: OrderCreate) -> Order:
+    return Order(
+        id=order_id,
+        user_id=user_id,
         symbol=order_data.symbol,
         order_type=order_data.order_type,
         side=order_data.side,
+        status=OrderStatus.PENDING,
         quantity=order_data.quantity,
         price=order_data.price,
         stop_price=order_data.stop_price,
-        remaining_quantity=order_data.quantity
+        filled_quantity=Decimal("0"),
+        remaining_quantity=order_data.quantity,
+        created_at=datetime.now(timezone.utc)
     )
-    
-    db.add(order)
-    await db.commit()
-    await db.refresh(order)
-    
-    try:
-        trades = await trading_engine.place_order(order, db)
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Order processing failed: {str(e)}"
-        )
-    
+
+
+def order_to_response(order: Order) -> OrderResponse:
     return OrderResponse(
         id=order.id,
         symbol=order.symbol,
@@ -104,34 +145,147 @@ async def place_order(
     )
 
 
+@router.post("/orders", response_model=OrderResponse)
+async def place_order(
+    order_data: OrderCreate,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotency_store.execute(
+        current_user.id, "place_order", idempotency_key, order_data,
+        lambda: submit_order(order_data, current_user)
+    )
+
+
+async def submit_order(order_data: OrderCreate, current_user: User) -> OrderResponse:
+    started = time.perf_counter_ns()
+    error = validate_order_data(order_data)
+    VALIDATION_LATENCY.since(started)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    
+    order = build_order(await order_ids.next_id(), current_user.id, order_data)
+    
+    try:
+        trades = await trading_engine.place_order(order)
+    except JournalHaltedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Order processing failed: {str(e)}"
+        )
+    
+    if order.status == OrderStatus.REJECTED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient balance"
+        )
+    
+    ORDER_LATENCY.since(started)
+    return order_to_response(order)
+
+
+@router.post("/orders/batch", response_model=List[OrderBatchResult])
+async def place_orders_batch(
+    batch: OrderBatchCreate,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    return await idempotency_store.execute(
+        current_user.id, "place_orders_batch", idempotency_key, batch,
+        lambda: submit_orders(batch, current_user)
+    )
+
+
+async def submit_orders(batch: OrderBatchCreate, current_user: User) -> List[OrderBatchResult]:
+    if not batch.orders or len(batch.orders) > settings.max_batch_orders:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch must contain between 1 and {settings.max_batch_orders} orders"
+        )
+    
+    results = [OrderBatchResult(index=index) for index in range(len(batch.orders))]
+    accepted = []
+    
+    started = time.perf_counter_ns()
+    for index, order_data in enumerate(batch.orders):
+        error = validate_order_data(order_data)
+        if error:
+            results[index].error = error
+        else:
+            accepted.append(index)
+    VALIDATION_LATENCY.since(started)
+    
+    if not accepted:
+        return results
+    
+    orders = [
+        build_order(order_id, current_user.id, batch.orders[index])
+        for order_id, index in zip(await order_ids.allocate(len(accepted)), accepted)
+    ]
+    
+    try:
+        await trading_engine.place_orders(orders)
+    except JournalHaltedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Order processing failed: {str(e)}"
+        )
+    
+    for index, order in zip(accepted, orders):
+        if order.status == OrderStatus.REJECTED:
+            results[index].error = "Insufficient balance"
+        else:
+            results[index].order = order_to_response(order)
+    
+    return results
+
+
 @router.get("/orders", response_model=List[OrderResponse])
 async def get_orders(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(
-        select(Order)
-        .where(Order.user_id == current_user.id)
-        .order_by(desc(Order.created_at))
-        .limit(100)
+        keyset_page(select(Order).where(Order.user_id == current_user.id), Order.created_at, Order.id, cursor, limit)
     )
-    orders = result.scalars().all()
+    orders, next_cursor = split_page(result.scalars().all(), limit, "created_at")
+    set_next_cursor(response, next_cursor)
     
-    return [
-        OrderResponse(
-            id=order.id,
-            symbol=order.symbol,
-            order_type=order.order_type.value,
-            side=order.side.value,
-            status=order.status.value,
-            quantity=order.quantity,
-            price=order.price,
-            filled_quantity=order.filled_quantity,
-            remaining_quantity=order.remaining_quantity,
-            created_at=order.created_at.isoformat()
-        )
-        for order in orders
-    ]
+    return [order_to_response(order) for order in orders]
+
+
+@router.get("/orders/open", response_model=List[OpenOrderResponse])
+async def get_open_orders(
+    symbol: Optional[Symbol] = None,
+    current_user: User = Depends(get_current_user)
+):
+    return await trading_engine.get_open_orders(current_user.id, symbol)
+
+
+@router.delete("/orders")
+async def cancel_all_orders(
+    symbol: Optional[Symbol] = None,
+    current_user: User = Depends(get_current_user)
+):
+    cancelled = await trading_engine.cancel_user_orders(current_user.id, symbol)
+    
+    return {"message": f"Cancelled {cancelled} orders", "cancelled": cancelled}
 
 
 @router.delete("/orders/{order_id}")
@@ -170,16 +324,17 @@ async def cancel_order(
 
 @router.get("/trades", response_model=List[TradeResponse])
 async def get_trades(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(
-        select(Trade)
-        .where(Trade.user_id == current_user.id)
-        .order_by(desc(Trade.executed_at))
-        .limit(100)
+        keyset_page(select(Trade).where(Trade.user_id == current_user.id), Trade.executed_at, Trade.id, cursor, limit)
     )
-    trades = result.scalars().all()
+    trades, next_cursor = split_page(result.scalars().all(), limit, "executed_at")
+    set_next_cursor(response, next_cursor)
     
     return [
         TradeResponse(
@@ -196,11 +351,12 @@ async def get_trades(
 
 
 @router.get("/orderbook/{symbol}", response_model=OrderBookResponse)
-async def get_orderbook(symbol: str):
-    orderbook = trading_engine.get_order_book_snapshot(symbol)
+async def get_orderbook(symbol: Symbol, depth: int = 10):
+    orderbook = await trading_engine.get_order_book_snapshot(symbol, depth)
     
     return OrderBookResponse(
         symbol=orderbook["symbol"],
+        sequence=orderbook["sequence"],
         bids=orderbook["bids"],
         asks=orderbook["asks"],
         best_bid=orderbook["best_bid"],
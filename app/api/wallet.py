@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, List, Optional
 from app.core.database import get_db
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, set_next_cursor
 from app.api.auth import get_current_user
 from app.models.user import User
 from app.services.wallet_service import wallet_service
+from app.services.idempotency import idempotency_store
 
 router = APIRouter(prefix="/wallet", tags=["wallet"])
 
@@ -47,64 +49,80 @@ async def get_balances(
 async def deposit(
     deposit_request: DepositRequest,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    try:
-        success = await wallet_service.simulate_deposit(
-            current_user.id,
-            deposit_request.currency,
-            deposit_request.amount,
-            db
-        )
-        
-        if success:
-            return {"message": "Deposit successful"}
-        else:
+    async def handler():
+        try:
+            success = await wallet_service.simulate_deposit(
+                current_user.id,
+                deposit_request.currency,
+                deposit_request.amount,
+                db
+            )
+            
+            if success:
+                return {"message": "Deposit successful"}
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Deposit failed"
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Deposit failed"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
             )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    
+    return await idempotency_store.execute(current_user.id, "deposit", idempotency_key, deposit_request, handler)
 
 
 @router.post("/withdraw")
 async def withdraw(
     withdrawal_request: WithdrawalRequest,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    try:
-        success = await wallet_service.simulate_withdrawal(
-            current_user.id,
-            withdrawal_request.currency,
-            withdrawal_request.amount,
-            db
-        )
-        
-        if success:
-            return {"message": "Withdrawal successful"}
-        else:
+    async def handler():
+        try:
+            success = await wallet_service.simulate_withdrawal(
+                current_user.id,
+                withdrawal_request.currency,
+                withdrawal_request.amount,
+                db
+            )
+            
+            if success:
+                return {"message": "Withdrawal successful"}
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Withdrawal failed"
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Withdrawal failed"
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
             )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    
+    return await idempotency_store.execute(current_user.id, "withdraw", idempotency_key, withdrawal_request, handler)
 
 
 @router.get("/transactions", response_model=List[TransactionResponse])
 async def get_transaction_history(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    transactions = await wallet_service.get_transaction_history(current_user.id, db)
+    transactions, next_cursor = await wallet_service.get_transaction_history(current_user.id, db, limit, cursor)
+    set_next_cursor(response, next_cursor)
     
     return [
         TransactionResponse(
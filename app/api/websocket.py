@@ -3,14 +3,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.services.market_data import market_data_service
 from app.services.trading_engine import trading_engine
+from app.services.trade_tape import trade_tape
 from app.api.auth import get_current_user
+from app.api.trading import Symbol
 from app.models.user import User
+from app.core.metrics import latency_metrics
 import json
 import asyncio
+import time
 from typing import Dict, List
 
 router = APIRouter()
 
+PUBLISH_LATENCY = latency_metrics.histogram("publish")
+
 
 class WebSocketManager:
     def __init__(self):
@@ -81,25 +87,25 @@ async def websocket_prices(websocket: WebSocket, symbol: str):
 
 
 @router.websocket("/ws/orderbook/{symbol}")
-async def websocket_orderbook(websocket: WebSocket, symbol: str):
+async def websocket_orderbook(websocket: WebSocket, symbol: Symbol, depth: int = 10):
     await manager.connect(websocket, f"orderbook:{symbol}")
     
     try:
         while True:
-            orderbook = trading_engine.get_order_book_snapshot(symbol)
-            await websocket.send_text(json.dumps(orderbook))
+            await websocket.send_text(await trading_engine.get_order_book_json(symbol, depth))
             await asyncio.sleep(2)
     except WebSocketDisconnect:
         manager.disconnect(websocket, f"orderbook:{symbol}")
 
 
 @router.websocket("/ws/trades/{symbol}")
-async def websocket_trades(websocket: WebSocket, symbol: str):
+async def websocket_trades(websocket: WebSocket, symbol: Symbol):
     await manager.connect(websocket, f"trades:{symbol}")
     
     try:
+        await websocket.send_text(json.dumps({"type": "snapshot", "trades": trade_tape.recent(symbol)}))
         while True:
-            await asyncio.sleep(1)
+            await websocket.receive_text()
     except WebSocketDisconnect:
         manager.disconnect(websocket, f"trades:{symbol}")
 
@@ -133,14 +139,29 @@ async def broadcast_price_update(symbol: str, price_data: dict):
 
 
 async def broadcast_trade_execution(symbol: str, trade_data: dict):
+    started = time.perf_counter_ns()
     await manager.broadcast_to_channel(
         json.dumps(trade_data), 
         f"trades:{symbol}"
     )
+    PUBLISH_LATENCY.since(started)
 
 
 async def notify_user_order_update(user_id: int, order_data: dict):
     await manager.send_to_user(
         json.dumps(order_data), 
         user_id
-    )
\ No newline at end of file
+    )
+
+
+def publish_trade(symbol: str, entry: tuple):
+    if not manager.active_connections.get(f"trades:{symbol}"):
+        return
+    
+    task = asyncio.create_task(broadcast_trade_execution(symbol, {"type": "trade", **trade_tape.to_dict(symbol, entry)}))
+    broadcast_tasks.add(task)
+    task.add_done_callback(broadcast_tasks.discard)
+
+
+broadcast_tasks = set()
+trade_tape.subscribe(publish_trade)
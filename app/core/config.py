@@ -15,6 +15,33 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    engine_queue_size: int = 10000
+    max_batch_orders: int = 200
+    order_id_block_size: int = 1000
+    trade_tape_size: int = 1000
+    trade_journal_flush_ms: int = 5
+    trade_journal_max_batch: int = 1000
+    trade_journal_max_pending: int = 100000
+    trade_journal_halt_retry_ms: int = 5000
+    
+    engine_wal_enabled: bool = True
+    engine_data_dir: str = "data/engine"
+    engine_wal_fsync_ms: int = 2
+    engine_snapshot_interval: int = 60
+    engine_shards: int = 0
+    engine_capture_path: Optional[str] = None
+    engine_reserve_balances: bool = True
+    
+    ledger_compaction_interval_seconds: int = 60
+    balance_cache_size: int = 100000
+    balance_cache_ttl_seconds: float = 2.0
+    balance_cache_redis: bool = False
+    idempotency_ttl_seconds: int = 86400
+    idempotency_pending_seconds: int = 30
+    idempotency_max_keys: int = 100000
+    idempotency_redis: bool = False
+    wallet_import_chunk_size: int = 10000
+    
     environment: str = "development"
     log_level: str = "INFO"
     
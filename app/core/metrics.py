@@ -0,0 +1,137 @@
+from typing import Dict, Tuple
+import math
+import time
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+MAX_VALUE_BITS = 40
+MAX_SHIFT = MAX_VALUE_BITS - SUB_BUCKET_BITS
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+BUCKET_COUNT = (MAX_SHIFT + 2) * HALF_SUB_BUCKETS
+PERCENTILES = (("p50_us", 50.0), ("p90_us", 90.0), ("p99_us", 99.0), ("p99_9_us", 99.9))
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "max")
+    
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.max = 0
+    
+    def record(self, value: int):
+        if value >= SUB_BUCKETS:
+            shift = value.bit_length() - SUB_BUCKET_BITS
+            if shift > MAX_SHIFT:
+                shift = MAX_SHIFT
+                value = MAX_VALUE
+            self.counts[shift * HALF_SUB_BUCKETS + (value >> shift)] += 1
+        elif value > 0:
+            self.counts[value] += 1
+        else:
+            self.counts[0] += 1
+        
+        if value > self.max:
+            self.max = value
+    
+    def since(self, started: int):
+        self.record(time.perf_counter_ns() - started)
+    
+    @staticmethod
+    def bucket_range(index: int) -> Tuple[int, int]:
+        if index < SUB_BUCKETS:
+            return index, index
+        shift = index // HALF_SUB_BUCKETS - 1
+        lower = (index - shift * HALF_SUB_BUCKETS) << shift
+        return lower, lower + (1 << shift) - 1
+    
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+    
+    def percentile(self, percentile: float) -> int:
+        count = self.count
+        if not count:
+            return 0
+        
+        target = max(1, math.ceil(count * percentile / 100))
+        seen = 0
+        
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.bucket_range(index)[1], self.max)
+        
+        return self.max
+    
+    def mean(self) -> float:
+        count = self.count
+        if not count:
+            return 0.0
+        
+        total = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                lower, upper = self.bucket_range(index)
+                total += bucket_count * (lower + upper) / 2
+        return total / count
+    
+    def copy(self) -> "LatencyHistogram":
+        histogram = LatencyHistogram()
+        histogram.counts = self.counts[:]
+        histogram.max = self.max
+        return histogram
+    
+    def merge(self, other: "LatencyHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.max = max(self.max, other.max)
+    
+    def reset(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.max = 0
+    
+    def snapshot(self) -> Dict:
+        summary = {
+            "count": self.count,
+            "mean_us": round(self.mean() / 1000, 3),
+            "max_us": round(self.max / 1000, 3)
+        }
+        for name, percentile in PERCENTILES:
+            summary[name] = round(self.percentile(percentile) / 1000, 3)
+        return summary
+
+
+class LatencyMetrics:
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.started_at = time.time()
+    
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.histograms[stage] = histogram
+        return histogram
+    
+    def collect(self, reset: bool = False) -> Tuple[float, Dict[str, LatencyHistogram]]:
+        started_at = self.started_at
+        histograms = {stage: histogram.copy() for stage, histogram in self.histograms.items()}
+        
+        if reset:
+            for histogram in self.histograms.values():
+                histogram.reset()
+            self.started_at = time.time()
+        
+        return started_at, histograms
+
+
+def merge_histograms(target: Dict[str, LatencyHistogram], source: Dict[str, LatencyHistogram]):
+    for stage, histogram in source.items():
+        merged = target.get(stage)
+        if merged is None:
+            target[stage] = histogram.copy()
+        else:
+            merged.merge(histogram)
+
+
+latency_metrics = LatencyMetrics()
@@ -0,0 +1,215 @@
+from decimal import Decimal
+from typing import Awaitable, Callable, List, Optional, Set
+from app.core.config import settings
+from app.core.metrics import latency_metrics
+from app.services.engine_shards import ShardBalances, ShardConnection, ShardTicket, read_frame, socket_path, write_frame
+from app.services.engine_wal import EngineWAL
+from app.services.engine_capture import EngineCapture
+from app.services.balance_book import BalanceBook, EscrowBook
+from app.services.balance_cache import balance_cache
+from app.services.trade_journal import JournalHaltedError, trade_journal
+from app.services.trade_tape import trade_tape
+from app.services.instruments import get_instrument
+from app.services.trading_engine import TradingEngine
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class EngineShardServer:
+    def __init__(self, index: int):
+        self.index = index
+        self.path = socket_path(settings.engine_data_dir, index)
+        self.balances: Optional[ShardBalances] = None
+        self.escrow: Optional[EscrowBook] = None
+        if settings.engine_reserve_balances:
+            peers = [
+                ShardConnection(socket_path(settings.engine_data_dir, peer), self.ignore_push, subscribe=False)
+                if peer != index else None
+                for peer in range(settings.engine_shards)
+            ]
+            self.balances = ShardBalances(index, peers, BalanceBook(None))
+            self.escrow = EscrowBook(trade_journal, self.balances.forward)
+        self.engine = TradingEngine(
+            journal=trade_journal,
+            wal=EngineWAL(os.path.join(settings.engine_data_dir, f"shard-{index}"), settings.engine_wal_fsync_ms,
+                          settings.engine_snapshot_interval)
+            if settings.engine_wal_enabled else None,
+            capture=EngineCapture(f"{settings.engine_capture_path}.shard-{index}")
+            if settings.engine_capture_path else None,
+            balances=self.escrow
+        )
+        self.tasks: Set[asyncio.Task] = set()
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        trade_tape.subscribe(self.push_trade)
+        balance_cache.subscribe(self.push_balances)
+    
+    async def serve(self):
+        await self.engine.start()
+        
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        
+        server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopped.set)
+        
+        logger.info("Engine shard %d listening on %s", self.index, self.path)
+        
+        async with server:
+            await stopped.wait()
+        
+        await self.engine.stop()
+        if self.balances is not None:
+            await self.balances.close()
+        os.unlink(self.path)
+    
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_id, method, args = await read_frame(reader)
+                if method == "subscribe":
+                    self.subscribers.add(writer)
+                    continue
+                
+                task = asyncio.create_task(self.respond(writer, request_id, method, args))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+    
+    def ignore_push(self, event: str, payload: tuple):
+        pass
+    
+    def push_trade(self, symbol: str, entry: tuple):
+        for writer in self.subscribers:
+            if not writer.is_closing():
+                write_frame(writer, (0, "trade", (symbol, entry)))
+    
+    def push_balances(self, user_ids: List[int]):
+        for writer in self.subscribers:
+            if not writer.is_closing():
+                write_frame(writer, (0, "balances", user_ids))
+    
+    async def respond(self, writer: asyncio.StreamWriter, request_id: int, method: str, args):
+        try:
+            reply = (request_id, True, await self.dispatch(method, args))
+        except JournalHaltedError as e:
+            reply = (request_id, False, e)
+        except Exception as e:
+            logger.exception("Engine shard %d failed to handle %s", self.index, method)
+            reply = (request_id, False, str(e))
+        
+        if not request_id or writer.is_closing():
+            return
+        
+        write_frame(writer, reply)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+    
+    async def dispatch(self, method: str, args):
+        engine = self.engine
+        
+        if method == "place":
+            return await self.place([args], lambda: engine.place_order(args)), args
+        elif method == "batch":
+            return await self.place(args, lambda: engine.place_orders(args)), args
+        elif method == "reserve":
+            return await self.balances.reserve(args, self.reservation)
+        elif method == "balance_deltas":
+            return self.balances.apply(args)
+        elif method == "cancel":
+            return await engine.submit_cancel(args)
+        elif method == "mass_cancel":
+            return await engine.cancel_user_orders(*args)
+        elif method == "open_orders":
+            return await engine.get_open_orders(*args)
+        elif method == "adjust_balance":
+            return self.adjust_balance(*args)
+        elif method == "adjust_balances":
+            return [] if self.balances is None else self.balances.owner.adjust_all(args)
+        elif method == "metrics":
+            return latency_metrics.collect(args)[1]
+        elif method == "tick":
+            return engine.on_price_tick(*args)
+        elif method == "snapshot":
+            return await engine.get_order_book_snapshot(*args)
+        elif method == "json":
+            return await engine.get_order_book_json(*args)
+        
+        raise ValueError(f"Unknown engine method: {method}")
+    
+    def reservation(self, ticket: ShardTicket):
+        return self.engine.order_reservation(ticket, get_instrument(ticket.symbol))
+    
+    async def place(self, tickets: List[ShardTicket], submit: Callable[[], Awaitable]):
+        if self.balances is None:
+            return await submit()
+        
+        try:
+            for ticket in tickets:
+                if ticket.grant is None and self.balances.owns(ticket.user_id):
+                    (ticket.grant,) = await self.balances.reserve([ticket], self.reservation)
+                if ticket.grant is not None:
+                    self.escrow.grant(ticket.id, ticket.user_id, *ticket.grant)
+            return await submit()
+        finally:
+            for ticket in tickets:
+                self.escrow.revoke(ticket.id)
+    
+    def adjust_balance(self, user_id: int, currency: str, available: Decimal, locked: Decimal) -> bool:
+        if self.balances is None:
+            return True
+        owner = self.balances.owner
+        return owner.adjust(user_id, currency, owner.to_units(available), owner.to_units(locked))
+
+
+def run_shard(index: int):
+    logging.basicConfig(level=settings.log_level)
+    asyncio.run(EngineShardServer(index).serve())
+
+
+def main():
+    if settings.engine_shards < 1:
+        sys.exit("Set ENGINE_SHARDS to the number of engine processes to run")
+    
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_shard, args=(index,), name=f"engine-shard-{index}")
+        for index in range(settings.engine_shards)
+    ]
+    
+    def terminate(signum, frame):
+        for process in processes:
+            process.terminate()
+    
+    signal.signal(signal.SIGTERM, terminate)
+    
+    for process in processes:
+        process.start()
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.api import auth, trading, market, wallet, websocket
+from app.api import auth, trading, market, wallet, websocket, metrics, admin
 from app.services.market_data import market_data_service
+from app.services.trading_engine import trading_engine
+from app.services.ledger import ledger
+from app.services.balance_cache import balance_cache
+from app.services.idempotency import idempotency_store
 from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
 import asyncio
 import json
 from typing import Dict, List
@@ -16,6 +21,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(auth.router, prefix="/api/v1")
@@ -23,6 +29,8 @@ app.include_router(trading.router, prefix="/api/v1")
 app.include_router(market.router, prefix="/api/v1")
 app.include_router(wallet.router, prefix="/api/v1")
 app.include_router(websocket.router)
+app.include_router(metrics.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -68,12 +76,18 @@ async def websocket_endpoint(websocket: WebSocket, symbol: str):
 
 @app.on_event("startup")
 async def startup_event():
+    await trading_engine.start()
     await market_data_service.initialize()
+    ledger.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     await market_data_service.stop()
+    await ledger.stop()
+    await trading_engine.stop()
+    await balance_cache.close()
+    await idempotency_store.close()
 
 
 @app.get("/")
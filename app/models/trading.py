@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Numeric, DateTime, ForeignKey, Boolean, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -27,6 +27,7 @@ class OrderStatus(PyEnum):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (Index("ix_orders_user_created", "user_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -52,6 +53,7 @@ class Order(Base):
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (Index("ix_trades_user_executed", "user_id", "executed_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
@@ -84,4 +86,11 @@ class MarketData(Base):
     bid_price = Column(Numeric(18, 8))
     ask_price = Column(Numeric(18, 8))
     
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
\ No newline at end of file
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class JournalPosition(Base):
+    __tablename__ = "journal_positions"
+    
+    name = Column(String(255), primary_key=True)
+    lsn = Column(BigInteger, nullable=False, default=0)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum, Numeric, false
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -33,6 +33,7 @@ class User(Base):
     
     is_active = Column(Boolean, default=True)
     is_2fa_enabled = Column(Boolean, default=False)
+    is_admin = Column(Boolean, default=False, server_default=false(), nullable=False)
     
     daily_withdrawal_limit = Column(Numeric(18, 8), default=10000)
     
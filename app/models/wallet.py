@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Boolean, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -6,12 +6,14 @@ from app.core.database import Base
 
 class Wallet(Base):
     __tablename__ = "wallets"
+    __table_args__ = (UniqueConstraint("user_id", "currency", name="uq_wallets_user_currency"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     currency = Column(String(10), nullable=False)
     available_balance = Column(Numeric(18, 8), default=0)
     locked_balance = Column(Numeric(18, 8), default=0)
+    ledger_entry_id = Column(Integer, nullable=False, default=0, server_default="0")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -25,6 +27,7 @@ class Wallet(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (Index("ix_transactions_user_created", "user_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -38,4 +41,20 @@ class Transaction(Base):
     status = Column(String(20), default="pending")
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+    __table_args__ = (Index("ix_ledger_entries_account", "user_id", "currency", "id"),)
+    
+    id = Column(Integer, primary_key=True)
+    posting_id = Column(String(40), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    currency = Column(String(10), nullable=False)
+    account = Column(String(16), nullable=False)
+    
+    amount = Column(Numeric(18, 8), nullable=False)
+    type = Column(String(20), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
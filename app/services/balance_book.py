@@ -0,0 +1,189 @@
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.database import AsyncSessionLocal
+from app.services.ledger import ledger
+from app.services.trade_journal import BALANCE_DECIMALS, TradeJournal, trade_journal
+import asyncio
+
+
+class Account:
+    __slots__ = ("available", "locked")
+    
+    def __init__(self, available: int, locked: int):
+        self.available = available
+        self.locked = locked
+
+
+class BalanceBook:
+    def __init__(self, journal: Optional[TradeJournal], session_factory=AsyncSessionLocal):
+        self.journal = journal
+        self.session_factory = session_factory
+        self.scale = 10 ** BALANCE_DECIMALS
+        self.accounts: Dict[Tuple[int, str], Account] = {}
+        self.users: Set[int] = set()
+        self.loading: Dict[int, asyncio.Future] = {}
+    
+    @staticmethod
+    def to_units(amount: Decimal) -> int:
+        return int((amount or Decimal("0")).scaleb(BALANCE_DECIMALS))
+    
+    @staticmethod
+    def from_units(units: int) -> Decimal:
+        return Decimal(units).scaleb(-BALANCE_DECIMALS)
+    
+    async def ensure_loaded(self, user_id: int):
+        if user_id in self.users:
+            return
+        
+        pending = self.loading.get(user_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self.load([user_id]))
+            self.loading[user_id] = pending
+            pending.add_done_callback(lambda _: self.loading.pop(user_id, None))
+        
+        await asyncio.shield(pending)
+    
+    async def load(self, user_ids: Iterable[int]):
+        user_ids = [user_id for user_id in set(user_ids) if user_id not in self.users]
+        if not user_ids:
+            return
+        
+        async with self.session_factory() as db:
+            balances = await ledger.get_balances(db, user_ids)
+        
+        for (user_id, currency), (available, locked) in balances.items():
+            if user_id not in self.users:
+                self.accounts.setdefault(
+                    (user_id, currency),
+                    Account(self.to_units(available), self.to_units(locked))
+                )
+        
+        self.users.update(user_ids)
+    
+    def account(self, user_id: int, currency: str) -> Account:
+        account = self.accounts.get((user_id, currency))
+        
+        if account is None:
+            account = Account(0, 0)
+            self.accounts[(user_id, currency)] = account
+            self.journal.record_new_wallet(user_id, currency)
+        
+        return account
+    
+    def reserve(self, user_id: int, currency: str, amount: int, order_id: Optional[int] = None) -> bool:
+        account = self.accounts.get((user_id, currency))
+        if amount < 0 or account is None or account.available < amount:
+            return False
+        
+        account.available -= amount
+        account.locked += amount
+        if self.journal is not None:
+            self.journal.record_balance(user_id, currency, -amount, amount)
+        return True
+    
+    def release(self, user_id: int, currency: str, amount: int):
+        if amount:
+            self.settle(user_id, currency, amount, 0)
+    
+    def settle(self, user_id: int, currency: str, unlocked: int, spent: int):
+        account = self.account(user_id, currency)
+        account.locked -= unlocked
+        account.available += unlocked - spent
+        self.journal.record_balance(user_id, currency, unlocked - spent, -unlocked)
+    
+    def credit(self, user_id: int, currency: str, amount: int):
+        self.account(user_id, currency).available += amount
+        self.journal.record_balance(user_id, currency, amount, 0)
+    
+    def adjust(self, user_id: int, currency: str, available: int, locked: int) -> bool:
+        if user_id not in self.users:
+            return True
+        
+        account = self.accounts.get((user_id, currency))
+        if account is None:
+            account = Account(0, 0)
+            self.accounts[(user_id, currency)] = account
+        
+        if account.available + available < 0 or account.locked + locked < 0:
+            return False
+        
+        account.available += available
+        account.locked += locked
+        return True
+    
+    def adjust_all(self, deltas: List[Tuple[int, str, Decimal]]) -> List[Tuple[int, str, Decimal]]:
+        applied = []
+        rejected = []
+        for user_id, currency, available in deltas:
+            units = self.to_units(available)
+            if self.adjust(user_id, currency, units, 0):
+                applied.append((user_id, currency, units))
+            else:
+                rejected.append((user_id, currency, available))
+        
+        if rejected:
+            for user_id, currency, units in applied:
+                self.adjust(user_id, currency, -units, 0)
+        return rejected
+    
+    def apply(self, user_id: int, currency: str, available: int, locked: int):
+        if user_id not in self.users:
+            return
+        
+        account = self.accounts.setdefault((user_id, currency), Account(0, 0))
+        account.available += available
+        account.locked += locked
+
+
+class EscrowBook(BalanceBook):
+    def __init__(self, journal: TradeJournal, forward: Callable[[int, str, int, int], None]):
+        super().__init__(journal)
+        self.forward = forward
+        self.grants: Dict[int, Tuple[int, str, int]] = {}
+        self.wallets: Set[Tuple[int, str]] = set()
+    
+    async def ensure_loaded(self, user_id: int):
+        return
+    
+    async def load(self, user_ids: Iterable[int]):
+        return
+    
+    def grant(self, order_id: int, user_id: int, currency: str, amount: int):
+        self.grants[order_id] = (user_id, currency, amount)
+    
+    def revoke(self, order_id: int):
+        grant = self.grants.pop(order_id, None)
+        if grant is not None and grant[2]:
+            user_id, currency, amount = grant
+            self.forward(user_id, currency, amount, -amount)
+    
+    def reserve(self, user_id: int, currency: str, amount: int, order_id: Optional[int] = None) -> bool:
+        grant = self.grants.pop(order_id, None)
+        if grant is None:
+            return False
+        
+        granted = grant[2]
+        accepted = grant[:2] == (user_id, currency) and 0 <= amount <= granted
+        used = amount if accepted else 0
+        if granted > used:
+            self.forward(grant[0], grant[1], granted - used, used - granted)
+        if accepted:
+            self.journal.record_balance(user_id, currency, -amount, amount)
+        return accepted
+    
+    def settle(self, user_id: int, currency: str, unlocked: int, spent: int):
+        self.record(user_id, currency, unlocked - spent, -unlocked)
+    
+    def credit(self, user_id: int, currency: str, amount: int):
+        self.record(user_id, currency, amount, 0)
+    
+    def record(self, user_id: int, currency: str, available: int, locked: int):
+        if (user_id, currency) not in self.wallets:
+            self.wallets.add((user_id, currency))
+            self.journal.record_new_wallet(user_id, currency)
+        
+        self.journal.record_balance(user_id, currency, available, locked)
+        self.forward(user_id, currency, available, locked)
+
+
+balance_book = BalanceBook(trade_journal)
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.services.ledger import ledger
+import redis.asyncio as redis
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+UserBalances = Dict[str, Tuple[Decimal, Decimal]]
+
+
+class BalanceCache:
+    def __init__(self, max_users: int, ttl_seconds: float, redis_url: Optional[str] = None):
+        self.max_users = max_users
+        self.ttl = ttl_seconds
+        self.entries: "OrderedDict[int, Tuple[float, UserBalances]]" = OrderedDict()
+        self.loading: Dict[int, object] = {}
+        self.redis = redis.from_url(redis_url) if redis_url else None
+        self.listeners: List[Callable[[List[int]], None]] = []
+        self.hits = 0
+        self.misses = 0
+    
+    def subscribe(self, listener: Callable[[List[int]], None]):
+        self.listeners.append(listener)
+    
+    @staticmethod
+    def redis_key(user_id: int) -> str:
+        return f"balances:{user_id}"
+    
+    async def get(self, user_id: int, db: AsyncSession) -> UserBalances:
+        entry = self.entries.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            del self.entries[user_id]
+        
+        self.misses += 1
+        token = object()
+        self.loading[user_id] = token
+        
+        balances = await self.read_redis(user_id)
+        if balances is None:
+            balances = {
+                currency: balance
+                for (_, currency), balance in (await ledger.get_balances(db, [user_id])).items()
+            }
+            if self.loading.get(user_id) is token:
+                await self.write_redis(user_id, balances)
+        
+        if self.loading.get(user_id) is token:
+            del self.loading[user_id]
+            self.store(user_id, balances)
+        
+        return balances
+    
+    def store(self, user_id: int, balances: UserBalances):
+        self.entries[user_id] = (time.monotonic() + self.ttl, balances)
+        self.entries.move_to_end(user_id)
+        
+        while len(self.entries) > self.max_users:
+            self.entries.popitem(last=False)
+    
+    async def invalidate(self, user_ids: Iterable[int]):
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return
+        
+        self.invalidate_local(user_ids)
+        for listener in self.listeners:
+            listener(user_ids)
+        
+        if self.redis:
+            try:
+                await self.redis.delete(*(self.redis_key(user_id) for user_id in user_ids))
+            except redis.RedisError:
+                logger.warning("Failed to invalidate cached balances in Redis", exc_info=True)
+    
+    def invalidate_local(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            self.entries.pop(user_id, None)
+            self.loading.pop(user_id, None)
+    
+    async def read_redis(self, user_id: int) -> Optional[UserBalances]:
+        if not self.redis:
+            return None
+        
+        try:
+            cached = await self.redis.get(self.redis_key(user_id))
+        except redis.RedisError:
+            logger.warning("Failed to read cached balances from Redis", exc_info=True)
+            return None
+        
+        if cached is None:
+            return None
+        return {
+            currency: (Decimal(available), Decimal(locked))
+            for currency, (available, locked) in json.loads(cached).items()
+        }
+    
+    async def write_redis(self, user_id: int, balances: UserBalances):
+        if not self.redis:
+            return
+        
+        try:
+            await self.redis.set(
+                self.redis_key(user_id),
+                json.dumps({currency: [str(available), str(locked)] for currency, (available, locked) in balances.items()}),
+                px=int(self.ttl * 1000)
+            )
+        except redis.RedisError:
+            logger.warning("Failed to write cached balances to Redis", exc_info=True)
+    
+    def stats(self) -> Dict:
+        return {"users": len(self.entries), "max_users": self.max_users, "hits": self.hits, "misses": self.misses}
+    
+    async def close(self):
+        if self.redis:
+            await self.redis.aclose()
+
+
+balance_cache = BalanceCache(
+    settings.balance_cache_size,
+    settings.balance_cache_ttl_seconds,
+    settings.redis_url if settings.balance_cache_redis else None
+)
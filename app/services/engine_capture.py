@@ -0,0 +1,147 @@
+from decimal import Decimal
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from app.models.trading import OrderSide, OrderType
+from app.services.instruments import get_instrument
+import struct
+import time
+
+CAPTURE_MAGIC = b"ECAP1\n"
+SIDES = list(OrderSide)
+ORDER_TYPES = list(OrderType)
+NO_PRICE = -1
+
+SYMBOL = 0
+PLACE = 1
+CANCEL = 2
+MASS_CANCEL = 3
+TICK = 4
+RESTING = 5
+ARM = 6
+TRADE = 7
+REJECT = 8
+
+RECORD_HEADER = struct.Struct("<Bq")
+RECORD_BODIES = {
+    SYMBOL: struct.Struct("<HB"),
+    PLACE: struct.Struct("<HqqBBqqq"),
+    CANCEL: struct.Struct("<HqqBBqq"),
+    MASS_CANCEL: struct.Struct("<Hq"),
+    TICK: struct.Struct("<Hq"),
+    RESTING: struct.Struct("<HqqBqqq"),
+    ARM: struct.Struct("<HqqBBqqq"),
+    TRADE: struct.Struct("<Hqqqq"),
+    REJECT: struct.Struct("<Hq")
+}
+
+
+class EngineCapture:
+    def __init__(self, path: str):
+        self.path = path
+        self.file: Optional[BinaryIO] = None
+        self.symbols: Dict[str, int] = {}
+        self.started = 0
+    
+    def open(self, books: Dict[str, List[tuple]], last_prices: Dict[str, int]):
+        self.file = open(self.path, "wb")
+        self.file.write(CAPTURE_MAGIC)
+        self.started = time.perf_counter_ns()
+        
+        for symbol, records in books.items():
+            for action, state in records:
+                if action == "new":
+                    _, order_id, user_id, side, price, quantity, remaining = state
+                    self.write(RESTING, 0, self.symbol_index(symbol), order_id, user_id,
+                               SIDES.index(OrderSide(side)), price, quantity, remaining)
+                else:
+                    _, order_id, user_id, side, order_type, quantity, price, stop_price = state
+                    instrument = get_instrument(symbol)
+                    self.write(ARM, 0, self.symbol_index(symbol), order_id, user_id,
+                               SIDES.index(OrderSide(side)), ORDER_TYPES.index(OrderType(order_type)),
+                               instrument.to_lots(quantity), self.to_ticks(symbol, price), stop_price)
+        
+        for symbol, price in last_prices.items():
+            self.write(TICK, 0, self.symbol_index(symbol), price)
+    
+    def write(self, kind: int, timestamp: int, *fields):
+        self.file.write(RECORD_HEADER.pack(kind, timestamp))
+        self.file.write(RECORD_BODIES[kind].pack(*fields))
+    
+    def symbol_index(self, symbol: str) -> int:
+        index = self.symbols.get(symbol)
+        
+        if index is None:
+            index = len(self.symbols)
+            self.symbols[symbol] = index
+            encoded = symbol.encode()
+            self.write(SYMBOL, 0, index, len(encoded))
+            self.file.write(encoded)
+        
+        return index
+    
+    @staticmethod
+    def to_ticks(symbol: str, price: Optional[Decimal]) -> int:
+        return NO_PRICE if price is None else get_instrument(symbol).to_ticks(price)
+    
+    def record(self, symbol: str, action: str, payload, enqueued: int):
+        timestamp = enqueued - self.started
+        index = self.symbol_index(symbol)
+        
+        if action == "place":
+            self.record_place(index, symbol, payload, timestamp)
+        elif action == "batch":
+            for order in payload:
+                self.record_place(index, symbol, order, timestamp)
+        elif action == "tick":
+            self.write(TICK, timestamp, index, payload)
+        elif action == "mass_cancel":
+            self.write(MASS_CANCEL, timestamp, index, payload)
+        else:
+            instrument = get_instrument(symbol)
+            self.write(CANCEL, timestamp, index, payload.id, payload.user_id, SIDES.index(payload.side),
+                       ORDER_TYPES.index(payload.order_type), instrument.to_lots(payload.quantity),
+                       instrument.to_lots(payload.remaining_quantity))
+    
+    def record_place(self, index: int, symbol: str, order, timestamp: int):
+        self.write(PLACE, timestamp, index, order.id, order.user_id, SIDES.index(order.side),
+                   ORDER_TYPES.index(order.order_type), get_instrument(symbol).to_lots(order.quantity),
+                   self.to_ticks(symbol, order.price), self.to_ticks(symbol, order.stop_price))
+    
+    def record_trade(self, trade):
+        self.write(TRADE, time.perf_counter_ns() - self.started, self.symbol_index(trade.symbol), trade.order_id,
+                   trade.maker_order_id, trade.quantity_lots, trade.price_ticks)
+    
+    def record_reject(self, order):
+        self.write(REJECT, time.perf_counter_ns() - self.started, self.symbol_index(order.symbol), order.id)
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_capture(path: str) -> Iterator[Tuple[int, int, str, tuple]]:
+    symbols: Dict[int, str] = {}
+    
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not an engine capture")
+        
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            
+            kind, timestamp = RECORD_HEADER.unpack(header)
+            body = RECORD_BODIES[kind]
+            data = f.read(body.size)
+            if len(data) < body.size:
+                return
+            
+            fields = body.unpack(data)
+            
+            if kind == SYMBOL:
+                index, length = fields
+                symbols[index] = f.read(length).decode()
+                continue
+            
+            yield kind, timestamp, symbols[fields[0]], fields[1:]
@@ -0,0 +1,415 @@
+from decimal import Decimal
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.services.engine_wal import FRAME_HEADER
+from app.services.trade_tape import trade_tape
+from app.services.balance_cache import balance_cache
+from app.services.balance_book import BalanceBook
+from app.core.metrics import latency_metrics
+import asyncio
+import itertools
+import logging
+import os
+import pickle
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+SHARD_RPC_LATENCY = latency_metrics.histogram("shard_rpc")
+ADJUST_BATCH_SIZE = 10000
+
+
+def shard_for(symbol: str, shards: int) -> int:
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def owner_for(user_id: int, shards: int) -> int:
+    return user_id % shards
+
+
+def group_by_owner(deltas: List[Tuple[int, str, Decimal]], shards: int) -> Dict[int, List[Tuple[int, str, Decimal]]]:
+    groups: Dict[int, List[Tuple[int, str, Decimal]]] = {}
+    for delta in deltas:
+        groups.setdefault(owner_for(delta[0], shards), []).append(delta)
+    return groups
+
+
+def socket_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"shard-{index}.sock")
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(size))
+
+
+def write_frame(writer: asyncio.StreamWriter, message: tuple):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(FRAME_HEADER.pack(len(data)) + data)
+
+
+def raise_group_failures(replies: List):
+    failures = [reply for reply in replies if isinstance(reply, BaseException)]
+    if not failures:
+        return
+    if len(failures) == len(replies):
+        raise failures[0]
+    raise RuntimeError(f"{len(failures)} of {len(replies)} order groups failed after the others were applied: "
+                       f"{failures[0]}")
+
+
+class ShardTicket:
+    __slots__ = ("id", "user_id", "symbol", "side", "order_type", "quantity", "price", "stop_price",
+                 "status", "filled_quantity", "remaining_quantity", "created_at", "grant")
+    
+    def __init__(self, order_id: int, user_id: int, symbol: str, side: OrderSide, order_type: OrderType,
+                 quantity: Decimal, price: Optional[Decimal], stop_price: Optional[Decimal], status: OrderStatus,
+                 filled_quantity: Decimal, remaining_quantity: Decimal, created_at: datetime,
+                 grant: Optional[Tuple[str, int]] = None):
+        self.id = order_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.stop_price = stop_price
+        self.status = status
+        self.filled_quantity = filled_quantity
+        self.remaining_quantity = remaining_quantity
+        self.created_at = created_at
+        self.grant = grant
+    
+    @classmethod
+    def from_order(cls, order: Order) -> "ShardTicket":
+        return cls(order.id, order.user_id, order.symbol, order.side, order.order_type, order.quantity,
+                   order.price, order.stop_price, order.status, order.filled_quantity or Decimal("0"),
+                   order.remaining_quantity, order.created_at)
+    
+    def apply(self, order: Order):
+        order.status = self.status
+        order.filled_quantity = self.filled_quantity
+        order.remaining_quantity = self.remaining_quantity
+
+
+class ShardConnection:
+    def __init__(self, path: str, on_push: Callable[[str, tuple], None], subscribe: bool = True):
+        self.path = path
+        self.on_push = on_push
+        self.subscribe = subscribe
+        self.request_ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lock: Optional[asyncio.Lock] = None
+    
+    async def connect(self) -> asyncio.StreamWriter:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        
+        async with self.lock:
+            if self.writer is None:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+                self.task = asyncio.create_task(self.receive(reader, self.writer))
+                if self.subscribe:
+                    write_frame(self.writer, (0, "subscribe", None))
+        
+        return self.writer
+    
+    async def request(self, method: str, args):
+        writer = self.writer or await self.connect()
+        
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        started = time.perf_counter_ns()
+        
+        try:
+            write_frame(writer, (request_id, method, args))
+            await writer.drain()
+            ok, result = await future
+        finally:
+            self.pending.pop(request_id, None)
+        
+        SHARD_RPC_LATENCY.since(started)
+        
+        if not ok:
+            if isinstance(result, Exception):
+                raise result
+            raise RuntimeError(f"Engine shard error: {result}")
+        return result
+    
+    async def notify(self, method: str, args):
+        try:
+            writer = self.writer or await self.connect()
+            write_frame(writer, (0, method, args))
+            await writer.drain()
+        except (OSError, ConnectionError):
+            logger.debug("Engine shard %s unavailable, dropped %s", self.path, method)
+    
+    async def receive(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_id, ok, result = await read_frame(reader)
+                if not request_id:
+                    self.on_push(ok, result)
+                    continue
+                
+                future = self.pending.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result((ok, result))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning("Engine shard connection %s closed", self.path)
+        finally:
+            self.disconnect(writer)
+    
+    def disconnect(self, writer: asyncio.StreamWriter):
+        if self.writer is writer:
+            self.writer = None
+            self.task = None
+        writer.close()
+        
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Engine shard {self.path} disconnected"))
+    
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+class ShardBalances:
+    def __init__(self, index: int, connections: List[Optional[ShardConnection]], owner: BalanceBook):
+        self.index = index
+        self.connections = connections
+        self.owner = owner
+        self.outbox: Dict[int, Dict[Tuple[int, str], List[int]]] = {}
+        self.notifications: Set[asyncio.Task] = set()
+    
+    def owns(self, user_id: int) -> bool:
+        return owner_for(user_id, len(self.connections)) == self.index
+    
+    async def reserve(self, tickets: List[ShardTicket],
+                      reservation: Callable[[ShardTicket], Tuple[str, Optional[int]]]) -> List[Optional[Tuple[str, int]]]:
+        for user_id in {ticket.user_id for ticket in tickets}:
+            await self.owner.ensure_loaded(user_id)
+        
+        grants = []
+        for ticket in tickets:
+            currency, amount = reservation(ticket)
+            if amount is None:
+                account = self.owner.accounts.get((ticket.user_id, currency))
+                amount = account.available if account is not None else 0
+            grants.append((currency, amount) if self.owner.reserve(ticket.user_id, currency, amount) else None)
+        return grants
+    
+    def forward(self, user_id: int, currency: str, available: int, locked: int):
+        owner = owner_for(user_id, len(self.connections))
+        if owner == self.index:
+            self.owner.apply(user_id, currency, available, locked)
+            return
+        
+        if not self.outbox:
+            asyncio.get_running_loop().call_soon(self.flush)
+        delta = self.outbox.setdefault(owner, {}).setdefault((user_id, currency), [0, 0])
+        delta[0] += available
+        delta[1] += locked
+    
+    def flush(self):
+        outbox, self.outbox = self.outbox, {}
+        for owner, deltas in outbox.items():
+            task = asyncio.create_task(self.connections[owner].notify("balance_deltas", [
+                (user_id, currency, available, locked) for (user_id, currency), (available, locked) in deltas.items()
+            ]))
+            self.notifications.add(task)
+            task.add_done_callback(self.notifications.discard)
+    
+    def apply(self, deltas: List[Tuple[int, str, int, int]]):
+        for delta in deltas:
+            self.owner.apply(*delta)
+    
+    async def close(self):
+        self.flush()
+        await asyncio.gather(*self.notifications, return_exceptions=True)
+        for connection in self.connections:
+            if connection is not None:
+                await connection.close()
+
+
+class ShardedEngineClient:
+    def __init__(self, shards: int, directory: str, reserve_balances: bool = True):
+        self.reserve_balances = reserve_balances
+        self.connections = [
+            ShardConnection(socket_path(directory, index), self.handle_push) for index in range(shards)
+        ]
+        self.notifications: Set[asyncio.Task] = set()
+    
+    def shard(self, symbol: str) -> ShardConnection:
+        return self.connections[shard_for(symbol, len(self.connections))]
+    
+    async def start(self):
+        for connection in self.connections:
+            try:
+                await connection.connect()
+            except OSError:
+                logger.warning("Engine shard %s is not running yet", connection.path)
+    
+    async def stop(self):
+        for connection in self.connections:
+            await connection.close()
+    
+    async def collect_remote_metrics(self, reset: bool = False) -> List[Dict]:
+        return await asyncio.gather(*(connection.request("metrics", reset) for connection in self.connections))
+    
+    async def adjust_balance(self, user_id: int, currency: str, available: Decimal, locked: Decimal) -> bool:
+        owner = self.connections[owner_for(user_id, len(self.connections))]
+        return await owner.request("adjust_balance", (user_id, currency, available, locked))
+    
+    async def adjust_balances(self, deltas: List[Tuple[int, str, Decimal]]) -> List[Tuple[int, str, Decimal]]:
+        applied: List[Tuple[int, str, Decimal]] = []
+        rejected: List[Tuple[int, str, Decimal]] = []
+        
+        try:
+            for start in range(0, len(deltas), ADJUST_BATCH_SIZE):
+                groups = group_by_owner(deltas[start:start + ADJUST_BATCH_SIZE], len(self.connections))
+                replies = await asyncio.gather(*(
+                    self.connections[owner].request("adjust_balances", group) for owner, group in groups.items()
+                ), return_exceptions=True)
+                
+                for group, reply in zip(groups.values(), replies):
+                    if not isinstance(reply, BaseException):
+                        rejected.extend(reply)
+                        if not reply:
+                            applied.extend(group)
+                for reply in replies:
+                    if isinstance(reply, BaseException):
+                        raise reply
+                if rejected:
+                    break
+        except BaseException:
+            await self.revert_balances(applied)
+            raise
+        
+        if rejected:
+            await self.revert_balances(applied)
+        return rejected
+    
+    async def revert_balances(self, deltas: List[Tuple[int, str, Decimal]]):
+        for start in range(0, len(deltas), ADJUST_BATCH_SIZE):
+            chunk = [
+                (user_id, currency, -amount) for user_id, currency, amount in deltas[start:start + ADJUST_BATCH_SIZE]
+            ]
+            await asyncio.gather(*(
+                self.connections[owner].request("adjust_balances", group)
+                for owner, group in group_by_owner(chunk, len(self.connections)).items()
+            ), return_exceptions=True)
+    
+    def handle_push(self, event: str, payload: tuple):
+        if event == "trade":
+            trade_tape.append(*payload)
+        elif event == "balances":
+            balance_cache.invalidate_local(payload)
+    
+    async def reserve(self, orders: List[Order]) -> List[Optional[ShardTicket]]:
+        tickets: List[Optional[ShardTicket]] = [ShardTicket.from_order(order) for order in orders]
+        if not self.reserve_balances:
+            return tickets
+        
+        shards = len(self.connections)
+        remote: Dict[int, List[int]] = {}
+        for index, order in enumerate(orders):
+            owner = owner_for(order.user_id, shards)
+            if owner != shard_for(order.symbol, shards):
+                remote.setdefault(owner, []).append(index)
+        
+        replies = await asyncio.gather(*(
+            self.connections[owner].request("reserve", [tickets[index] for index in indexes])
+            for owner, indexes in remote.items()
+        ))
+        for indexes, grants in zip(remote.values(), replies):
+            for index, grant in zip(indexes, grants):
+                if grant is None:
+                    orders[index].status = OrderStatus.REJECTED
+                    tickets[index] = None
+                else:
+                    tickets[index].grant = grant
+        
+        return tickets
+    
+    async def place_order(self, order: Order) -> List:
+        (ticket,) = await self.reserve([order])
+        if ticket is None:
+            return []
+        
+        trades, ticket = await self.shard(order.symbol).request("place", ticket)
+        ticket.apply(order)
+        return trades
+    
+    async def place_orders(self, orders: List[Order]) -> List[List]:
+        tickets = await self.reserve(orders)
+        
+        by_shard: Dict[int, List[int]] = {}
+        for index, order in enumerate(orders):
+            if tickets[index] is not None:
+                by_shard.setdefault(shard_for(order.symbol, len(self.connections)), []).append(index)
+        
+        replies = await asyncio.gather(*(
+            self.connections[shard].request("batch", [tickets[index] for index in indexes])
+            for shard, indexes in by_shard.items()
+        ), return_exceptions=True)
+        raise_group_failures(replies)
+        
+        results: List[List] = [[] for _ in orders]
+        for indexes, (trades, placed) in zip(by_shard.values(), replies):
+            for index, order_trades, ticket in zip(indexes, trades, placed):
+                ticket.apply(orders[index])
+                results[index] = order_trades
+        
+        return results
+    
+    async def cancel_order(self, order_id: int, db: AsyncSession) -> bool:
+        result = await db.execute(select(Order).where(Order.id == order_id))
+        order = result.scalar_one_or_none()
+        
+        if not order or order.status in [OrderStatus.FILLED, OrderStatus.CANCELLED]:
+            return False
+        
+        return await self.shard(order.symbol).request("cancel", ShardTicket.from_order(order))
+    
+    async def cancel_user_orders(self, user_id: int, symbol: Optional[str] = None) -> int:
+        connections = [self.shard(symbol)] if symbol else self.connections
+        counts = await asyncio.gather(*(
+            connection.request("mass_cancel", (user_id, symbol)) for connection in connections
+        ))
+        return sum(counts)
+    
+    async def get_open_orders(self, user_id: int, symbol: Optional[str] = None) -> List[Dict]:
+        connections = [self.shard(symbol)] if symbol else self.connections
+        replies = await asyncio.gather(*(
+            connection.request("open_orders", (user_id, symbol)) for connection in connections
+        ))
+        
+        open_orders = [order for reply in replies for order in reply]
+        open_orders.sort(key=lambda order: order["id"], reverse=True)
+        return open_orders
+    
+    def on_price_tick(self, symbol: str, price: Decimal):
+        task = asyncio.create_task(self.shard(symbol).notify("tick", (symbol, price)))
+        self.notifications.add(task)
+        task.add_done_callback(self.notifications.discard)
+    
+    async def get_order_book_snapshot(self, symbol: str, depth: int = 10) -> Dict:
+        return await self.shard(symbol).request("snapshot", (symbol, depth))
+    
+    async def get_order_book_json(self, symbol: str, depth: int = 10) -> str:
+        return await self.shard(symbol).request("json", (symbol, depth))
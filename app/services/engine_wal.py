@@ -0,0 +1,201 @@
+from typing import Callable, Dict, Iterator, List, Tuple
+from app.core.metrics import latency_metrics
+import asyncio
+import glob
+import logging
+import os
+import pickle
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct("<I")
+WAL_SYNC_LATENCY = latency_metrics.histogram("wal_sync")
+
+
+class EngineWAL:
+    def __init__(self, directory: str, fsync_interval_ms: int, snapshot_interval: int):
+        self.directory = directory
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.lsn = 0
+        self.synced_lsn = 0
+        self.file = None
+        self.waiters: List[Tuple[int, asyncio.Future]] = []
+        self.wakeup: asyncio.Event = None
+        self.sync_lock: asyncio.Lock = None
+        self.tasks: List[asyncio.Task] = []
+    
+    def segment_path(self, first_lsn: int) -> str:
+        return os.path.join(self.directory, f"{first_lsn:020d}.wal")
+    
+    def segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "*.wal")))
+    
+    @staticmethod
+    def first_lsn(path: str) -> int:
+        return int(os.path.basename(path)[:-len(".wal")])
+    
+    def read_segment(self, path: str) -> Iterator[Tuple[int, Tuple[int, tuple]]]:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    return
+                
+                (size,) = FRAME_HEADER.unpack(header)
+                data = f.read(size)
+                if len(data) < size:
+                    return
+                
+                try:
+                    frame = pickle.loads(data)
+                except Exception:
+                    return
+                yield f.tell(), frame
+    
+    def recover(self, journal_lsn: int = 0) -> Tuple[Dict[str, List[tuple]], List[tuple],
+                                                     List[Tuple[int, tuple]]]:
+        os.makedirs(self.directory, exist_ok=True)
+        
+        snapshot_lsn = 0
+        books: Dict[str, List[tuple]] = {}
+        
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snapshot_lsn, books = pickle.load(f)
+        
+        records = []
+        journal = []
+        self.lsn = max(snapshot_lsn, journal_lsn)
+        
+        for path in self.segments():
+            end = 0
+            for end, (lsn, record) in self.read_segment(path):
+                if record[0] == "journal":
+                    if lsn > journal_lsn:
+                        journal.append((lsn, record[1]))
+                elif lsn > snapshot_lsn:
+                    records.append(record)
+                self.lsn = max(self.lsn, lsn)
+            
+            if end < os.path.getsize(path):
+                logger.warning("Truncating torn WAL tail of %s at byte %d", path, end)
+                os.truncate(path, end)
+        
+        self.synced_lsn = self.lsn
+        self.file = open(self.segment_path(self.lsn + 1), "ab")
+        
+        return books, records, journal
+    
+    def append(self, record: tuple):
+        self.lsn += 1
+        data = pickle.dumps((self.lsn, record), protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.write(FRAME_HEADER.pack(len(data)))
+        self.file.write(data)
+    
+    def barrier(self) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        
+        if self.synced_lsn >= self.lsn:
+            future.set_result(None)
+            return future
+        
+        self.waiters.append((self.lsn, future))
+        self.wakeup.set()
+        return future
+    
+    def start(self, capture_books: Callable[[], Dict[str, List[tuple]]], retained_lsn: Callable[[], int]):
+        self.wakeup = asyncio.Event()
+        self.sync_lock = asyncio.Lock()
+        self.tasks = [
+            asyncio.create_task(self.run_sync()),
+            asyncio.create_task(self.run_snapshots(capture_books, retained_lsn))
+        ]
+    
+    async def run_sync(self):
+        while True:
+            await self.wakeup.wait()
+            await asyncio.sleep(self.fsync_interval)
+            self.wakeup.clear()
+            await self.sync()
+    
+    async def run_snapshots(self, capture_books: Callable[[], Dict[str, List[tuple]]],
+                            retained_lsn: Callable[[], int]):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.checkpoint(capture_books, retained_lsn())
+    
+    async def sync(self):
+        async with self.sync_lock:
+            lsn = self.lsn
+            started = time.perf_counter_ns()
+            self.file.flush()
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, self.file.fileno())
+            WAL_SYNC_LATENCY.since(started)
+            self.mark_synced(lsn)
+    
+    def mark_synced(self, lsn: int):
+        self.synced_lsn = max(self.synced_lsn, lsn)
+        
+        pending = []
+        for target, future in self.waiters:
+            if target <= lsn:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                pending.append((target, future))
+        self.waiters = pending
+    
+    async def checkpoint(self, capture_books: Callable[[], Dict[str, List[tuple]]], retained_lsn: int):
+        loop = asyncio.get_running_loop()
+        
+        async with self.sync_lock:
+            books = capture_books()
+            lsn = self.lsn
+            
+            old_file = self.file
+            old_file.flush()
+            self.file = open(self.segment_path(lsn + 1), "ab")
+            
+            await loop.run_in_executor(None, self.close_segment, old_file)
+            self.mark_synced(lsn)
+        
+        await loop.run_in_executor(None, self.write_snapshot, lsn, books)
+        
+        retained_lsn = min(lsn, retained_lsn)
+        segments = self.segments()
+        for path, following in zip(segments, segments[1:]):
+            if self.first_lsn(following) > retained_lsn + 1:
+                break
+            os.remove(path)
+    
+    def close_segment(self, file):
+        os.fsync(file.fileno())
+        file.close()
+    
+    def write_snapshot(self, lsn: int, books: Dict[str, List[tuple]]):
+        tmp_path = self.snapshot_path + ".tmp"
+        
+        with open(tmp_path, "wb") as f:
+            pickle.dump((lsn, books), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_path, self.snapshot_path)
+    
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+        
+        if self.file:
+            self.close_segment(self.file)
+            self.mark_synced(self.lsn)
+            self.file = None
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.core.config import settings
+import redis.asyncio as redis
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+PENDING = "pending"
+REPLAYED_HEADER = "Idempotent-Replayed"
+UNKNOWN_OUTCOME = "The request failed and its outcome is unknown; check its effects before retrying with a new key"
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: int, pending_seconds: int, max_keys: int, redis_url: Optional[str] = None):
+        self.ttl = ttl_seconds
+        self.pending_ttl = pending_seconds
+        self.max_keys = max_keys
+        self.records: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.redis = redis.from_url(redis_url) if redis_url else None
+        self.poll_interval = 0.05
+    
+    @staticmethod
+    def fingerprint(request: BaseModel) -> str:
+        return hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+    
+    async def execute(self, user_id: int, scope: str, key: Optional[str], request: BaseModel,
+                      handler: Callable[[], Awaitable[Any]]):
+        if key is None:
+            return await handler()
+        
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+            )
+        
+        storage_key = f"idempotency:{scope}:{user_id}:{key}"
+        fingerprint = self.fingerprint(request)
+        
+        pending = self.inflight.get(storage_key)
+        if pending is not None:
+            return self.respond(await asyncio.shield(pending), fingerprint, True)
+        
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[storage_key] = future
+        
+        try:
+            record = await self.claim(storage_key, fingerprint)
+            replayed = record is not None
+            if record is None:
+                record = await self.run(storage_key, fingerprint, handler)
+            future.set_result(record)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self.inflight[storage_key]
+        
+        return self.respond(record, fingerprint, replayed)
+    
+    async def run(self, storage_key: str, fingerprint: str, handler: Callable[[], Awaitable[Any]]) -> Dict:
+        try:
+            record = {"fingerprint": fingerprint, "status": status.HTTP_200_OK, "body": jsonable_encoder(await handler())}
+        except HTTPException as e:
+            if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE:
+                await self.release(storage_key)
+                raise
+            record = {"fingerprint": fingerprint, "status": e.status_code, "body": {"detail": e.detail}}
+        except BaseException:
+            await self.save(storage_key, {
+                "fingerprint": fingerprint,
+                "status": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "body": {"detail": UNKNOWN_OUTCOME}
+            })
+            raise
+        
+        await self.save(storage_key, record)
+        return record
+    
+    @staticmethod
+    def respond(record: Dict, fingerprint: str, replayed: bool) -> JSONResponse:
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        
+        return JSONResponse(
+            status_code=record["status"],
+            content=record["body"],
+            headers={REPLAYED_HEADER: "true"} if replayed else None
+        )
+    
+    def local_get(self, storage_key: str) -> Optional[Dict]:
+        entry = self.records.get(storage_key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.records[storage_key]
+            return None
+        
+        self.records.move_to_end(storage_key)
+        return entry[1]
+    
+    def local_put(self, storage_key: str, record: Dict):
+        self.records[storage_key] = (time.monotonic() + self.ttl, record)
+        self.records.move_to_end(storage_key)
+        
+        while len(self.records) > self.max_keys:
+            self.records.popitem(last=False)
+    
+    async def claim(self, storage_key: str, fingerprint: str) -> Optional[Dict]:
+        record = self.local_get(storage_key)
+        if record is not None or not self.redis:
+            return record
+        
+        marker = json.dumps({"fingerprint": fingerprint, "status": PENDING})
+        deadline = time.monotonic() + self.pending_ttl
+        
+        try:
+            while True:
+                if await self.redis.set(storage_key, marker, nx=True, px=self.pending_ttl * 1000):
+                    return None
+                
+                stored = await self.redis.get(storage_key)
+                if stored is not None:
+                    record = json.loads(stored)
+                    if record["status"] != PENDING:
+                        self.local_put(storage_key, record)
+                        return record
+                    if record["fingerprint"] != fingerprint:
+                        return record
+                
+                if time.monotonic() >= deadline:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key is still in progress"
+                    )
+                await asyncio.sleep(self.poll_interval)
+        except redis.RedisError:
+            logger.warning("Idempotency store unavailable, using in-process records", exc_info=True)
+            return None
+    
+    async def save(self, storage_key: str, record: Dict):
+        self.local_put(storage_key, record)
+        
+        if self.redis:
+            try:
+                await self.redis.set(storage_key, json.dumps(record), px=self.ttl * 1000)
+            except redis.RedisError:
+                logger.warning("Failed to store idempotent response in Redis", exc_info=True)
+    
+    async def release(self, storage_key: str):
+        if self.redis:
+            try:
+                await self.redis.delete(storage_key)
+            except redis.RedisError:
+                logger.warning("Failed to release Idempotency-Key in Redis", exc_info=True)
+    
+    async def close(self):
+        if self.redis:
+            await self.redis.aclose()
+
+
+idempotency_store = IdempotencyStore(
+    settings.idempotency_ttl_seconds,
+    settings.idempotency_pending_seconds,
+    settings.idempotency_max_keys,
+    settings.redis_url if settings.idempotency_redis else None
+)
@@ -0,0 +1,57 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict
+from dataclasses import dataclass, field
+from app.models.trading import Order
+
+PRICE_DECIMALS = Order.__table__.c.price.type.scale
+QUANTITY_DECIMALS = Order.__table__.c.quantity.type.scale
+
+
+@dataclass
+class Instrument:
+    symbol: str
+    price_decimals: int = PRICE_DECIMALS
+    quantity_decimals: int = QUANTITY_DECIMALS
+    price_scale: int = field(init=False)
+    quantity_scale: int = field(init=False)
+    
+    def __post_init__(self):
+        self.price_scale = 10 ** self.price_decimals
+        self.quantity_scale = 10 ** self.quantity_decimals
+    
+    @property
+    def base_currency(self) -> str:
+        return self.symbol[:3]
+    
+    @property
+    def quote_currency(self) -> str:
+        return self.symbol[3:]
+    
+    def to_ticks(self, price: Decimal) -> int:
+        return int((price * self.price_scale).to_integral_value(rounding=ROUND_HALF_UP))
+    
+    def from_ticks(self, ticks: int) -> Decimal:
+        return Decimal(ticks).scaleb(-self.price_decimals)
+    
+    def to_lots(self, quantity: Decimal) -> int:
+        return int((quantity * self.quantity_scale).to_integral_value(rounding=ROUND_HALF_UP))
+    
+    def from_lots(self, lots: int) -> Decimal:
+        return Decimal(lots).scaleb(-self.quantity_decimals)
+    
+    def notional_ticks(self, lots: int, ticks: int, numerator: int = 1, denominator: int = 1) -> int:
+        divisor = self.quantity_scale * denominator
+        return (lots * ticks * numerator + divisor // 2) // divisor
+
+
+instruments: Dict[str, Instrument] = {}
+
+
+def get_instrument(symbol: str) -> Instrument:
+    instrument = instruments.get(symbol)
+    
+    if instrument is None:
+        instrument = Instrument(symbol)
+        instruments[symbol] = instrument
+    
+    return instrument
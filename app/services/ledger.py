@@ -0,0 +1,307 @@
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import BigInteger, Text, and_, case, cast, func, literal, select, union_all, update
+from sqlalchemy.dialects.postgresql import REGCLASS
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.trading import JournalPosition
+from app.models.wallet import LedgerEntry, Wallet
+from app.core.database import AsyncSessionLocal
+from app.core.config import settings
+import asyncio
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+LEDGER = LedgerEntry.__table__
+WALLETS = Wallet.__table__
+AVAILABLE = "available"
+LOCKED = "locked"
+FEES = "fees"
+EXTERNAL = "external"
+COMPACTION_POSITION = "ledger_compaction"
+COMPACTION_LOCK_ID = 0x6C6564676572
+
+BalanceDeltas = Dict[Tuple[int, str], List[Decimal]]
+CURRENT_XID = cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+SNAPSHOT_XMIN = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+SNAPSHOT_XMAX = cast(cast(func.pg_snapshot_xmax(func.pg_current_snapshot()), Text), BigInteger)
+LAST_ENTRY_ID = func.coalesce(
+    func.pg_sequence_last_value(cast(func.pg_get_serial_sequence(LEDGER.name, "id"), REGCLASS)), 0
+)
+
+
+def add_delta(deltas: BalanceDeltas, user_id: int, currency: str, available: Decimal, locked: Decimal = Decimal("0")):
+    delta = deltas.get((user_id, currency))
+    if delta is None:
+        deltas[(user_id, currency)] = [available, locked]
+    else:
+        delta[0] += available
+        delta[1] += locked
+
+
+async def assign_xid(db: AsyncSession):
+    connection = await db.connection()
+    if connection.dialect.name == "postgresql":
+        await connection.execute(select(CURRENT_XID))
+
+
+async def try_compaction_lock(db: AsyncSession) -> bool:
+    connection = await db.connection()
+    if connection.dialect.name != "postgresql":
+        return True
+    return (await connection.execute(select(func.pg_try_advisory_xact_lock(COMPACTION_LOCK_ID)))).scalar()
+
+
+async def write_horizon(db: AsyncSession) -> Tuple[int, int, int]:
+    connection = await db.connection()
+    if connection.dialect.name != "postgresql":
+        return (await connection.execute(select(func.coalesce(func.max(LEDGER.c.id), 0)))).scalar(), 0, 0
+    
+    return tuple((await connection.execute(select(LAST_ENTRY_ID, SNAPSHOT_XMIN, SNAPSHOT_XMAX))).one())
+
+
+def posting_rows(deltas: BalanceDeltas, entry_type: str, counter_account: str) -> List[Dict]:
+    posting_id = uuid.uuid4().hex
+    rows = []
+    totals: Dict[str, Decimal] = {}
+    
+    for (user_id, currency), (available, locked) in deltas.items():
+        for account, amount in ((AVAILABLE, available), (LOCKED, locked)):
+            if amount:
+                rows.append({"posting_id": posting_id, "user_id": user_id, "currency": currency,
+                             "account": account, "amount": amount, "type": entry_type})
+        totals[currency] = totals.get(currency, Decimal("0")) + available + locked
+    
+    for currency, total in totals.items():
+        if total:
+            rows.append({"posting_id": posting_id, "user_id": None, "currency": currency,
+                         "account": counter_account, "amount": -total, "type": entry_type})
+    
+    return rows
+
+
+def account_balance(account: str):
+    tail = (
+        select(func.coalesce(func.sum(LEDGER.c.amount), 0))
+        .where(LEDGER.c.user_id == WALLETS.c.user_id, LEDGER.c.currency == WALLETS.c.currency,
+               LEDGER.c.account == account, LEDGER.c.id > WALLETS.c.ledger_entry_id)
+        .scalar_subquery()
+    )
+    return (WALLETS.c.available_balance if account == AVAILABLE else WALLETS.c.locked_balance) + tail
+
+
+def guarded_postings(deltas: BalanceDeltas, entry_type: str, counter_account: str, guard):
+    columns = ["posting_id", "user_id", "currency", "account", "amount", "type"]
+    return LEDGER.insert().from_select(columns, union_all(*(
+        select(*(literal(row[column], LEDGER.c[column].type) for column in columns)).select_from(guard)
+        for row in posting_rows(deltas, entry_type, counter_account)
+    )))
+
+
+def tail_sums(user_ids: Optional[List[int]] = None):
+    statement = (
+        select(
+            LEDGER.c.user_id,
+            LEDGER.c.currency,
+            func.sum(case((LEDGER.c.account == AVAILABLE, LEDGER.c.amount), else_=0)).label("available"),
+            func.sum(case((LEDGER.c.account == LOCKED, LEDGER.c.amount), else_=0)).label("locked")
+        )
+        .select_from(LEDGER.join(WALLETS, and_(WALLETS.c.user_id == LEDGER.c.user_id,
+                                               WALLETS.c.currency == LEDGER.c.currency)))
+        .where(LEDGER.c.id > WALLETS.c.ledger_entry_id)
+        .group_by(LEDGER.c.user_id, LEDGER.c.currency)
+    )
+    if user_ids is not None:
+        statement = statement.where(LEDGER.c.user_id.in_(user_ids))
+    return statement.subquery()
+
+
+class Ledger:
+    def __init__(self, compaction_interval: int, session_factory=AsyncSessionLocal):
+        self.compaction_interval = compaction_interval
+        self.session_factory = session_factory
+        self.watermark = 0
+        self.horizon: Optional[Tuple[int, int]] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    async def append(self, db: AsyncSession, deltas: BalanceDeltas, entry_type: str, counter_account: str):
+        rows = posting_rows(deltas, entry_type, counter_account) if deltas else []
+        if rows:
+            await assign_xid(db)
+            await db.execute(LEDGER.insert(), rows)
+    
+    async def get_balances(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[Tuple[int, str], Tuple[Decimal, Decimal]]:
+        user_ids = list(user_ids)
+        tail = tail_sums(user_ids)
+        result = await db.execute(
+            select(
+                WALLETS.c.user_id,
+                WALLETS.c.currency,
+                WALLETS.c.available_balance + func.coalesce(tail.c.available, 0),
+                WALLETS.c.locked_balance + func.coalesce(tail.c.locked, 0)
+            )
+            .select_from(WALLETS.outerjoin(tail, and_(tail.c.user_id == WALLETS.c.user_id,
+                                                      tail.c.currency == WALLETS.c.currency)))
+            .where(WALLETS.c.user_id.in_(user_ids))
+        )
+        return {(user_id, currency): (available, locked) for user_id, currency, available, locked in result}
+    
+    async def compact(self, db: AsyncSession) -> int:
+        if not await try_compaction_lock(db):
+            return 0
+        
+        last_id, xmin, xmax = await write_horizon(db)
+        
+        upto = None
+        if self.horizon is not None and self.horizon[1] <= xmin:
+            upto = self.horizon[0]
+            self.horizon = None
+        if self.horizon is None:
+            self.horizon = (last_id, xmax)
+        
+        watermark = (await db.execute(
+            select(JournalPosition.lsn).where(JournalPosition.name == COMPACTION_POSITION)
+        )).scalar()
+        self.watermark = watermark or 0
+        if upto is None or upto <= self.watermark:
+            return 0
+        
+        snapshot = WALLETS.alias("snapshot")
+        folded = (
+            select(
+                LEDGER.c.user_id,
+                LEDGER.c.currency,
+                snapshot.c.ledger_entry_id.label("from_id"),
+                func.max(LEDGER.c.id).label("last_id"),
+                func.sum(case((LEDGER.c.account == AVAILABLE, LEDGER.c.amount), else_=0)).label("available"),
+                func.sum(case((LEDGER.c.account == LOCKED, LEDGER.c.amount), else_=0)).label("locked")
+            )
+            .select_from(LEDGER.join(snapshot, and_(snapshot.c.user_id == LEDGER.c.user_id,
+                                                    snapshot.c.currency == LEDGER.c.currency)))
+            .where(LEDGER.c.id > self.watermark, LEDGER.c.id <= upto, LEDGER.c.id > snapshot.c.ledger_entry_id)
+            .group_by(LEDGER.c.user_id, LEDGER.c.currency, snapshot.c.ledger_entry_id)
+            .subquery()
+        )
+        
+        result = await db.execute(
+            update(WALLETS)
+            .where(
+                WALLETS.c.user_id == folded.c.user_id,
+                WALLETS.c.currency == folded.c.currency,
+                WALLETS.c.ledger_entry_id == folded.c.from_id
+            )
+            .values(
+                available_balance=WALLETS.c.available_balance + folded.c.available,
+                locked_balance=WALLETS.c.locked_balance + folded.c.locked,
+                ledger_entry_id=folded.c.last_id,
+                updated_at=func.now()
+            )
+        )
+        if watermark is None:
+            db.add(JournalPosition(name=COMPACTION_POSITION, lsn=upto))
+        else:
+            await db.execute(
+                update(JournalPosition).where(JournalPosition.name == COMPACTION_POSITION).values(lsn=upto)
+            )
+        await db.commit()
+        
+        self.watermark = upto
+        return result.rowcount
+    
+    async def reconcile(self, db: AsyncSession) -> Dict:
+        snapshots = {
+            (user_id, currency): (available, locked, ledger_entry_id)
+            for user_id, currency, available, locked, ledger_entry_id in await db.execute(
+                select(WALLETS.c.user_id, WALLETS.c.currency, WALLETS.c.available_balance, WALLETS.c.locked_balance,
+                       WALLETS.c.ledger_entry_id)
+            )
+        }
+        folded: Dict[Tuple[int, str], List[Decimal]] = {key: [Decimal("0"), Decimal("0")] for key in snapshots}
+        postings: Dict[Tuple[str, str], Decimal] = {}
+        entries = 0
+        
+        result = await db.stream(
+            select(LEDGER.c.id, LEDGER.c.posting_id, LEDGER.c.user_id, LEDGER.c.currency, LEDGER.c.account,
+                   LEDGER.c.amount)
+            .order_by(LEDGER.c.id)
+            .execution_options(yield_per=10000)
+        )
+        
+        async for entry_id, posting_id, user_id, currency, account, amount in result:
+            entries += 1
+            
+            key = (posting_id, currency)
+            total = postings.get(key, Decimal("0")) + amount
+            if total:
+                postings[key] = total
+            else:
+                postings.pop(key, None)
+            
+            if user_id is not None:
+                snapshot = snapshots.get((user_id, currency))
+                if snapshot is not None and entry_id <= snapshot[2]:
+                    folded[(user_id, currency)][0 if account == AVAILABLE else 1] += amount
+        
+        return {
+            "entries": entries,
+            "unbalanced_postings": [
+                {"posting_id": posting_id, "currency": currency, "imbalance": str(total)}
+                for (posting_id, currency), total in postings.items()
+            ],
+            "mismatched_wallets": [
+                {
+                    "user_id": user_id,
+                    "currency": currency,
+                    "snapshot": [str(snapshots[(user_id, currency)][0]), str(snapshots[(user_id, currency)][1])],
+                    "ledger": [str(available), str(locked)]
+                }
+                for (user_id, currency), (available, locked) in folded.items()
+                if (available, locked) != tuple(snapshots[(user_id, currency)][:2])
+            ]
+        }
+    
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.compaction_interval)
+            
+            try:
+                async with self.session_factory() as db:
+                    compacted = await self.compact(db)
+                if compacted:
+                    logger.info("Folded ledger entries up to %d into %d wallet snapshots", self.watermark, compacted)
+            except Exception:
+                logger.exception("Ledger compaction failed")
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+ledger = Ledger(settings.ledger_compaction_interval_seconds)
+
+
+async def reconcile():
+    async with AsyncSessionLocal() as db:
+        return await ledger.reconcile(db)
+
+
+def main():
+    report = asyncio.run(reconcile())
+    print(json.dumps(report, indent=2))
+    if report["unbalanced_postings"] or report["mismatched_wallets"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from typing import Dict, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.trading import MarketData
 from app.core.database import AsyncSessionLocal
+from app.services.trading_engine import trading_engine
 import aioredis
 from app.core.config import settings
 from dataclasses import dataclass
@@ -81,6 +82,7 @@ class MarketDataService:
     
     async def update_price(self, price_update: PriceUpdate):
         self.price_cache[price_update.symbol] = price_update
+        trading_engine.on_price_tick(price_update.symbol, price_update.price)
         
         await self.redis.hset(
             f"price:{price_update.symbol}",
@@ -0,0 +1,50 @@
+from typing import Deque, List, Optional
+from sqlalchemy import func, select, text
+from app.models.trading import Order
+from app.core.database import AsyncSessionLocal
+from app.core.config import settings
+from collections import deque
+import asyncio
+
+ORDER_ID_SEQUENCE = f"{Order.__tablename__}_id_seq"
+
+
+class OrderIdAllocator:
+    def __init__(self, block_size: int, session_factory=AsyncSessionLocal):
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self.ids: Deque[int] = deque()
+        self.last_id = 0
+        self.lock: Optional[asyncio.Lock] = None
+    
+    async def next_id(self) -> int:
+        return (await self.allocate(1))[0]
+    
+    async def allocate(self, count: int) -> List[int]:
+        if len(self.ids) < count:
+            if self.lock is None:
+                self.lock = asyncio.Lock()
+            
+            async with self.lock:
+                if len(self.ids) < count:
+                    self.ids.extend(await self.fetch_block(max(self.block_size, count - len(self.ids))))
+        
+        return [self.ids.popleft() for _ in range(count)]
+    
+    async def fetch_block(self, count: int) -> List[int]:
+        async with self.session_factory() as db:
+            connection = await db.connection()
+            if connection.dialect.name != "postgresql":
+                persisted = (await connection.execute(select(func.coalesce(func.max(Order.id), 0)))).scalar()
+                first = max(persisted, self.last_id) + 1
+                self.last_id = first + count - 1
+                return list(range(first, first + count))
+            
+            result = await connection.execute(
+                text(f"SELECT nextval('{ORDER_ID_SEQUENCE}') FROM generate_series(1, :count)"),
+                {"count": count}
+            )
+            return sorted(result.scalars().all())
+
+
+order_ids = OrderIdAllocator(settings.order_id_block_size)
@@ -83,9 +83,9 @@ class RiskManagementService:
             quote_currency = order.symbol[3:]
             required_balance = order.quantity * (order.price or Decimal("0"))
             
-            wallet = await wallet_service.get_wallet(user.id, quote_currency, db)
+            available = await wallet_service.get_available_balance(user.id, quote_currency, db)
             
-            if not wallet or wallet.available_balance < required_balance:
+            if available is None or available < required_balance:
                 return RiskResult(
                     approved=False,
                     reason=f"Insufficient {quote_currency} balance"
@@ -93,9 +93,9 @@ class RiskManagementService:
         else:
             base_currency = order.symbol[:3]
             
-            wallet = await wallet_service.get_wallet(user.id, base_currency, db)
+            available = await wallet_service.get_available_balance(user.id, base_currency, db)
             
-            if not wallet or wallet.available_balance < order.quantity:
+            if available is None or available < order.quantity:
                 return RiskResult(
                     approved=False,
                     reason=f"Insufficient {base_currency} balance"
@@ -0,0 +1,45 @@
+from typing import Iterable, Tuple
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.wallet import Transaction, Wallet
+from app.services.ledger import FEES, WALLETS, BalanceDeltas, ledger
+
+TRANSACTIONS = Transaction.__table__
+SETTLEMENT_TRANSACTION_TYPE = "trade"
+
+
+async def apply_balance_deltas(db: AsyncSession, deltas: BalanceDeltas, new_wallets: Iterable[Tuple[int, str]] = ()):
+    new_wallets = list(new_wallets)
+    if new_wallets:
+        await db.execute(
+            pg_insert(Wallet).on_conflict_do_nothing(index_elements=[Wallet.user_id, Wallet.currency]),
+            [
+                {"user_id": user_id, "currency": currency, "available_balance": 0, "locked_balance": 0}
+                for user_id, currency in new_wallets
+            ]
+        )
+    
+    if not deltas:
+        return
+    
+    await ledger.append(db, deltas, SETTLEMENT_TRANSACTION_TYPE, FEES)
+    
+    transactions = [
+        {"b_user_id": user_id, "b_currency": currency, "b_amount": available + locked}
+        for (user_id, currency), (available, locked) in deltas.items() if available + locked
+    ]
+    if transactions:
+        await db.execute(
+            TRANSACTIONS.insert().values(
+                user_id=bindparam("b_user_id"),
+                wallet_id=select(WALLETS.c.id)
+                .where(WALLETS.c.user_id == bindparam("b_user_id"), WALLETS.c.currency == bindparam("b_currency"))
+                .scalar_subquery(),
+                type=SETTLEMENT_TRANSACTION_TYPE,
+                amount=bindparam("b_amount"),
+                currency=bindparam("b_currency"),
+                status="completed"
+            ),
+            transactions
+        )
@@ -0,0 +1,120 @@
+from decimal import Decimal
+from typing import Dict, List, Optional, Set, Tuple
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+import bisect
+
+STOP_ORDER_TYPES = (OrderType.STOP_LOSS, OrderType.TAKE_PROFIT)
+
+
+class TriggerOrder:
+    __slots__ = ("id", "user_id", "symbol", "side", "order_type", "quantity", "price", "stop_price",
+                 "status", "filled_quantity", "remaining_quantity")
+    
+    def __init__(self, order_id: int, user_id: int, symbol: str, side: OrderSide, order_type: OrderType,
+                 quantity: Decimal, price: Optional[Decimal], stop_price: int):
+        self.id = order_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.stop_price = stop_price
+        self.status = OrderStatus.PENDING
+        self.filled_quantity = Decimal("0")
+        self.remaining_quantity = quantity
+    
+    @classmethod
+    def from_order(cls, order: Order, stop_price: int) -> "TriggerOrder":
+        return cls(order.id, order.user_id, order.symbol, order.side, order.order_type,
+                   order.quantity, order.price, stop_price)
+    
+    @property
+    def rising(self) -> bool:
+        if self.order_type == OrderType.STOP_LOSS:
+            return self.side == OrderSide.BUY
+        return self.side == OrderSide.SELL
+    
+    def state(self) -> tuple:
+        return (self.symbol, self.id, self.user_id, self.side.value, self.order_type.value,
+                self.quantity, self.price, self.stop_price)
+    
+    @classmethod
+    def from_state(cls, state: tuple) -> "TriggerOrder":
+        symbol, order_id, user_id, side, order_type, quantity, price, stop_price = state
+        return cls(order_id, user_id, symbol, OrderSide(side), OrderType(order_type), quantity, price, stop_price)
+
+
+class TriggerIndex:
+    def __init__(self):
+        self.rising: List[Tuple[int, int, int]] = []
+        self.falling: List[Tuple[int, int, int]] = []
+        self.armed: Dict[int, TriggerOrder] = {}
+        self.user_orders: Dict[int, Set[int]] = {}
+        self.last_price: Optional[int] = None
+        self.sequence = 0
+        self.dead = 0
+    
+    def __len__(self) -> int:
+        return len(self.armed)
+    
+    def arm(self, order: TriggerOrder):
+        self.sequence += 1
+        self.armed[order.id] = order
+        self.user_orders.setdefault(order.user_id, set()).add(order.id)
+        
+        if order.rising:
+            bisect.insort(self.rising, (-order.stop_price, -self.sequence, order.id))
+        else:
+            bisect.insort(self.falling, (order.stop_price, -self.sequence, order.id))
+    
+    def disarm(self, order_id: int) -> Optional[TriggerOrder]:
+        order = self.armed.pop(order_id, None)
+        
+        if order is not None:
+            self.forget(order)
+            self.dead += 1
+            if self.dead > len(self.armed) + 1024:
+                self.compact()
+        
+        return order
+    
+    def forget(self, order: TriggerOrder):
+        user_orders = self.user_orders[order.user_id]
+        user_orders.discard(order.id)
+        if not user_orders:
+            del self.user_orders[order.user_id]
+    
+    def compact(self):
+        self.rising = [item for item in self.rising if item[2] in self.armed]
+        self.falling = [item for item in self.falling if item[2] in self.armed]
+        self.dead = 0
+    
+    def crossed(self, price: int) -> bool:
+        if self.rising and self.rising[-1][0] >= -price:
+            return True
+        if self.falling and self.falling[-1][0] >= price:
+            return True
+        return False
+    
+    def release(self, price: int) -> List[TriggerOrder]:
+        self.last_price = price
+        released = []
+        
+        for keys, threshold in ((self.rising, -price), (self.falling, price)):
+            if not keys or keys[-1][0] < threshold:
+                continue
+            
+            cut = bisect.bisect_left(keys, (threshold,))
+            crossed = keys[cut:]
+            del keys[cut:]
+            
+            for _, _, order_id in reversed(crossed):
+                order = self.armed.pop(order_id, None)
+                if order is None:
+                    self.dead -= 1
+                else:
+                    self.forget(order)
+                    released.append(order)
+        
+        return released
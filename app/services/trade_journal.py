@@ -0,0 +1,362 @@
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import exc, insert, select, update
+from app.models.trading import JournalPosition, Order, OrderStatus, Trade
+from app.models.wallet import Wallet
+from app.core.database import AsyncSessionLocal
+from app.core.config import settings
+from app.core.metrics import latency_metrics
+from app.services.settlement import apply_balance_deltas
+from app.services.balance_cache import balance_cache
+from app.services.engine_wal import EngineWAL
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PERSIST_LATENCY = latency_metrics.histogram("persist")
+BALANCE_DECIMALS = Wallet.__table__.c.available_balance.type.scale
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError, OSError, asyncio.TimeoutError)
+
+
+class JournalHaltedError(RuntimeError):
+    pass
+
+
+class JournalBatch:
+    __slots__ = ("inserts", "trades", "orders", "cancels", "wallets", "balances", "waiters", "lsn")
+    
+    def __init__(self, lsn: int = 0):
+        self.inserts: List = []
+        self.trades: List = []
+        self.orders: Dict[int, tuple] = {}
+        self.cancels: List[int] = []
+        self.wallets: List[Tuple[int, str]] = []
+        self.balances: Dict[Tuple[int, str], List[int]] = {}
+        self.waiters: List[asyncio.Future] = []
+        self.lsn = lsn
+    
+    def __len__(self) -> int:
+        return (len(self.inserts) + len(self.trades) + len(self.orders) + len(self.cancels) +
+                len(self.wallets) + len(self.balances))
+    
+    def add_balance(self, user_id: int, currency: str, available: int, locked: int):
+        delta = self.balances.get((user_id, currency))
+        if delta is None:
+            self.balances[(user_id, currency)] = [available, locked]
+        else:
+            delta[0] += available
+            delta[1] += locked
+    
+    @classmethod
+    def merge(cls, batches: List["JournalBatch"]) -> "JournalBatch":
+        if len(batches) == 1:
+            return batches[0]
+        
+        merged = cls(batches[-1].lsn)
+        for batch in batches:
+            merged.inserts.extend(batch.inserts)
+            merged.trades.extend(batch.trades)
+            merged.orders.update(batch.orders)
+            merged.cancels.extend(batch.cancels)
+            merged.wallets.extend(batch.wallets)
+            for (user_id, currency), (available, locked) in batch.balances.items():
+                merged.add_balance(user_id, currency, available, locked)
+        return merged
+    
+    def state(self) -> tuple:
+        return self.inserts, self.trades, self.orders, self.cancels, self.wallets, self.balances
+    
+    @classmethod
+    def from_state(cls, lsn: int, state: tuple) -> "JournalBatch":
+        batch = cls(lsn)
+        batch.inserts, batch.trades, batch.orders, batch.cancels, batch.wallets, batch.balances = state
+        return batch
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    return isinstance(error, exc.DBAPIError) and error.connection_invalidated
+
+
+class TradeJournal:
+    def __init__(self, flush_interval_ms: int, max_batch_size: int, session_factory=AsyncSessionLocal,
+                 max_pending: Optional[int] = None, halt_retry_ms: int = 5000):
+        self.flush_interval = flush_interval_ms / 1000
+        self.halt_retry_interval = halt_retry_ms / 1000
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+        self.current = JournalBatch()
+        self.closed: List[JournalBatch] = []
+        self.wal: Optional[EngineWAL] = None
+        self.position: Optional[str] = None
+        self.committed_lsn = 0
+        self.halted: Optional[Exception] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    def record_new_order(self, order):
+        self.current.inserts.append(self.order_row(order))
+    
+    def record_trade(self, trade):
+        self.current.trades.append(trade)
+    
+    def record_order(self, order_id: int, status, quantity: int, remaining: int, instrument):
+        self.current.orders[order_id] = (status, quantity, remaining, instrument)
+    
+    def record_cancellations(self, order_ids: List[int]):
+        self.current.cancels.extend(order_ids)
+    
+    def record_new_wallet(self, user_id: int, currency: str):
+        self.current.wallets.append((user_id, currency))
+    
+    def record_balance(self, user_id: int, currency: str, available: int, locked: int):
+        self.current.add_balance(user_id, currency, available, locked)
+    
+    def barrier(self, lsn: int = 0) -> asyncio.Future:
+        self.ensure_started()
+        
+        future = asyncio.get_running_loop().create_future()
+        
+        if not self.pending_size():
+            future.set_result(None)
+            return future
+        
+        if self.current:
+            self.current.lsn = lsn
+            self.closed.append(self.current)
+            self.current = JournalBatch()
+        self.closed[-1].waiters.append(future)
+        self.wakeup.set()
+        return future
+    
+    def ensure_started(self):
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+    
+    async def wait_capacity(self):
+        while self.max_pending and len(self.closed) >= self.max_pending:
+            self.ensure_started()
+            self.wakeup.set()
+            await asyncio.sleep(self.flush_interval)
+    
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            
+            if self.pending_size() < self.max_batch_size:
+                await asyncio.sleep(self.flush_interval)
+            
+            self.wakeup.clear()
+            await self.flush()
+    
+    def pending_size(self) -> int:
+        return len(self.closed) + (1 if self.current else 0)
+    
+    def take(self) -> List[JournalBatch]:
+        if self.wal is not None:
+            synced = self.wal.synced_lsn
+            count = 0
+            for batch in self.closed:
+                if batch.lsn > synced:
+                    break
+                count += 1
+            batches, self.closed = self.closed[:count], self.closed[count:]
+            return batches
+        
+        batches = self.closed
+        if self.current:
+            batches.append(self.current)
+            self.current = JournalBatch()
+        self.closed = []
+        return batches
+    
+    def restore(self, lsn: int, state: tuple):
+        self.closed.append(JournalBatch.from_state(lsn, state))
+    
+    async def load_position(self, name: str) -> int:
+        async with self.session_factory() as db:
+            lsn = (await db.execute(select(JournalPosition.lsn).where(JournalPosition.name == name))).scalar()
+            if lsn is None:
+                lsn = 0
+                db.add(JournalPosition(name=name, lsn=lsn))
+                await db.commit()
+        
+        self.position = name
+        self.committed_lsn = lsn
+        return lsn
+    
+    async def flush(self):
+        batches = self.take()
+        if self.closed:
+            self.wakeup.set()
+        if not batches:
+            return
+        
+        started = time.perf_counter_ns()
+        retry = await self.write_batches(batches)
+        if retry:
+            self.closed = retry + self.closed
+            self.wakeup.set()
+            await asyncio.sleep(self.halt_retry_interval if self.halted is not None else self.flush_interval)
+            return
+        
+        if self.halted is not None:
+            logger.warning("Trade journal caught up, accepting orders again")
+            self.halted = None
+        PERSIST_LATENCY.since(started)
+    
+    async def write_batches(self, batches: List[JournalBatch]) -> List[JournalBatch]:
+        batch = JournalBatch.merge(batches)
+        
+        try:
+            await self.write_batch(batch.inserts, batch.trades, batch.orders, batch.cancels, batch.wallets,
+                                   batch.balances, batch.lsn)
+        except Exception as e:
+            if is_transient(e):
+                logger.warning("Trade journal flush failed, retrying %d orders and %d trades",
+                               len(batch.inserts), len(batch.trades), exc_info=True)
+                return batches
+            
+            if len(batches) == 1:
+                if self.halted is None:
+                    logger.error("Trade journal halted on the batch at WAL position %d with %d orders and %d trades; "
+                                 "refusing new orders until it commits", batch.lsn, len(batch.inserts),
+                                 len(batch.trades), exc_info=True)
+                self.halted = e
+                return batches
+            
+            middle = len(batches) // 2
+            retry = await self.write_batches(batches[:middle])
+            if retry:
+                return retry + batches[middle:]
+            return await self.write_batches(batches[middle:])
+        
+        self.committed_lsn = max(self.committed_lsn, batch.lsn)
+        for written in batches:
+            self.resolve(written.waiters)
+        return []
+    
+    async def write_batch(self, inserts: List, trades: List, orders: Dict[int, tuple], cancels: List[int],
+                          wallets: List[Tuple[int, str]], balances: Dict[Tuple[int, str], List[int]], lsn: int = 0):
+        async with self.session_factory() as db:
+            if inserts:
+                orders = dict(orders)
+                await db.execute(insert(Order), [self.updated_row(row, orders.pop(row["id"], None)) for row in inserts])
+            
+            if trades:
+                result = await db.execute(
+                    insert(Trade).returning(Trade.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "order_id": trade.order_id,
+                            "user_id": trade.user_id,
+                            "symbol": trade.symbol,
+                            "side": trade.side,
+                            "quantity": trade.quantity,
+                            "price": trade.price,
+                            "fee": trade.fee,
+                            "fee_currency": trade.fee_currency,
+                            "executed_at": trade.executed_at
+                        }
+                        for trade in trades
+                    ]
+                )
+                
+                for trade, trade_id in zip(trades, result.scalars().all()):
+                    trade.trade_id = trade_id
+            
+            if orders:
+                await db.execute(
+                    update(Order),
+                    [
+                        {
+                            "id": order_id,
+                            "status": status,
+                            "filled_quantity": instrument.from_lots(quantity - remaining),
+                            "remaining_quantity": instrument.from_lots(remaining)
+                        }
+                        for order_id, (status, quantity, remaining, instrument) in orders.items()
+                    ]
+                )
+            
+            if cancels:
+                await db.execute(
+                    update(Order)
+                    .where(Order.id.in_(cancels))
+                    .values(status=OrderStatus.CANCELLED)
+                    .execution_options(synchronize_session=False)
+                )
+            
+            if wallets or balances:
+                await apply_balance_deltas(db, {
+                    key: [Decimal(available).scaleb(-BALANCE_DECIMALS), Decimal(locked).scaleb(-BALANCE_DECIMALS)]
+                    for key, (available, locked) in balances.items()
+                }, wallets)
+            
+            if lsn and self.position is not None:
+                await db.execute(
+                    update(JournalPosition).where(JournalPosition.name == self.position).values(lsn=lsn)
+                )
+            
+            await db.commit()
+        
+        if balances:
+            await balance_cache.invalidate(user_id for user_id, _ in balances)
+    
+    @staticmethod
+    def order_row(order) -> Dict:
+        return {
+            "id": order.id,
+            "user_id": order.user_id,
+            "symbol": order.symbol,
+            "order_type": order.order_type,
+            "side": order.side,
+            "status": order.status,
+            "quantity": order.quantity,
+            "price": order.price,
+            "stop_price": order.stop_price,
+            "filled_quantity": order.filled_quantity,
+            "remaining_quantity": order.remaining_quantity,
+            "created_at": order.created_at
+        }
+    
+    @staticmethod
+    def updated_row(row: Dict, update: Optional[tuple]) -> Dict:
+        if update is not None:
+            status, quantity, remaining, instrument = update
+            row = dict(row)
+            row["status"] = status
+            row["filled_quantity"] = instrument.from_lots(quantity - remaining)
+            row["remaining_quantity"] = instrument.from_lots(remaining)
+        
+        return row
+    
+    def resolve(self, waiters: List[asyncio.Future]):
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        
+        if self.pending_size():
+            await self.flush()
+
+
+trade_journal = TradeJournal(
+    settings.trade_journal_flush_ms,
+    settings.trade_journal_max_batch,
+    max_pending=settings.trade_journal_max_pending,
+    halt_retry_ms=settings.trade_journal_halt_retry_ms
+)
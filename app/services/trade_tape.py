@@ -0,0 +1,57 @@
+from typing import Callable, Deque, Dict, List
+from app.core.config import settings
+from app.services.instruments import get_instrument
+from collections import deque
+import itertools
+
+
+class TradeTape:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.tapes: Dict[str, Deque[tuple]] = {}
+        self.sequences: Dict[str, int] = {}
+        self.listeners: List[Callable[[str, tuple], None]] = []
+    
+    def subscribe(self, listener: Callable[[str, tuple], None]):
+        self.listeners.append(listener)
+    
+    def record(self, trade):
+        sequence = self.sequences.get(trade.symbol, 0) + 1
+        self.sequences[trade.symbol] = sequence
+        self.append(trade.symbol, (sequence, trade.price_ticks, trade.quantity_lots, trade.side.value,
+                                   trade.executed_at))
+    
+    def append(self, symbol: str, entry: tuple):
+        tape = self.tapes.get(symbol)
+        if tape is None:
+            tape = deque(maxlen=self.capacity)
+            self.tapes[symbol] = tape
+        
+        tape.append(entry)
+        
+        for listener in self.listeners:
+            listener(symbol, entry)
+    
+    def recent(self, symbol: str, limit: int = 50) -> List[Dict]:
+        tape = self.tapes.get(symbol)
+        if not tape:
+            return []
+        
+        return [self.to_dict(symbol, entry) for entry in itertools.islice(reversed(tape), max(0, limit))]
+    
+    @staticmethod
+    def to_dict(symbol: str, entry: tuple) -> Dict:
+        sequence, price, quantity, side, executed_at = entry
+        instrument = get_instrument(symbol)
+        
+        return {
+            "id": sequence,
+            "symbol": symbol,
+            "price": price / instrument.price_scale,
+            "quantity": quantity / instrument.quantity_scale,
+            "side": side,
+            "executed_at": executed_at.isoformat()
+        }
+
+
+trade_tape = TradeTape(settings.trade_tape_size)
@@ -1,15 +1,41 @@
 from decimal import Decimal
-from typing import List, Optional, Dict
-from dataclasses import dataclass
+from typing import List, Optional, Dict, Iterator, Set, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from app.models.trading import Order, Trade, OrderStatus, OrderSide
+from sqlalchemy import select
+from app.models.trading import Order, OrderStatus, OrderSide, OrderType
 from app.models.wallet import Wallet
 from app.models.user import User
+from app.core.config import settings
+from app.core.metrics import latency_metrics
+from app.services.trade_journal import JournalHaltedError, TradeJournal, trade_journal
+from app.services.trade_tape import TradeTape, trade_tape
+from app.services.engine_wal import EngineWAL
+from app.services.engine_shards import ShardedEngineClient, raise_group_failures
+from app.services.engine_capture import EngineCapture
+from app.services.balance_book import BalanceBook, balance_book
+from app.services.instruments import Instrument, get_instrument
+from app.services.stop_triggers import STOP_ORDER_TYPES, TriggerIndex, TriggerOrder
 import asyncio
-import heapq
+import bisect
+import contextlib
+import itertools
+import json
+import logging
+import time
 from collections import defaultdict
 
+logger = logging.getLogger(__name__)
+
+MAX_SNAPSHOT_DEPTH = 500
+TAKER_FEE_RATE = (1, 1000)
+MATCHING_ACTIONS = ("place", "batch", "tick")
+QUEUE_WAIT_LATENCY = latency_metrics.histogram("queue_wait")
+MATCH_LATENCY = latency_metrics.histogram("match")
+CANCEL_LATENCY = latency_metrics.histogram("cancel")
+DURABLE_WAIT_LATENCY = latency_metrics.histogram("durable_wait")
+
 
 @dataclass
 class OrderMatch:
@@ -21,214 +47,732 @@ class OrderMatch:
 
 @dataclass
 class TradeResult:
-    trade_id: int
     order_id: int
+    user_id: int
+    maker_order_id: int
+    maker_user_id: int
     symbol: str
     side: OrderSide
-    quantity: Decimal
-    price: Decimal
-    fee: Decimal
+    quantity_lots: int
+    price_ticks: int
+    fee_units: int
+    instrument: Instrument = field(repr=False)
+    fee_currency: str = "USDT"
+    executed_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    trade_id: Optional[int] = None
+    
+    @property
+    def quantity(self) -> Decimal:
+        return self.instrument.from_lots(self.quantity_lots)
+    
+    @property
+    def price(self) -> Decimal:
+        return self.instrument.from_ticks(self.price_ticks)
+    
+    @property
+    def fee(self) -> Decimal:
+        return self.instrument.from_ticks(self.fee_units)
+
+
+class RestingOrder:
+    __slots__ = ("id", "user_id", "side", "price", "quantity", "remaining", "sequence", "level", "prev", "next")
+    
+    def __init__(self, order_id: int, user_id: int, side: OrderSide, price: int, quantity: int, remaining: int,
+                 sequence: int, level: "PriceLevel"):
+        self.id = order_id
+        self.user_id = user_id
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.remaining = remaining
+        self.sequence = sequence
+        self.level = level
+        self.prev: Optional[RestingOrder] = None
+        self.next: Optional[RestingOrder] = None
+
+
+class PriceLevel:
+    __slots__ = ("price", "head", "tail", "count", "quantity")
+    
+    def __init__(self, price: int):
+        self.price = price
+        self.head: Optional[RestingOrder] = None
+        self.tail: Optional[RestingOrder] = None
+        self.count = 0
+        self.quantity = 0
+    
+    def append(self, entry: RestingOrder):
+        entry.prev = self.tail
+        entry.next = None
+        if self.tail is None:
+            self.head = entry
+        else:
+            self.tail.next = entry
+        self.tail = entry
+        self.count += 1
+        self.quantity += entry.remaining
+    
+    def remove(self, entry: RestingOrder):
+        if entry.prev is None:
+            self.head = entry.next
+        else:
+            entry.prev.next = entry.next
+        if entry.next is None:
+            self.tail = entry.prev
+        else:
+            entry.next.prev = entry.prev
+        entry.prev = entry.next = None
+        self.count -= 1
+        self.quantity -= entry.remaining
+    
+    def __iter__(self) -> Iterator[RestingOrder]:
+        entry = self.head
+        while entry is not None:
+            yield entry
+            entry = entry.next
 
 
 class OrderBook:
-    def __init__(self):
-        self.buy_orders = []
-        self.sell_orders = []
-        self.order_map: Dict[int, Order] = {}
+    def __init__(self, instrument: Instrument):
+        self.instrument = instrument
+        self.levels: Dict[OrderSide, Dict[int, PriceLevel]] = {OrderSide.BUY: {}, OrderSide.SELL: {}}
+        self.price_keys: Dict[OrderSide, List[int]] = {OrderSide.BUY: [], OrderSide.SELL: []}
+        self.order_map: Dict[int, RestingOrder] = {}
+        self.user_orders: Dict[int, Set[int]] = {}
+        self.sequence = 0
+        self.depth_cache: Dict[int, Tuple[int, Dict, str]] = {}
     
-    def add_order(self, order: Order):
-        self.order_map[order.id] = order
+    @staticmethod
+    def _price_key(side: OrderSide, price: int) -> int:
+        return price if side == OrderSide.BUY else -price
+    
+    def add_order(self, order_id: int, user_id: int, side: OrderSide, price: int, quantity: int,
+                  remaining: int) -> RestingOrder:
+        levels = self.levels[side]
+        level = levels.get(price)
         
-        if order.side == OrderSide.BUY:
-            heapq.heappush(self.buy_orders, (-order.price, order.created_at, order))
-        else:
-            heapq.heappush(self.sell_orders, (order.price, order.created_at, order))
+        if level is None:
+            level = PriceLevel(price)
+            levels[price] = level
+            bisect.insort(self.price_keys[side], self._price_key(side, price))
+        
+        self.sequence += 1
+        entry = RestingOrder(order_id, user_id, side, price, quantity, remaining, self.sequence, level)
+        level.append(entry)
+        self.order_map[order_id] = entry
+        
+        user_orders = self.user_orders.get(user_id)
+        if user_orders is None:
+            user_orders = set()
+            self.user_orders[user_id] = user_orders
+        user_orders.add(order_id)
+        return entry
     
-    def remove_order(self, order_id: int):
-        if order_id in self.order_map:
-            del self.order_map[order_id]
+    def remove_order(self, order_id: int) -> Optional[RestingOrder]:
+        entry = self.order_map.pop(order_id, None)
+        if entry is None:
+            return None
+        
+        level = entry.level
+        level.remove(entry)
+        self.sequence += 1
+        
+        user_orders = self.user_orders[entry.user_id]
+        user_orders.discard(order_id)
+        if not user_orders:
+            del self.user_orders[entry.user_id]
+        
+        if level.count == 0:
+            side = entry.side
+            del self.levels[side][level.price]
+            keys = self.price_keys[side]
+            key = self._price_key(side, level.price)
+            if keys[-1] == key:
+                keys.pop()
+            else:
+                del keys[bisect.bisect_left(keys, key)]
+        
+        return entry
+    
+    def record_fill(self, entry: RestingOrder, quantity: int):
+        entry.remaining -= quantity
+        entry.level.quantity -= quantity
+        self.sequence += 1
+    
+    def depth(self, side: OrderSide, depth: int) -> List[Dict]:
+        price_scale = self.instrument.price_scale
+        quantity_scale = self.instrument.quantity_scale
+        
+        return [
+            {"price": level.price / price_scale, "quantity": level.quantity / quantity_scale, "orders": level.count}
+            for level in itertools.islice(self.iter_levels(side), depth)
+        ]
     
-    def get_best_bid(self) -> Optional[Decimal]:
-        if self.buy_orders:
-            return -self.buy_orders[0][0]
+    def best_level(self, side: OrderSide) -> Optional[PriceLevel]:
+        keys = self.price_keys[side]
+        if not keys:
+            return None
+        return self.levels[side][self._price_key(side, keys[-1])]
+    
+    def iter_levels(self, side: OrderSide) -> Iterator[PriceLevel]:
+        levels = self.levels[side]
+        for key in reversed(self.price_keys[side]):
+            yield levels[self._price_key(side, key)]
+    
+    def get_best_bid(self) -> Optional[int]:
+        keys = self.price_keys[OrderSide.BUY]
+        if keys:
+            return keys[-1]
         return None
     
-    def get_best_ask(self) -> Optional[Decimal]:
-        if self.sell_orders:
-            return self.sell_orders[0][0]
+    def get_best_ask(self) -> Optional[int]:
+        keys = self.price_keys[OrderSide.SELL]
+        if keys:
+            return -keys[-1]
         return None
 
 
-class TradingEngine:
-    def __init__(self):
-        self.order_books: Dict[str, OrderBook] = defaultdict(OrderBook)
-        self.trading_lock = asyncio.Lock()
+class OrderBooks(dict):
+    def __missing__(self, symbol: str) -> OrderBook:
+        order_book = OrderBook(get_instrument(symbol))
+        self[symbol] = order_book
+        return order_book
+
+
+class SymbolSequencer:
+    def __init__(self, engine: "TradingEngine", symbol: str, queue_size: int):
+        self.engine = engine
+        self.symbol = symbol
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    async def submit(self, action: str, payload):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((action, payload, future, time.perf_counter_ns()))
+        return await future
+    
+    def post(self, action: str, payload) -> bool:
+        try:
+            self.queue.put_nowait((action, payload, None, time.perf_counter_ns()))
+        except asyncio.QueueFull:
+            return False
+        return True
     
-    async def place_order(self, order: Order, db: AsyncSession) -> List[TradeResult]:
-        async with self.trading_lock:
-            order_book = self.order_books[order.symbol]
+    async def run(self):
+        engine = self.engine
+        order_book = engine.order_books[self.symbol]
+        
+        while True:
+            await engine.journal.wait_capacity()
+            action, payload, future, enqueued = await self.queue.get()
+            started = time.perf_counter_ns()
+            QUEUE_WAIT_LATENCY.record(started - enqueued)
+            
+            if future is not None and future.cancelled():
+                continue
             
-            if order.order_type.value == "market":
-                return await self.process_market_order(order, order_book, db)
+            if action in MATCHING_ACTIONS and engine.journal.halted is not None:
+                if future is not None:
+                    future.set_exception(JournalHaltedError("Trading is halted until the trade journal recovers"))
+                continue
+            
+            if engine.capture is not None:
+                engine.capture_event(engine.capture.record, self.symbol, action, payload, enqueued)
+            
+            try:
+                if action == "place":
+                    result = engine.process_order(payload, order_book)
+                    MATCH_LATENCY.since(started)
+                elif action == "batch":
+                    result = [engine.process_order(order, order_book) for order in payload]
+                    MATCH_LATENCY.since(started)
+                elif action == "tick":
+                    result = engine.process_tick(payload, order_book)
+                    MATCH_LATENCY.since(started)
+                elif action == "mass_cancel":
+                    result = engine.process_mass_cancel(payload, order_book)
+                    CANCEL_LATENCY.since(started)
+                else:
+                    result = engine.process_cancel(payload, order_book)
+                    CANCEL_LATENCY.since(started)
+                durable = engine.durability_barrier()
+            except Exception as e:
+                if future is not None and not future.cancelled():
+                    future.set_exception(e)
             else:
-                return await self.process_limit_order(order, order_book, db)
+                if future is not None and not future.cancelled():
+                    future.set_result((result, durable))
+
+
+class TradingEngine:
+    def __init__(self, journal: TradeJournal = trade_journal, wal: Optional[EngineWAL] = None,
+                 tape: TradeTape = trade_tape, capture: Optional[EngineCapture] = None,
+                 balances: Optional[BalanceBook] = None):
+        self.order_books: Dict[str, OrderBook] = OrderBooks()
+        self.sequencers: Dict[str, SymbolSequencer] = {}
+        self.triggers: Dict[str, TriggerIndex] = defaultdict(TriggerIndex)
+        self.journal = journal
+        self.tape = tape
+        self.capture = capture
+        self.balances = balances
+        self.wal = wal
     
-    async def process_market_order(self, order: Order, order_book: OrderBook, db: AsyncSession) -> List[TradeResult]:
-        trades = []
-        remaining_quantity = order.quantity
+    def get_sequencer(self, symbol: str) -> SymbolSequencer:
+        sequencer = self.sequencers.get(symbol)
+        
+        if sequencer is None:
+            sequencer = SymbolSequencer(self, symbol, settings.engine_queue_size)
+            self.sequencers[symbol] = sequencer
+            sequencer.start()
+        
+        return sequencer
+    
+    async def start(self):
+        if self.wal is not None:
+            journal_lsn = await self.journal.load_position(self.wal.directory)
+            books, records, journal = self.wal.recover(journal_lsn)
+            
+            for snapshot_records in books.values():
+                for record in snapshot_records:
+                    self.replay(record)
+            
+            for record in records:
+                self.replay(record)
+            
+            self.journal.wal = self.wal
+            if journal:
+                logger.info("Re-emitting %d journal batches past WAL position %d", len(journal), journal_lsn)
+                for lsn, state in journal:
+                    self.journal.restore(lsn, state)
+                with contextlib.suppress(Exception):
+                    await self.journal.barrier()
+            
+            self.wal.start(self.capture_books, lambda: self.journal.committed_lsn)
+        
+        if self.balances is not None:
+            await self.balances.load(
+                [user_id for order_book in self.order_books.values() for user_id in order_book.user_orders] +
+                [user_id for triggers in self.triggers.values() for user_id in triggers.user_orders]
+            )
+        
+        if self.capture is not None:
+            self.capture.open(self.capture_books(), {
+                symbol: triggers.last_price for symbol, triggers in self.triggers.items()
+                if triggers.last_price is not None
+            })
+    
+    async def stop(self):
+        for sequencer in list(self.sequencers.values()):
+            await sequencer.stop()
+        self.sequencers.clear()
+        if self.wal is not None:
+            await self.wal.stop()
+        await self.journal.stop()
+        if self.capture is not None:
+            self.capture.close()
+    
+    def durability_barrier(self) -> asyncio.Future:
+        if self.wal is None:
+            return self.journal.barrier()
+        
+        if self.journal.current:
+            self.log(("journal", self.journal.current.state()))
+        return asyncio.gather(self.journal.barrier(self.wal.lsn), self.wal.barrier())
+    
+    def log(self, record: tuple):
+        if self.wal is not None:
+            self.wal.append(record)
+    
+    def capture_event(self, record, *args):
+        try:
+            record(*args)
+        except Exception:
+            logger.exception("Engine capture failed, disabling it")
+            capture, self.capture = self.capture, None
+            with contextlib.suppress(Exception):
+                capture.close()
+    
+    @staticmethod
+    def resting_order_state(symbol: str, entry: RestingOrder) -> tuple:
+        return (symbol, entry.id, entry.user_id, entry.side.value, entry.price, entry.quantity, entry.remaining)
+    
+    def restore_order(self, state: tuple) -> RestingOrder:
+        symbol, order_id, user_id, side, price, quantity, remaining = state
+        return self.order_books[symbol].add_order(order_id, user_id, OrderSide(side), price, quantity, remaining)
+    
+    def capture_books(self) -> Dict[str, List[tuple]]:
+        books = {}
+        
+        for symbol, order_book in self.order_books.items():
+            records = []
+            for side in (OrderSide.BUY, OrderSide.SELL):
+                for level in order_book.iter_levels(side):
+                    records.extend(("new", self.resting_order_state(symbol, entry)) for entry in level)
+            if symbol in self.triggers:
+                records.extend(("arm", order.state()) for order in self.triggers[symbol].armed.values())
+            if records:
+                books[symbol] = records
         
+        return books
+    
+    def replay(self, record: tuple):
+        action = record[0]
+        
+        if action == "new":
+            self.restore_order(record[1])
+        elif action == "fill":
+            _, symbol, order_id, quantity = record
+            order_book = self.order_books[symbol]
+            entry = order_book.order_map.get(order_id)
+            if entry is not None:
+                order_book.record_fill(entry, quantity)
+                if entry.remaining == 0:
+                    order_book.remove_order(order_id)
+        elif action == "cancel":
+            _, symbol, order_id = record
+            if self.order_books[symbol].remove_order(order_id) is None and symbol in self.triggers:
+                self.triggers[symbol].disarm(order_id)
+        elif action == "arm":
+            order = TriggerOrder.from_state(record[1])
+            self.triggers[order.symbol].arm(order)
+        elif action == "trigger":
+            _, symbol, order_id = record
+            self.triggers[symbol].disarm(order_id)
+    
+    async def place_order(self, order: Order) -> List[TradeResult]:
+        if self.balances is not None:
+            await self.balances.ensure_loaded(order.user_id)
+        
+        trades, durable = await self.get_sequencer(order.symbol).submit("place", order)
+        started = time.perf_counter_ns()
+        await durable
+        DURABLE_WAIT_LATENCY.since(started)
+        return trades
+    
+    async def place_orders(self, orders: List[Order]) -> List[List[TradeResult]]:
+        if self.balances is not None:
+            for user_id in {order.user_id for order in orders}:
+                await self.balances.ensure_loaded(user_id)
+        
+        by_symbol: Dict[str, List[int]] = {}
+        for index, order in enumerate(orders):
+            by_symbol.setdefault(order.symbol, []).append(index)
+        
+        submitted = await asyncio.gather(*(
+            self.get_sequencer(symbol).submit("batch", [orders[index] for index in indexes])
+            for symbol, indexes in by_symbol.items()
+        ), return_exceptions=True)
+        await asyncio.gather(*(reply[1] for reply in submitted if not isinstance(reply, BaseException)))
+        raise_group_failures(submitted)
+        
+        results: List[List[TradeResult]] = [[] for _ in orders]
+        for indexes, (trades, _) in zip(by_symbol.values(), submitted):
+            for index, order_trades in zip(indexes, trades):
+                results[index] = order_trades
+        
+        return results
+    
+    def on_price_tick(self, symbol: str, price: Decimal):
+        triggers = self.triggers.get(symbol)
+        if not triggers:
+            return
+        
+        ticks = self.order_books[symbol].instrument.to_ticks(price)
+        if triggers.crossed(ticks):
+            self.get_sequencer(symbol).post("tick", ticks)
+        else:
+            triggers.last_price = ticks
+            if self.capture is not None:
+                self.capture_event(self.capture.record, symbol, "tick", ticks, time.perf_counter_ns())
+    
+    def process_tick(self, price: int, order_book: OrderBook) -> List[TradeResult]:
+        return self.release_triggers(order_book, price)
+    
+    def process_order(self, order: Order, order_book: OrderBook) -> List[TradeResult]:
+        reserved = 0
+        if self.balances is not None:
+            reserved = self.reserve_order(order, order_book)
+            if reserved is None:
+                order.status = OrderStatus.REJECTED
+                if self.capture is not None:
+                    self.capture_event(self.capture.record_reject, order)
+                return []
+        
+        self.journal.record_new_order(order)
+        
+        if order.order_type in STOP_ORDER_TYPES:
+            return self.arm_stop_order(order, order_book)
+        
+        trades = self.execute_order(order, order_book)
+        if self.balances is not None and order.order_type == OrderType.MARKET:
+            self.release_unfilled(order, order_book.instrument, reserved, trades)
+        if trades:
+            self.release_triggers(order_book, trades[-1].price_ticks)
+        return trades
+    
+    def quote_units(self, ticks: int, instrument: Instrument) -> int:
+        return ticks * self.balances.scale // instrument.price_scale
+    
+    def base_units(self, lots: int, instrument: Instrument) -> int:
+        return lots * self.balances.scale // instrument.quantity_scale
+    
+    @staticmethod
+    def buy_cost(lots: int, price: int, instrument: Instrument) -> int:
+        return instrument.notional_ticks(lots, price) + instrument.notional_ticks(lots, price, *TAKER_FEE_RATE)
+    
+    def buy_unlock(self, remaining: int, quantity: int, price: int, instrument: Instrument) -> int:
+        return self.buy_cost(remaining, price, instrument) - self.buy_cost(remaining - quantity, price, instrument)
+    
+    def taker_fee(self, order: Order, limit_price: Optional[int], remaining: int, quantity: int, price: int,
+                  instrument: Instrument) -> int:
+        fee = instrument.notional_ticks(quantity, price, *TAKER_FEE_RATE)
+        if self.balances is None or order.side != OrderSide.BUY or limit_price is None:
+            return fee
+        unlocked = self.buy_unlock(remaining, quantity, limit_price, instrument)
+        return max(0, min(fee, unlocked - instrument.notional_ticks(quantity, price)))
+    
+    def reservation(self, side: OrderSide, lots: int, price: Optional[int], instrument: Instrument) -> Tuple[str, int]:
+        if side == OrderSide.BUY:
+            return instrument.quote_currency, self.quote_units(self.buy_cost(lots, price, instrument), instrument)
+        return instrument.base_currency, self.base_units(lots, instrument)
+    
+    def market_cost(self, order_book: OrderBook, lots: int) -> int:
+        instrument = order_book.instrument
+        cost = 0
+        
+        for level in order_book.iter_levels(OrderSide.SELL):
+            for entry in level:
+                quantity = min(lots, entry.remaining)
+                cost += self.buy_cost(quantity, level.price, instrument)
+                lots -= quantity
+                if not lots:
+                    return cost
+        
+        return cost
+    
+    def order_reservation(self, order: Order, instrument: Instrument) -> Tuple[str, Optional[int]]:
+        lots = instrument.to_lots(order.quantity)
+        
+        if order.order_type != OrderType.MARKET:
+            return self.reservation(order.side, lots, instrument.to_ticks(order.price), instrument)
+        if order.side == OrderSide.BUY:
+            return instrument.quote_currency, None
+        return self.reservation(order.side, lots, None, instrument)
+    
+    def reserve_order(self, order: Order, order_book: OrderBook) -> Optional[int]:
+        instrument = order_book.instrument
+        currency, amount = self.order_reservation(order, instrument)
+        if amount is None:
+            amount = self.quote_units(self.market_cost(order_book, instrument.to_lots(order.quantity)), instrument)
+        
+        if not self.balances.reserve(order.user_id, currency, amount, order.id):
+            return None
+        return amount
+    
+    def release_unfilled(self, order: Order, instrument: Instrument, reserved: int, trades: List[TradeResult]):
         if order.side == OrderSide.BUY:
-            while remaining_quantity > 0 and order_book.sell_orders:
-                best_ask_price, _, matching_order = heapq.heappop(order_book.sell_orders)
-                
-                if matching_order.id not in order_book.order_map:
-                    continue
-                
-                trade_quantity = min(remaining_quantity, matching_order.remaining_quantity)
-                trade_price = best_ask_price
-                
-                trade = await self.execute_trade(order, matching_order, trade_quantity, trade_price, db)
-                trades.append(trade)
-                
-                remaining_quantity -= trade_quantity
-                
-                if matching_order.remaining_quantity == 0:
-                    await self.update_order_status(matching_order, OrderStatus.FILLED, db)
-                    order_book.remove_order(matching_order.id)
+            spent = self.quote_units(sum(instrument.notional_ticks(trade.quantity_lots, trade.price_ticks) +
+                                         trade.fee_units for trade in trades), instrument)
+            self.balances.release(order.user_id, instrument.quote_currency, reserved - spent)
+        else:
+            spent = self.base_units(sum(trade.quantity_lots for trade in trades), instrument)
+            self.balances.release(order.user_id, instrument.base_currency, reserved - spent)
+    
+    def release_reservation(self, user_id: int, side: OrderSide, lots: int, price: int, instrument: Instrument):
+        currency, amount = self.reservation(side, lots, price, instrument)
+        self.balances.release(user_id, currency, amount)
+    
+    def release_trigger(self, order: TriggerOrder, instrument: Instrument):
+        self.release_reservation(order.user_id, order.side, instrument.to_lots(order.remaining_quantity),
+                                 instrument.to_ticks(order.price), instrument)
+    
+    def settle_fill(self, order: Order, limit_price: Optional[int], remaining: int, maker: RestingOrder,
+                    trade: TradeResult, instrument: Instrument):
+        balances = self.balances
+        quantity = trade.quantity_lots
+        notional = instrument.notional_ticks(quantity, trade.price_ticks)
+        base = self.base_units(quantity, instrument)
+        base_currency, quote_currency = instrument.base_currency, instrument.quote_currency
         
+        if order.side == OrderSide.BUY:
+            cost = notional + trade.fee_units
+            if limit_price is None:
+                unlocked = cost
+            else:
+                unlocked = self.buy_unlock(remaining, quantity, limit_price, instrument)
+                cost = min(cost, unlocked)
+            balances.settle(order.user_id, quote_currency, self.quote_units(unlocked, instrument),
+                            self.quote_units(cost, instrument))
+            balances.credit(order.user_id, base_currency, base)
+            balances.settle(maker.user_id, base_currency, base, base)
+            balances.credit(maker.user_id, quote_currency, self.quote_units(notional, instrument))
         else:
-            while remaining_quantity > 0 and order_book.buy_orders:
-                neg_best_bid_price, _, matching_order = heapq.heappop(order_book.buy_orders)
-                best_bid_price = -neg_best_bid_price
-                
-                if matching_order.id not in order_book.order_map:
-                    continue
-                
-                trade_quantity = min(remaining_quantity, matching_order.remaining_quantity)
-                trade_price = best_bid_price
-                
-                trade = await self.execute_trade(order, matching_order, trade_quantity, trade_price, db)
-                trades.append(trade)
-                
-                remaining_quantity -= trade_quantity
-                
-                if matching_order.remaining_quantity == 0:
-                    await self.update_order_status(matching_order, OrderStatus.FILLED, db)
-                    order_book.remove_order(matching_order.id)
-        
-        if remaining_quantity == 0:
-            await self.update_order_status(order, OrderStatus.FILLED, db)
+            unlocked = self.buy_unlock(maker.remaining, quantity, maker.price, instrument)
+            balances.settle(order.user_id, base_currency, base, base)
+            balances.credit(order.user_id, quote_currency, self.quote_units(notional - trade.fee_units, instrument))
+            balances.settle(maker.user_id, quote_currency, self.quote_units(unlocked, instrument),
+                            self.quote_units(min(notional, unlocked), instrument))
+            balances.credit(maker.user_id, base_currency, base)
+    
+    def execute_order(self, order, order_book: OrderBook) -> List[TradeResult]:
+        if order.order_type.value == "market":
+            return self.process_market_order(order, order_book)
         else:
-            await self.update_order_status(order, OrderStatus.PARTIAL_FILLED, db)
+            return self.process_limit_order(order, order_book)
+    
+    def arm_stop_order(self, order: Order, order_book: OrderBook) -> List[TradeResult]:
+        instrument = order_book.instrument
+        trigger = TriggerOrder.from_order(order, instrument.to_ticks(order.stop_price))
+        triggers = self.triggers[order.symbol]
         
+        triggers.arm(trigger)
+        self.log(("arm", trigger.state()))
+        
+        trades = []
+        if triggers.last_price is not None and triggers.crossed(triggers.last_price):
+            trades = self.release_triggers(order_book, triggers.last_price)
+        
+        order.status = trigger.status
+        order.filled_quantity = trigger.filled_quantity
+        order.remaining_quantity = trigger.remaining_quantity
         return trades
     
-    async def process_limit_order(self, order: Order, order_book: OrderBook, db: AsyncSession) -> List[TradeResult]:
+    def release_triggers(self, order_book: OrderBook, price: int) -> List[TradeResult]:
+        symbol = order_book.instrument.symbol
+        triggers = self.triggers.get(symbol)
+        if triggers is None:
+            return []
+        
         trades = []
-        remaining_quantity = order.quantity
+        released = triggers.release(price)
         
-        if order.side == OrderSide.BUY:
-            while remaining_quantity > 0 and order_book.sell_orders:
-                best_ask_price, _, matching_order = order_book.sell_orders[0]
-                
-                if best_ask_price > order.price:
-                    break
-                
-                heapq.heappop(order_book.sell_orders)
-                
-                if matching_order.id not in order_book.order_map:
-                    continue
-                
-                trade_quantity = min(remaining_quantity, matching_order.remaining_quantity)
-                trade_price = best_ask_price
-                
-                trade = await self.execute_trade(order, matching_order, trade_quantity, trade_price, db)
-                trades.append(trade)
-                
-                remaining_quantity -= trade_quantity
-                
-                if matching_order.remaining_quantity == 0:
-                    await self.update_order_status(matching_order, OrderStatus.FILLED, db)
-                    order_book.remove_order(matching_order.id)
+        while released:
+            for order in released:
+                self.log(("trigger", symbol, order.id))
+                order_trades = self.execute_order(order, order_book)
+                if order_trades:
+                    trades.extend(order_trades)
+                    price = order_trades[-1].price_ticks
+            released = triggers.release(price)
         
+        triggers.last_price = price
+        return trades
+    
+    def process_market_order(self, order: Order, order_book: OrderBook) -> List[TradeResult]:
+        quantity = order_book.instrument.to_lots(order.quantity)
+        trades, remaining = self.match_order(order, order_book, quantity, None)
+        
+        if remaining == 0:
+            self.update_taker_status(order, OrderStatus.FILLED, quantity, remaining, order_book.instrument)
         else:
-            while remaining_quantity > 0 and order_book.buy_orders:
-                neg_best_bid_price, _, matching_order = order_book.buy_orders[0]
-                best_bid_price = -neg_best_bid_price
-                
-                if best_bid_price < order.price:
-                    break
-                
-                heapq.heappop(order_book.buy_orders)
-                
-                if matching_order.id not in order_book.order_map:
-                    continue
-                
-                trade_quantity = min(remaining_quantity, matching_order.remaining_quantity)
-                trade_price = best_bid_price
-                
-                trade = await self.execute_trade(order, matching_order, trade_quantity, trade_price, db)
-                trades.append(trade)
-                
-                remaining_quantity -= trade_quantity
-                
-                if matching_order.remaining_quantity == 0:
-                    await self.update_order_status(matching_order, OrderStatus.FILLED, db)
-                    order_book.remove_order(matching_order.id)
-        
-        if remaining_quantity > 0:
-            order.remaining_quantity = remaining_quantity
-            order_book.add_order(order)
-            await self.update_order_status(order, OrderStatus.PENDING, db)
-        
-        if remaining_quantity == 0:
-            await self.update_order_status(order, OrderStatus.FILLED, db)
-        elif remaining_quantity < order.quantity:
-            await self.update_order_status(order, OrderStatus.PARTIAL_FILLED, db)
+            self.update_taker_status(order, OrderStatus.PARTIAL_FILLED, quantity, remaining, order_book.instrument)
         
         return trades
     
-    async def execute_trade(self, order1: Order, order2: Order, quantity: Decimal, price: Decimal, db: AsyncSession) -> TradeResult:
-        fee = quantity * price * Decimal("0.001")
-        
-        trade = Trade(
-            order_id=order1.id,
-            user_id=order1.user_id,
-            symbol=order1.symbol,
-            side=order1.side,
-            quantity=quantity,
-            price=price,
-            fee=fee,
-            fee_currency="USDT"
-        )
+    def process_limit_order(self, order: Order, order_book: OrderBook) -> List[TradeResult]:
+        instrument = order_book.instrument
+        quantity = instrument.to_lots(order.quantity)
+        price = instrument.to_ticks(order.price)
+        trades, remaining = self.match_order(order, order_book, quantity, price)
         
-        db.add(trade)
-        await db.commit()
-        await db.refresh(trade)
+        if remaining > 0:
+            entry = order_book.add_order(order.id, order.user_id, order.side, price, quantity, remaining)
+            self.log(("new", self.resting_order_state(order.symbol, entry)))
         
-        order1.filled_quantity += quantity
-        order1.remaining_quantity -= quantity
+        if remaining == 0:
+            self.update_taker_status(order, OrderStatus.FILLED, quantity, remaining, instrument)
+        elif remaining < quantity:
+            self.update_taker_status(order, OrderStatus.PARTIAL_FILLED, quantity, remaining, instrument)
+        else:
+            self.update_taker_status(order, OrderStatus.PENDING, quantity, remaining, instrument)
         
-        order2.filled_quantity += quantity
-        order2.remaining_quantity -= quantity
+        return trades
+    
+    def match_order(self, order: Order, order_book: OrderBook, quantity: int,
+                    limit_price: Optional[int]) -> Tuple[List[TradeResult], int]:
+        trades = []
+        remaining = quantity
+        instrument = order_book.instrument
+        is_buy = order.side == OrderSide.BUY
+        contra_side = OrderSide.SELL if is_buy else OrderSide.BUY
         
-        await db.commit()
+        while remaining > 0:
+            level = order_book.best_level(contra_side)
+            if level is None:
+                break
+            
+            if limit_price is not None:
+                if is_buy and level.price > limit_price:
+                    break
+                if not is_buy and level.price < limit_price:
+                    break
+            
+            entry = level.head
+            trade_quantity = min(remaining, entry.remaining)
+            
+            fee = self.taker_fee(order, limit_price, remaining, trade_quantity, level.price, instrument)
+            trade = self.execute_trade(order, entry, trade_quantity, level.price, fee, instrument)
+            trades.append(trade)
+            if self.balances is not None:
+                self.settle_fill(order, limit_price, remaining, entry, trade, instrument)
+            order_book.record_fill(entry, trade_quantity)
+            self.log(("fill", order.symbol, entry.id, trade_quantity))
+            
+            remaining -= trade_quantity
+            
+            if entry.remaining == 0:
+                order_book.remove_order(entry.id)
+                self.update_order_status(entry.id, OrderStatus.FILLED, entry.quantity, 0, instrument)
+            else:
+                self.update_order_status(entry.id, OrderStatus.PARTIAL_FILLED, entry.quantity,
+                                         entry.remaining, instrument)
         
-        return TradeResult(
-            trade_id=trade.id,
-            order_id=order1.id,
-            symbol=order1.symbol,
-            side=order1.side,
-            quantity=quantity,
-            price=price,
-            fee=fee
-        )
+        return trades, remaining
     
-    async def update_order_status(self, order: Order, status: OrderStatus, db: AsyncSession):
-        await db.execute(
-            update(Order).where(Order.id == order.id).values(status=status)
+    def execute_trade(self, order: Order, maker: RestingOrder, quantity: int, price: int, fee: int,
+                      instrument: Instrument) -> TradeResult:
+        trade = TradeResult(
+            order_id=order.id,
+            user_id=order.user_id,
+            maker_order_id=maker.id,
+            maker_user_id=maker.user_id,
+            symbol=order.symbol,
+            side=order.side,
+            quantity_lots=quantity,
+            price_ticks=price,
+            fee_units=fee,
+            instrument=instrument
         )
-        await db.commit()
+        
+        self.journal.record_trade(trade)
+        self.tape.record(trade)
+        if self.capture is not None:
+            self.capture_event(self.capture.record_trade, trade)
+        return trade
+    
+    def update_order_status(self, order_id: int, status: OrderStatus, quantity: int, remaining: int,
+                            instrument: Instrument):
+        self.journal.record_order(order_id, status, quantity, remaining, instrument)
+    
+    def update_taker_status(self, order: Order, status: OrderStatus, quantity: int, remaining: int,
+                            instrument: Instrument):
+        self.update_order_status(order.id, status, quantity, remaining, instrument)
+        
+        order.status = status
+        order.remaining_quantity = instrument.from_lots(remaining)
+        order.filled_quantity = order.quantity - order.remaining_quantity
     
     async def cancel_order(self, order_id: int, db: AsyncSession) -> bool:
         result = await db.execute(select(Order).where(Order.id == order_id))
@@ -237,31 +781,181 @@ class TradingEngine:
         if not order or order.status in [OrderStatus.FILLED, OrderStatus.CANCELLED]:
             return False
         
-        order_book = self.order_books[order.symbol]
-        order_book.remove_order(order_id)
+        return await self.submit_cancel(order)
+    
+    async def submit_cancel(self, order: Order) -> bool:
+        cancelled, durable = await self.get_sequencer(order.symbol).submit("cancel", order)
+        await durable
+        return cancelled
+    
+    async def cancel_user_orders(self, user_id: int, symbol: Optional[str] = None) -> int:
+        symbols = [
+            candidate for candidate in ([symbol] if symbol else set(self.order_books) | set(self.triggers))
+            if self.has_user_orders(candidate, user_id)
+        ]
+        if not symbols:
+            return 0
+        
+        submitted = await asyncio.gather(*(
+            self.get_sequencer(candidate).submit("mass_cancel", user_id) for candidate in symbols
+        ))
+        await asyncio.gather(*(durable for _, durable in submitted))
+        return sum(cancelled for cancelled, _ in submitted)
+    
+    def has_user_orders(self, symbol: str, user_id: int) -> bool:
+        order_book = self.order_books.get(symbol)
+        triggers = self.triggers.get(symbol)
+        return bool((order_book and user_id in order_book.user_orders) or (triggers and user_id in triggers.user_orders))
+    
+    def process_mass_cancel(self, user_id: int, order_book: OrderBook) -> int:
+        symbol = order_book.instrument.symbol
+        instrument = order_book.instrument
+        cancelled = list(order_book.user_orders.get(user_id, ()))
+        
+        for order_id in cancelled:
+            entry = order_book.remove_order(order_id)
+            if self.balances is not None:
+                self.release_reservation(user_id, entry.side, entry.remaining, entry.price, instrument)
+        
+        triggers = self.triggers.get(symbol)
+        if triggers is not None:
+            armed = list(triggers.user_orders.get(user_id, ()))
+            for order_id in armed:
+                trigger = triggers.disarm(order_id)
+                if self.balances is not None:
+                    self.release_trigger(trigger, instrument)
+            cancelled.extend(armed)
+        
+        for order_id in cancelled:
+            self.log(("cancel", symbol, order_id))
         
-        await self.update_order_status(order, OrderStatus.CANCELLED, db)
+        self.journal.record_cancellations(cancelled)
+        return len(cancelled)
+    
+    def process_cancel(self, order: Order, order_book: OrderBook) -> bool:
+        instrument = order_book.instrument
+        entry = order_book.remove_order(order.id)
+        
+        trigger = None
+        if entry is None and order.symbol in self.triggers:
+            trigger = self.triggers[order.symbol].disarm(order.id)
+        
+        if entry is None and trigger is None:
+            return False
+        
+        self.log(("cancel", order.symbol, order.id))
+        
+        if self.balances is not None:
+            if entry is not None:
+                self.release_reservation(entry.user_id, entry.side, entry.remaining, entry.price, instrument)
+            else:
+                self.release_trigger(trigger, instrument)
+        
+        if entry is not None:
+            self.update_order_status(order.id, OrderStatus.CANCELLED, entry.quantity, entry.remaining, instrument)
+        else:
+            self.update_order_status(order.id, OrderStatus.CANCELLED, instrument.to_lots(trigger.quantity),
+                                     instrument.to_lots(trigger.remaining_quantity), instrument)
+        
+        order.status = OrderStatus.CANCELLED
         return True
     
-    def get_order_book_snapshot(self, symbol: str) -> Dict:
-        order_book = self.order_books[symbol]
+    async def collect_remote_metrics(self, reset: bool = False) -> List[Dict]:
+        return []
+    
+    async def adjust_balance(self, user_id: int, currency: str, available: Decimal, locked: Decimal) -> bool:
+        if self.balances is None:
+            return True
+        return self.balances.adjust(user_id, currency, self.balances.to_units(available),
+                                    self.balances.to_units(locked))
+    
+    async def adjust_balances(self, deltas: List[Tuple[int, str, Decimal]]) -> List[Tuple[int, str, Decimal]]:
+        if self.balances is None:
+            return []
+        return self.balances.adjust_all(deltas)
+    
+    async def get_open_orders(self, user_id: int, symbol: Optional[str] = None) -> List[Dict]:
+        open_orders = []
+        
+        for candidate in ([symbol] if symbol else set(self.order_books) | set(self.triggers)):
+            order_book = self.order_books.get(candidate)
+            if order_book is not None:
+                instrument = order_book.instrument
+                for order_id in order_book.user_orders.get(user_id, ()):
+                    entry = order_book.order_map[order_id]
+                    open_orders.append({
+                        "id": entry.id,
+                        "symbol": candidate,
+                        "order_type": "limit",
+                        "side": entry.side.value,
+                        "status": (OrderStatus.PENDING if entry.remaining == entry.quantity
+                                   else OrderStatus.PARTIAL_FILLED).value,
+                        "quantity": instrument.from_lots(entry.quantity),
+                        "price": instrument.from_ticks(entry.price),
+                        "stop_price": None,
+                        "filled_quantity": instrument.from_lots(entry.quantity - entry.remaining),
+                        "remaining_quantity": instrument.from_lots(entry.remaining)
+                    })
+            
+            triggers = self.triggers.get(candidate)
+            if triggers is not None:
+                instrument = get_instrument(candidate)
+                for order_id in triggers.user_orders.get(user_id, ()):
+                    trigger = triggers.armed[order_id]
+                    open_orders.append({
+                        "id": trigger.id,
+                        "symbol": candidate,
+                        "order_type": trigger.order_type.value,
+                        "side": trigger.side.value,
+                        "status": trigger.status.value,
+                        "quantity": trigger.quantity,
+                        "price": trigger.price,
+                        "stop_price": instrument.from_ticks(trigger.stop_price),
+                        "filled_quantity": trigger.filled_quantity,
+                        "remaining_quantity": trigger.remaining_quantity
+                    })
         
-        bids = []
-        asks = []
+        open_orders.sort(key=lambda order: order["id"], reverse=True)
+        return open_orders
+    
+    async def get_order_book_snapshot(self, symbol: str, depth: int = 10) -> Dict:
+        return self.get_cached_depth(symbol, depth)[0]
+    
+    async def get_order_book_json(self, symbol: str, depth: int = 10) -> str:
+        return self.get_cached_depth(symbol, depth)[1]
+    
+    def get_cached_depth(self, symbol: str, depth: int) -> Tuple[Dict, str]:
+        order_book = self.order_books.get(symbol)
+        if order_book is None:
+            snapshot = {"symbol": symbol, "sequence": 0, "bids": [], "asks": [], "best_bid": 0, "best_ask": 0}
+            return snapshot, json.dumps(snapshot)
         
-        for neg_price, _, order in sorted(order_book.buy_orders, reverse=True)[:10]:
-            bids.append({"price": float(-neg_price), "quantity": float(order.remaining_quantity)})
+        depth = max(1, min(depth, MAX_SNAPSHOT_DEPTH))
         
-        for price, _, order in sorted(order_book.sell_orders)[:10]:
-            asks.append({"price": float(price), "quantity": float(order.remaining_quantity)})
+        cached = order_book.depth_cache.get(depth)
+        if cached is not None and cached[0] == order_book.sequence:
+            return cached[1], cached[2]
         
-        return {
+        snapshot = {
             "symbol": symbol,
-            "bids": bids,
-            "asks": asks,
-            "best_bid": float(order_book.get_best_bid() or 0),
-            "best_ask": float(order_book.get_best_ask() or 0)
+            "sequence": order_book.sequence,
+            "bids": order_book.depth(OrderSide.BUY, depth),
+            "asks": order_book.depth(OrderSide.SELL, depth),
+            "best_bid": (order_book.get_best_bid() or 0) / order_book.instrument.price_scale,
+            "best_ask": (order_book.get_best_ask() or 0) / order_book.instrument.price_scale
         }
+        serialized = json.dumps(snapshot)
+        
+        order_book.depth_cache[depth] = (order_book.sequence, snapshot, serialized)
+        return snapshot, serialized
 
-
-trading_engine = TradingEngine()
\ No newline at end of file
+if settings.engine_shards:
+    trading_engine = ShardedEngineClient(settings.engine_shards, settings.engine_data_dir,
+                                         settings.engine_reserve_balances)
+else:
+    trading_engine = TradingEngine(
+        wal=EngineWAL(settings.engine_data_dir, settings.engine_wal_fsync_ms, settings.engine_snapshot_interval)
+        if settings.engine_wal_enabled else None,
+        capture=EngineCapture(settings.engine_capture_path) if settings.engine_capture_path else None,
+        balances=balance_book if settings.engine_reserve_balances else None
+    )
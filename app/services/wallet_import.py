@@ -0,0 +1,308 @@
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, and_, cast, exists, func, literal, null, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.models.wallet import Transaction
+from app.core.config import settings
+from app.services.ledger import AVAILABLE, EXTERNAL, LEDGER, WALLETS, assign_xid, tail_sums
+from app.services.balance_cache import balance_cache
+from app.services.trading_engine import trading_engine
+import asyncio
+import csv
+import io
+import itertools
+import json
+import uuid
+
+TRANSACTIONS = Transaction.__table__
+AMOUNT_TYPE = WALLETS.c.available_balance.type
+AMOUNT_QUANTUM = Decimal(1).scaleb(-AMOUNT_TYPE.scale)
+MAX_AMOUNT = Decimal(10) ** (AMOUNT_TYPE.precision - AMOUNT_TYPE.scale)
+CURRENCY_LENGTH = WALLETS.c.currency.type.length
+TYPE_LENGTH = TRANSACTIONS.c.type.type.length
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_COLUMNS = ("line", "user_id", "currency", "amount")
+MAX_REPORTED_ERRORS = 100
+
+staging = MetaData()
+IMPORT_ROWS = Table(
+    "wallet_import_rows", staging,
+    Column("line", Integer, nullable=False),
+    Column("user_id", Integer, nullable=False),
+    Column("currency", String(CURRENCY_LENGTH), nullable=False),
+    Column("amount", Numeric(AMOUNT_TYPE.precision, AMOUNT_TYPE.scale), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP"
+)
+IMPORT_TOTALS = Table(
+    "wallet_import_totals", staging,
+    Column("user_id", Integer, nullable=False),
+    Column("currency", String(CURRENCY_LENGTH), nullable=False),
+    Column("amount", Numeric(AMOUNT_TYPE.precision, AMOUNT_TYPE.scale), nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP"
+)
+
+
+def parse_rows(upload: BinaryIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict]]]:
+    text = io.TextIOWrapper(upload, encoding="utf-8", newline="")
+    
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw, parse_float=Decimal)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+
+
+def validate_row(line: int, row: Optional[Dict]) -> Tuple[Optional[tuple], Optional[str]]:
+    if row is None:
+        return None, "Row is not a JSON object"
+    
+    try:
+        user_id = int(str(row.get("user_id", "")).strip())
+    except ValueError:
+        return None, "user_id must be an integer"
+    if user_id <= 0:
+        return None, "user_id must be positive"
+    
+    currency = str(row.get("currency") or "").strip().upper()
+    if not currency or len(currency) > CURRENCY_LENGTH or not currency.isalnum():
+        return None, f"currency must be 1 to {CURRENCY_LENGTH} letters or digits"
+    
+    try:
+        amount = Decimal(str(row.get("amount", "")).strip())
+    except InvalidOperation:
+        return None, "amount must be a decimal number"
+    if not amount.is_finite() or not amount:
+        return None, "amount must be a non-zero number"
+    if amount != amount.quantize(AMOUNT_QUANTUM) or abs(amount) >= MAX_AMOUNT:
+        return None, f"amount must have at most {AMOUNT_TYPE.scale} decimal places and be below {MAX_AMOUNT}"
+    
+    return (line, user_id, currency, amount), None
+
+
+def read_chunk(rows: Iterator[Tuple[int, Optional[Dict]]], size: int) -> Tuple[int, List[tuple], List[Dict]]:
+    records = []
+    errors = []
+    count = 0
+    
+    for line, row in itertools.islice(rows, size):
+        count += 1
+        record, error = validate_row(line, row)
+        if error:
+            errors.append({"line": line, "error": error})
+        else:
+            records.append(record)
+    
+    return count, records, errors
+
+
+class WalletImportService:
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+    
+    async def import_file(self, upload: BinaryIO, file_format: str, transaction_type: str, db: AsyncSession) -> Dict:
+        if file_format not in IMPORT_FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"format must be one of {', '.join(IMPORT_FORMATS)}"
+            )
+        if not transaction_type or len(transaction_type) > TYPE_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"type must be 1 to {TYPE_LENGTH} characters"
+            )
+        
+        connection = await db.connection()
+        await connection.run_sync(staging.create_all)
+        
+        try:
+            rows, errors, error_count = await self.load(db, parse_rows(upload, file_format))
+            if not error_count:
+                errors, error_count = await self.check(db)
+            if error_count:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={"message": f"Import rejected with {error_count} errors", "errors": errors}
+                )
+            
+            import_id = uuid.uuid4().hex
+            totals = await self.apply(db, import_id, transaction_type)
+            
+            rejected = await trading_engine.adjust_balances(totals)
+            if rejected:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={
+                        "message": f"Import rejected with {len(rejected)} errors",
+                        "errors": [
+                            {"user_id": user_id, "currency": currency,
+                             "error": f"Debit of {-amount} exceeds the balance available to the engine"}
+                            for user_id, currency, amount in rejected[:MAX_REPORTED_ERRORS]
+                        ]
+                    }
+                )
+            
+            try:
+                await connection.run_sync(staging.drop_all)
+                await db.commit()
+            except BaseException:
+                await trading_engine.adjust_balances([
+                    (user_id, currency, -amount) for user_id, currency, amount in totals
+                ])
+                raise
+        except BaseException:
+            await db.rollback()
+            raise
+        
+        await balance_cache.invalidate(user_id for user_id, _, _ in totals)
+        
+        net: Dict[str, Decimal] = {}
+        for _, currency, amount in totals:
+            net[currency] = net.get(currency, Decimal("0")) + amount
+        
+        return {
+            "import_id": import_id,
+            "rows": rows,
+            "accounts": len(totals),
+            "net": {currency: str(amount) for currency, amount in sorted(net.items())}
+        }
+    
+    async def load(self, db: AsyncSession, rows: Iterator[Tuple[int, Optional[Dict]]]) -> Tuple[int, List[Dict], int]:
+        total = 0
+        errors: List[Dict] = []
+        error_count = 0
+        
+        while True:
+            count, records, chunk_errors = await asyncio.to_thread(read_chunk, rows, self.chunk_size)
+            if not count:
+                break
+            
+            total += count
+            error_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            
+            if records and not error_count:
+                await self.copy(db, records)
+        
+        if not total:
+            error_count += 1
+            errors.append({"line": 0, "error": "File contains no rows"})
+        
+        return total, errors, error_count
+    
+    async def copy(self, db: AsyncSession, records: List[tuple]):
+        connection = await db.connection()
+        
+        if connection.dialect.name == "postgresql":
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                IMPORT_ROWS.name, records=records, columns=IMPORT_COLUMNS
+            )
+        else:
+            await connection.execute(IMPORT_ROWS.insert(), [dict(zip(IMPORT_COLUMNS, record)) for record in records])
+    
+    async def check(self, db: AsyncSession) -> Tuple[List[Dict], int]:
+        unknown = (~exists().where(User.id == IMPORT_ROWS.c.user_id))
+        error_count = (await db.execute(select(func.count()).select_from(IMPORT_ROWS).where(unknown))).scalar()
+        errors = [
+            {"line": line, "error": f"User {user_id} does not exist"}
+            for line, user_id in await db.execute(
+                select(IMPORT_ROWS.c.line, IMPORT_ROWS.c.user_id)
+                .where(unknown)
+                .order_by(IMPORT_ROWS.c.line)
+                .limit(MAX_REPORTED_ERRORS)
+            )
+        ]
+        if error_count:
+            return errors, error_count
+        
+        await db.execute(
+            IMPORT_TOTALS.insert().from_select(
+                ["user_id", "currency", "amount"],
+                select(IMPORT_ROWS.c.user_id, IMPORT_ROWS.c.currency, func.sum(IMPORT_ROWS.c.amount))
+                .group_by(IMPORT_ROWS.c.user_id, IMPORT_ROWS.c.currency)
+            )
+        )
+        
+        wallet = and_(WALLETS.c.user_id == IMPORT_TOTALS.c.user_id, WALLETS.c.currency == IMPORT_TOTALS.c.currency)
+        await db.execute(
+            pg_insert(WALLETS)
+            .from_select(
+                ["user_id", "currency", "available_balance", "locked_balance"],
+                select(IMPORT_TOTALS.c.user_id, IMPORT_TOTALS.c.currency, literal(0), literal(0))
+                .where(~exists().where(wallet))
+            )
+            .on_conflict_do_nothing(index_elements=[WALLETS.c.user_id, WALLETS.c.currency])
+        )
+        
+        tail = tail_sums()
+        available = WALLETS.c.available_balance + func.coalesce(tail.c.available, 0)
+        overdrawn = [
+            {"user_id": user_id, "currency": currency, "error": f"Debit of {-amount} exceeds available {balance}"}
+            for user_id, currency, amount, balance in await db.execute(
+                select(IMPORT_TOTALS.c.user_id, IMPORT_TOTALS.c.currency, IMPORT_TOTALS.c.amount, available)
+                .select_from(
+                    IMPORT_TOTALS.join(WALLETS, wallet)
+                    .outerjoin(tail, and_(tail.c.user_id == WALLETS.c.user_id, tail.c.currency == WALLETS.c.currency))
+                )
+                .where(IMPORT_TOTALS.c.amount < 0, available + IMPORT_TOTALS.c.amount < 0)
+                .order_by(IMPORT_TOTALS.c.user_id, IMPORT_TOTALS.c.currency)
+                .limit(MAX_REPORTED_ERRORS)
+            )
+        ]
+        return overdrawn, len(overdrawn)
+    
+    async def apply(self, db: AsyncSession, import_id: str, transaction_type: str) -> List[Tuple[int, str, Decimal]]:
+        columns = ["posting_id", "user_id", "currency", "account", "amount", "type"]
+        posting_id = literal(import_id)
+        entry_type = literal(transaction_type)
+        await assign_xid(db)
+        
+        await db.execute(
+            LEDGER.insert().from_select(
+                columns,
+                select(posting_id, IMPORT_TOTALS.c.user_id, IMPORT_TOTALS.c.currency, literal(AVAILABLE),
+                       IMPORT_TOTALS.c.amount, entry_type)
+                .where(IMPORT_TOTALS.c.amount != 0)
+            )
+        )
+        await db.execute(
+            LEDGER.insert().from_select(
+                columns,
+                select(posting_id, cast(null(), Integer), IMPORT_TOTALS.c.currency, literal(EXTERNAL),
+                       -func.sum(IMPORT_TOTALS.c.amount), entry_type)
+                .group_by(IMPORT_TOTALS.c.currency)
+                .having(func.sum(IMPORT_TOTALS.c.amount) != 0)
+            )
+        )
+        
+        await db.execute(
+            TRANSACTIONS.insert().from_select(
+                ["user_id", "wallet_id", "type", "amount", "currency", "external_tx_id", "status"],
+                select(IMPORT_ROWS.c.user_id, WALLETS.c.id, entry_type, IMPORT_ROWS.c.amount, IMPORT_ROWS.c.currency,
+                       literal(f"{import_id}:") + cast(IMPORT_ROWS.c.line, String), literal("completed"))
+                .select_from(IMPORT_ROWS.join(WALLETS, and_(WALLETS.c.user_id == IMPORT_ROWS.c.user_id,
+                                                            WALLETS.c.currency == IMPORT_ROWS.c.currency)))
+            )
+        )
+        
+        result = await db.execute(
+            select(IMPORT_TOTALS.c.user_id, IMPORT_TOTALS.c.currency, IMPORT_TOTALS.c.amount)
+            .where(IMPORT_TOTALS.c.amount != 0)
+        )
+        return [tuple(row) for row in result]
+
+
+wallet_import_service = WalletImportService(settings.wallet_import_chunk_size)
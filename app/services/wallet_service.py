@@ -1,57 +1,58 @@
 from decimal import Decimal
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.models.wallet import Wallet, Transaction
 from app.models.user import User
 from fastapi import HTTPException, status
-import asyncio
+from app.core.pagination import DEFAULT_PAGE_SIZE, keyset_page, split_page
+from app.services.trading_engine import trading_engine
+from app.services.ledger import AVAILABLE, CURRENT_XID, EXTERNAL, LEDGER, LOCKED, WALLETS, account_balance, guarded_postings
+from app.services.balance_cache import balance_cache
+
+BALANCE_DELTAS = {
+    "deposit": (1, 0),
+    "withdrawal": (-1, 0),
+    "lock": (-1, 1),
+    "unlock": (1, -1)
+}
+BALANCE_ERRORS = {
+    "deposit": "Deposit failed",
+    "withdrawal": "Insufficient balance",
+    "lock": "Insufficient balance to lock",
+    "unlock": "Insufficient locked balance"
+}
+TRANSACTION_COLUMNS = ["user_id", "wallet_id", "type", "amount", "currency", "status"]
 
 
 class WalletService:
-    def __init__(self):
-        self.balance_locks = {}
-    
     async def get_user_balances(self, user_id: int, db: AsyncSession) -> Dict[str, Dict]:
-        result = await db.execute(
-            select(Wallet).where(Wallet.user_id == user_id)
-        )
-        wallets = result.scalars().all()
+        wallets = await balance_cache.get(user_id, db)
         
         balances = {}
-        for wallet in wallets:
-            balances[wallet.currency] = {
-                "available": str(wallet.available_balance),
-                "locked": str(wallet.locked_balance),
-                "total": str(wallet.total_balance)
+        for currency, (available, locked) in wallets.items():
+            balances[currency] = {
+                "available": str(available),
+                "locked": str(locked),
+                "total": str(available + locked)
             }
         
         return balances
     
+    async def get_available_balance(self, user_id: int, currency: str, db: AsyncSession) -> Optional[Decimal]:
+        balance = (await balance_cache.get(user_id, db)).get(currency)
+        return balance[0] if balance else None
+    
     async def create_wallet(self, user_id: int, currency: str, db: AsyncSession) -> Wallet:
-        result = await db.execute(
-            select(Wallet).where(
-                Wallet.user_id == user_id,
-                Wallet.currency == currency
-            )
+        await db.execute(
+            pg_insert(Wallet)
+            .values(user_id=user_id, currency=currency, available_balance=Decimal("0"), locked_balance=Decimal("0"))
+            .on_conflict_do_nothing(index_elements=[Wallet.user_id, Wallet.currency])
         )
-        
-        existing_wallet = result.scalar_one_or_none()
-        if existing_wallet:
-            return existing_wallet
-        
-        wallet = Wallet(
-            user_id=user_id,
-            currency=currency,
-            available_balance=Decimal("0"),
-            locked_balance=Decimal("0")
-        )
-        
-        db.add(wallet)
         await db.commit()
-        await db.refresh(wallet)
         
-        return wallet
+        return await self.get_wallet(user_id, currency, db)
     
     async def get_wallet(self, user_id: int, currency: str, db: AsyncSession) -> Optional[Wallet]:
         result = await db.execute(
@@ -64,59 +65,78 @@ class WalletService:
     
     async def update_balance(self, user_id: int, currency: str, amount: Decimal, 
                            transaction_type: str, db: AsyncSession) -> bool:
-        wallet_key = f"{user_id}_{currency}"
+        available, locked = BALANCE_DELTAS[transaction_type]
+        if not await trading_engine.adjust_balance(user_id, currency, amount * available, amount * locked):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=BALANCE_ERRORS[transaction_type]
+            )
         
-        if wallet_key not in self.balance_locks:
-            self.balance_locks[wallet_key] = asyncio.Lock()
+        try:
+            applied = await self.apply_balance_update(user_id, currency, amount, transaction_type, db)
+        except Exception:
+            await trading_engine.adjust_balance(user_id, currency, -amount * available, -amount * locked)
+            raise
         
-        async with self.balance_locks[wallet_key]:
-            wallet = await self.get_wallet(user_id, currency, db)
-            
-            if not wallet:
-                wallet = await self.create_wallet(user_id, currency, db)
-            
-            if transaction_type == "deposit":
-                wallet.available_balance += amount
-            elif transaction_type == "withdrawal":
-                if wallet.available_balance < amount:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Insufficient balance"
-                    )
-                wallet.available_balance -= amount
-            elif transaction_type == "lock":
-                if wallet.available_balance < amount:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Insufficient balance to lock"
-                    )
-                wallet.available_balance -= amount
-                wallet.locked_balance += amount
-            elif transaction_type == "unlock":
-                if wallet.locked_balance < amount:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Insufficient locked balance"
-                    )
-                wallet.locked_balance -= amount
-                wallet.available_balance += amount
-            
-            await db.commit()
-            await db.refresh(wallet)
-            
-            transaction = Transaction(
-                user_id=user_id,
-                wallet_id=wallet.id,
-                type=transaction_type,
-                amount=amount,
-                currency=currency,
-                status="completed"
+        if not applied:
+            await trading_engine.adjust_balance(user_id, currency, -amount * available, -amount * locked)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=BALANCE_ERRORS[transaction_type]
             )
-            
-            db.add(transaction)
-            await db.commit()
-            
-            return True
+        
+        await balance_cache.invalidate([user_id])
+        return True
+    
+    async def apply_balance_update(self, user_id: int, currency: str, amount: Decimal,
+                                   transaction_type: str, db: AsyncSession) -> bool:
+        available, locked = BALANCE_DELTAS[transaction_type]
+        postgres = (await db.connection()).dialect.name == "postgresql"
+        
+        if transaction_type == "deposit":
+            await db.execute(
+                pg_insert(Wallet)
+                .values(user_id=user_id, currency=currency, available_balance=Decimal("0"), locked_balance=Decimal("0"))
+                .on_conflict_do_nothing(index_elements=[Wallet.user_id, Wallet.currency])
+            )
+        
+        wallet = select(WALLETS.c.id).where(WALLETS.c.user_id == user_id, WALLETS.c.currency == currency)
+        guard = wallet
+        if transaction_type != "deposit":
+            guard = guard.where(account_balance(LOCKED if locked < 0 else AVAILABLE) >= amount)
+        if postgres:
+            guard = guard.add_columns(CURRENT_XID)
+        guard = guard.cte("guard")
+        
+        postings = guarded_postings({(user_id, currency): [amount * available, amount * locked]}, transaction_type,
+                                    EXTERNAL, guard)
+        transaction = [literal(user_id), literal(transaction_type), literal(amount), literal(currency),
+                       literal("completed")]
+        
+        if postgres:
+            result = await db.execute(
+                insert(Transaction)
+                .from_select(TRANSACTION_COLUMNS, select(transaction[0], guard.c.id, *transaction[1:]))
+                .add_cte(postings.returning(LEDGER.c.id).cte("posted"))
+                .returning(Transaction.id)
+            )
+            applied = result.first() is not None
+        else:
+            applied = (await db.execute(postings.returning(LEDGER.c.id))).first() is not None
+            if applied:
+                await db.execute(
+                    insert(Transaction).from_select(
+                        TRANSACTION_COLUMNS,
+                        select(transaction[0], wallet.scalar_subquery(), *transaction[1:])
+                    )
+                )
+        
+        if not applied:
+            await db.rollback()
+            return False
+        
+        await db.commit()
+        return True
     
     async def lock_balance(self, user_id: int, currency: str, amount: Decimal, db: AsyncSession) -> bool:
         return await self.update_balance(user_id, currency, amount, "lock", db)
@@ -124,37 +144,16 @@ class WalletService:
     async def unlock_balance(self, user_id: int, currency: str, amount: Decimal, db: AsyncSession) -> bool:
         return await self.update_balance(user_id, currency, amount, "unlock", db)
     
-    async def process_trade_settlement(self, user_id: int, symbol: str, side: str, 
-                                     quantity: Decimal, price: Decimal, fee: Decimal, 
-                                     db: AsyncSession) -> bool:
-        base_currency = symbol[:3]
-        quote_currency = symbol[3:]
-        
-        if side == "buy":
-            total_cost = quantity * price + fee
-            
-            await self.update_balance(user_id, quote_currency, total_cost, "withdrawal", db)
-            await self.update_balance(user_id, base_currency, quantity, "deposit", db)
-            
-        else:
-            
-            await self.update_balance(user_id, base_currency, quantity, "withdrawal", db)
-            
-            proceeds = quantity * price - fee
-            await self.update_balance(user_id, quote_currency, proceeds, "deposit", db)
-        
-        return True
-    
-    async def get_transaction_history(self, user_id: int, db: AsyncSession, 
-                                    limit: int = 100) -> list:
+    async def get_transaction_history(self, user_id: int, db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE,
+                                      cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
         result = await db.execute(
-            select(Transaction)
-            .where(Transaction.user_id == user_id)
-            .order_by(Transaction.created_at.desc())
-            .limit(limit)
+            keyset_page(
+                select(Transaction).where(Transaction.user_id == user_id),
+                Transaction.created_at, Transaction.id, cursor, limit
+            )
         )
         
-        transactions = result.scalars().all()
+        transactions, next_cursor = split_page(result.scalars().all(), limit, "created_at")
         
         return [
             {
@@ -166,7 +165,7 @@ class WalletService:
                 "created_at": tx.created_at.isoformat()
             }
             for tx in transactions
-        ]
+        ], next_cursor
     
     async def simulate_deposit(self, user_id: int, currency: str, amount: Decimal, db: AsyncSession) -> bool:
         return await self.update_balance(user_id, currency, amount, "deposit", db)
@@ -0,0 +1,170 @@
+from typing import Dict, List
+from dataclasses import asdict
+from datetime import datetime, timezone
+from app.models import user, wallet
+from app.services.trade_journal import TradeJournal
+from app.services.trading_engine import TradingEngine
+from benchmarks.order_flow import FlowConfig, OrderFlowGenerator
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+
+class NullJournal(TradeJournal):
+    def __init__(self):
+        super().__init__(flush_interval_ms=0, max_batch_size=1)
+        self.trades = 0
+    
+    def drain(self):
+        self.trades += sum(len(batch.trades) for batch in self.take())
+    
+    async def write_batch(self, inserts: List, trades: List, orders: Dict[int, tuple], cancels: List[int],
+                          wallets: List, balances: Dict, lsn: int = 0):
+        self.trades += len(trades)
+
+
+def percentile(samples: List[int], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(fraction * len(samples)))
+    return samples[index] / 1000
+
+
+def summarize(latencies: List[int], elapsed: float, events: int) -> Dict:
+    latencies.sort()
+    return {
+        "events": events,
+        "elapsed_seconds": round(elapsed, 4),
+        "orders_per_second": round(events / elapsed, 1) if elapsed else 0.0,
+        "latency_us": {
+            "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99),
+            "p99_9": percentile(latencies, 0.999),
+            "max": latencies[-1] / 1000 if latencies else 0.0
+        }
+    }
+
+
+def run_sync(config: FlowConfig) -> Dict:
+    journal = NullJournal()
+    engine = TradingEngine(journal=journal)
+    generator = OrderFlowGenerator(config)
+    order_book = engine.order_books[config.symbol]
+    
+    for order in generator.seed_book():
+        engine.process_order(order, order_book)
+    journal.drain()
+    journal.trades = 0
+    
+    events = list(generator.events())
+    latencies = []
+    clock = time.perf_counter_ns
+    blocks_before = sys.getallocatedblocks()
+    started = time.perf_counter()
+    
+    for count, (action, order) in enumerate(events, 1):
+        begin = clock()
+        if action == "place":
+            engine.process_order(order, order_book)
+        else:
+            engine.process_cancel(order, order_book)
+        latencies.append(clock() - begin)
+        
+        if count % 1024 == 0:
+            journal.drain()
+    
+    elapsed = time.perf_counter() - started
+    journal.drain()
+    
+    result = summarize(latencies, elapsed, len(events))
+    result["allocated_blocks_delta"] = sys.getallocatedblocks() - blocks_before
+    result["trades"] = journal.trades
+    result["resting_orders"] = len(order_book.order_map)
+    return result
+
+
+async def run_async(config: FlowConfig) -> Dict:
+    journal = NullJournal()
+    engine = TradingEngine(journal=journal)
+    generator = OrderFlowGenerator(config)
+    
+    for order in generator.seed_book():
+        await engine.place_order(order)
+    journal.trades = 0
+    
+    events = list(generator.events())
+    latencies = []
+    clock = time.perf_counter_ns
+    sequencer = engine.get_sequencer(config.symbol)
+    blocks_before = sys.getallocatedblocks()
+    started = time.perf_counter()
+    
+    for action, order in events:
+        begin = clock()
+        if action == "place":
+            await engine.place_order(order)
+        else:
+            cancelled, durable = await sequencer.submit("cancel", order)
+            await durable
+        latencies.append(clock() - begin)
+    
+    elapsed = time.perf_counter() - started
+    
+    result = summarize(latencies, elapsed, len(events))
+    result["allocated_blocks_delta"] = sys.getallocatedblocks() - blocks_before
+    result["trades"] = journal.trades
+    result["resting_orders"] = len(engine.order_books[config.symbol].order_map)
+    await engine.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matching engine benchmark")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--tracemalloc", action="store_true")
+    defaults = FlowConfig()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    
+    config = FlowConfig(**{name: getattr(args, name) for name in asdict(defaults)})
+    
+    if args.tracemalloc:
+        tracemalloc.start()
+    
+    if args.mode == "sync":
+        result = run_sync(config)
+    else:
+        result = asyncio.run(run_async(config))
+    
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        result["traced_memory_bytes"] = {"current": current, "peak": peak}
+        tracemalloc.stop()
+    
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    report = {
+        "benchmark": "matching_engine",
+        "mode": args.mode,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": asdict(config),
+        "result": result
+    }
+    
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    
+    print(json.dumps(report["result"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
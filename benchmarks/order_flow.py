@@ -0,0 +1,100 @@
+from decimal import Decimal
+from typing import Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from app.models.trading import OrderSide, OrderStatus, OrderType
+import random
+
+
+class SyntheticOrder:
+    __slots__ = ("id", "user_id", "symbol", "side", "order_type", "quantity", "price", "stop_price",
+                 "status", "filled_quantity", "remaining_quantity", "created_at")
+    
+    def __init__(self, order_id: int, user_id: int, symbol: str, side: OrderSide, order_type: OrderType,
+                 quantity: Decimal, price: Optional[Decimal]):
+        self.id = order_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.stop_price = None
+        self.status = OrderStatus.PENDING
+        self.filled_quantity = Decimal("0")
+        self.remaining_quantity = quantity
+        self.created_at = datetime.now(timezone.utc)
+
+
+@dataclass
+class FlowConfig:
+    symbol: str = "BTCUSDT"
+    seed: int = 1
+    orders: int = 100000
+    book_depth: int = 10000
+    limit_ratio: float = 0.8
+    cancel_ratio: float = 0.3
+    mid_price: int = 45000
+    tick_size: str = "0.01"
+    max_distance_ticks: int = 500
+    distance_decay: float = 0.02
+    max_quantity_lots: int = 100
+    lot_size: str = "0.001"
+    users: int = 1000
+
+
+class OrderFlowGenerator:
+    def __init__(self, config: FlowConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.tick_size = Decimal(config.tick_size)
+        self.lot_size = Decimal(config.lot_size)
+        self.mid_ticks = int(Decimal(config.mid_price) / self.tick_size)
+        self.next_id = 1
+        self.open_orders: List[SyntheticOrder] = []
+    
+    def new_order(self, order_type: OrderType, passive: bool) -> SyntheticOrder:
+        rng = self.rng
+        config = self.config
+        side = OrderSide.BUY if rng.random() < 0.5 else OrderSide.SELL
+        quantity = self.lot_size * rng.randint(1, config.max_quantity_lots)
+        price = None
+        
+        if order_type == OrderType.LIMIT:
+            distance = min(int(rng.expovariate(config.distance_decay)), config.max_distance_ticks)
+            if not passive and rng.random() < 0.5:
+                distance = -distance
+            offset = -distance - 1 if side == OrderSide.BUY else distance + 1
+            price = self.tick_size * (self.mid_ticks + offset)
+        
+        order = SyntheticOrder(self.next_id, rng.randint(1, config.users), config.symbol, side, order_type,
+                               quantity, price)
+        self.next_id += 1
+        return order
+    
+    def seed_book(self) -> Iterator[SyntheticOrder]:
+        for _ in range(self.config.book_depth):
+            order = self.new_order(OrderType.LIMIT, passive=True)
+            self.open_orders.append(order)
+            yield order
+    
+    def events(self) -> Iterator[Tuple[str, SyntheticOrder]]:
+        rng = self.rng
+        config = self.config
+        
+        for _ in range(config.orders):
+            self.mid_ticks += rng.choice((-1, 0, 1))
+            
+            if self.open_orders and rng.random() < config.cancel_ratio:
+                index = rng.randrange(len(self.open_orders))
+                self.open_orders[index], self.open_orders[-1] = self.open_orders[-1], self.open_orders[index]
+                yield "cancel", self.open_orders.pop()
+                continue
+            
+            if rng.random() < config.limit_ratio:
+                order = self.new_order(OrderType.LIMIT, passive=False)
+                self.open_orders.append(order)
+            else:
+                order = self.new_order(OrderType.MARKET, passive=False)
+            
+            yield "place", order
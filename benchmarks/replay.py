@@ -0,0 +1,216 @@
+from typing import Dict, List, Optional
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.core.database import Base
+from app.models import user, wallet
+from app.models.trading import OrderStatus, OrderType
+from app.services.engine_capture import (ARM, CANCEL, MASS_CANCEL, NO_PRICE, ORDER_TYPES, PLACE, REJECT, RESTING,
+                                         SIDES, TICK, TRADE, read_capture)
+from app.services.instruments import get_instrument
+from app.services.trade_journal import TradeJournal
+from app.services.trade_tape import TradeTape
+from app.services.trading_engine import TradingEngine
+from benchmarks.matching_engine import NullJournal, summarize
+from benchmarks.order_flow import SyntheticOrder
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import sys
+import time
+
+
+class FillRecorder:
+    def __init__(self):
+        self.fills: Dict[str, List[tuple]] = defaultdict(list)
+    
+    def record(self, symbol: str, action: str, payload, enqueued: int):
+        pass
+    
+    def record_trade(self, trade):
+        self.fills[trade.symbol].append((trade.order_id, trade.maker_order_id, trade.quantity_lots, trade.price_ticks))
+    
+    def close(self):
+        pass
+
+
+def build_order(symbol: str, fields: tuple) -> SyntheticOrder:
+    order_id, user_id, side, order_type, quantity, price, stop_price = fields
+    instrument = get_instrument(symbol)
+    
+    order = SyntheticOrder(order_id, user_id, symbol, SIDES[side], ORDER_TYPES[order_type],
+                           instrument.from_lots(quantity), None if price == NO_PRICE else instrument.from_ticks(price))
+    if stop_price != NO_PRICE:
+        order.stop_price = instrument.from_ticks(stop_price)
+    return order
+
+
+def build_cancel(symbol: str, fields: tuple) -> SyntheticOrder:
+    order_id, user_id, side, order_type, quantity, remaining = fields
+    instrument = get_instrument(symbol)
+    
+    order = SyntheticOrder(order_id, user_id, symbol, SIDES[side], ORDER_TYPES[order_type],
+                           instrument.from_lots(quantity), None)
+    order.remaining_quantity = instrument.from_lots(remaining)
+    return order
+
+
+def restore_state(engine: TradingEngine, kind: int, symbol: str, fields: tuple):
+    if kind == RESTING:
+        order_id, user_id, side, price, quantity, remaining = fields
+        engine.restore_order((symbol, order_id, user_id, SIDES[side].value, price, quantity, remaining))
+        
+        order = build_order(symbol, (order_id, user_id, side, ORDER_TYPES.index(OrderType.LIMIT), quantity, price,
+                                     NO_PRICE))
+        order.remaining_quantity = get_instrument(symbol).from_lots(remaining)
+        order.filled_quantity = order.quantity - order.remaining_quantity
+        order.status = OrderStatus.PARTIAL_FILLED if order.filled_quantity else OrderStatus.PENDING
+    else:
+        order = build_order(symbol, fields)
+        engine.replay(("arm", (symbol, order.id, order.user_id, order.side.value, order.order_type.value,
+                                order.quantity, order.price, fields[6])))
+    
+    engine.journal.record_new_order(order)
+
+
+def diff_fills(expected: Dict[str, List[tuple]], produced: Dict[str, List[tuple]]) -> Dict:
+    symbols = {}
+    
+    for symbol in sorted(set(expected) | set(produced)):
+        original, replayed = expected.get(symbol, []), produced.get(symbol, [])
+        mismatch = next((index for index, (a, b) in enumerate(zip(original, replayed)) if a != b), None)
+        if mismatch is None and len(original) != len(replayed):
+            mismatch = min(len(original), len(replayed))
+        
+        report = {"expected": len(original), "produced": len(replayed), "first_mismatch": mismatch}
+        if mismatch is not None:
+            report["expected_fill"] = original[mismatch] if mismatch < len(original) else None
+            report["produced_fill"] = replayed[mismatch] if mismatch < len(replayed) else None
+        symbols[symbol] = report
+    
+    return {
+        "identical": all(report["first_mismatch"] is None for report in symbols.values()),
+        "symbols": symbols
+    }
+
+
+async def replay(path: str, pace: str, speed: float, journal: TradeJournal) -> Dict:
+    recorder = FillRecorder()
+    engine = TradingEngine(journal=journal, tape=TradeTape(settings.trade_tape_size), capture=recorder)
+    expected: Dict[str, List[tuple]] = defaultdict(list)
+    latencies = []
+    clock = time.perf_counter_ns
+    started: Optional[int] = None
+    events = 0
+    rejected = {fields[0] for kind, _, _, fields in read_capture(path) if kind == REJECT}
+    
+    for kind, timestamp, symbol, fields in read_capture(path):
+        if kind == TRADE:
+            expected[symbol].append(fields)
+            continue
+        
+        if kind == REJECT or (kind == PLACE and fields[0] in rejected):
+            continue
+        
+        if kind in (RESTING, ARM):
+            restore_state(engine, kind, symbol, fields)
+            continue
+        
+        if started is None:
+            started = clock() - int(timestamp / speed)
+        
+        if pace == "original":
+            delay = started + int(timestamp / speed) - clock()
+            if delay > 0:
+                await asyncio.sleep(delay / 1e9)
+        
+        order_book = engine.order_books[symbol]
+        begin = clock()
+        
+        if kind == PLACE:
+            engine.process_order(build_order(symbol, fields), order_book)
+        elif kind == CANCEL:
+            engine.process_cancel(build_cancel(symbol, fields), order_book)
+        elif kind == MASS_CANCEL:
+            engine.process_mass_cancel(fields[0], order_book)
+        elif kind == TICK:
+            engine.process_tick(fields[0], order_book)
+        
+        latencies.append(clock() - begin)
+        
+        events += 1
+        if events % 1024 == 0:
+            await drain(journal)
+    
+    await drain(journal)
+    elapsed = (clock() - started) / 1e9 if started is not None else 0.0
+    await journal.stop()
+    
+    result = summarize(latencies, elapsed, events)
+    result["fills"] = diff_fills(expected, recorder.fills)
+    return result
+
+
+async def drain(journal: TradeJournal):
+    if isinstance(journal, NullJournal):
+        journal.drain()
+    else:
+        await journal.barrier()
+
+
+async def build_journal(database_url: Optional[str]) -> TradeJournal:
+    if not database_url:
+        return NullJournal()
+    
+    engine = create_async_engine(database_url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    
+    return TradeJournal(settings.trade_journal_flush_ms, settings.trade_journal_max_batch,
+                        session_factory=sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+
+
+async def run(args) -> Dict:
+    journal = await build_journal(args.database_url)
+    return await replay(args.capture, args.pace, args.speed, journal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an engine capture")
+    parser.add_argument("capture")
+    parser.add_argument("--pace", choices=["fast", "original"], default="fast")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--output", default="replay_output.json")
+    args = parser.parse_args()
+    
+    result = asyncio.run(run(args))
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    report = {
+        "benchmark": "replay",
+        "capture": args.capture,
+        "pace": args.pace,
+        "speed": args.speed,
+        "persistence": "database" if args.database_url else "stub",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "result": result
+    }
+    
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    
+    print(json.dumps(report["result"], indent=2))
+    
+    if not result["fills"]["identical"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
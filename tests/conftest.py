@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models import user, wallet, trading
+import pytest
+
+
+@compiles(BigInteger, "sqlite")
+def compile_big_integer(type_, compiler, **kw):
+    return "INTEGER"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'exchange.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    
+    yield sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
@@ -0,0 +1,48 @@
+from decimal import Decimal
+from datetime import datetime, timezone
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.services.balance_book import Account, BalanceBook
+from app.services.trade_journal import TradeJournal
+from app.services.trade_tape import TradeTape
+from app.services.trading_engine import TradingEngine
+import pytest
+
+BUYER, SELLER = 1, 2
+
+
+def limit_order(order_id: int, user_id: int, side: OrderSide, quantity: Decimal, price: Decimal) -> Order:
+    return Order(id=order_id, user_id=user_id, symbol="BTCUSDT", order_type=OrderType.LIMIT, side=side,
+                 status=OrderStatus.PENDING, quantity=quantity, price=price, filled_quantity=Decimal("0"),
+                 remaining_quantity=quantity, created_at=datetime.now(timezone.utc))
+
+
+@pytest.mark.parametrize("taker_side", [OrderSide.BUY, OrderSide.SELL], ids=["buy-taker", "buy-maker"])
+@pytest.mark.parametrize("price, sizes", [
+    ("3.14159265", ["0.33333333"] * 3),
+    ("12345.67891", ["0.1234567", "0.00000001", "1.3333333"]),
+    ("0.33333333", ["0.00000003", "0.00000005", "0.00000007"]),
+])
+def test_partial_fills_at_the_limit_price_never_overdraw(taker_side, price, sizes):
+    journal = TradeJournal(1, 1000)
+    balances = BalanceBook(journal)
+    engine = TradingEngine(journal=journal, tape=TradeTape(100), balances=balances)
+    order_book = engine.order_books["BTCUSDT"]
+    instrument = order_book.instrument
+    price, sizes = Decimal(price), [Decimal(size) for size in sizes]
+    total = sum(sizes)
+    
+    balances.users.update({BUYER, SELLER})
+    balances.accounts[(BUYER, "USDT")] = Account(
+        engine.buy_cost(instrument.to_lots(total), instrument.to_ticks(price), instrument), 0
+    )
+    balances.accounts[(SELLER, "BTC")] = Account(balances.to_units(total), 0)
+    
+    buy = limit_order(1, BUYER, OrderSide.BUY, total, price)
+    sells = [limit_order(10 + index, SELLER, OrderSide.SELL, size, price) for index, size in enumerate(sizes)]
+    for order in (sells + [buy] if taker_side == OrderSide.BUY else [buy] + sells):
+        engine.process_order(order, order_book)
+        assert all(account.available >= 0 and account.locked >= 0 for account in balances.accounts.values())
+    
+    assert not order_book.order_map
+    assert all(account.locked == 0 for account in balances.accounts.values())
+    assert balances.accounts[(BUYER, "BTC")].available == balances.to_units(total)
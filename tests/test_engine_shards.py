@@ -0,0 +1,138 @@
+from decimal import Decimal
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.engine_server import EngineShardServer
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.services.balance_book import Account
+from app.services.engine_shards import ShardedEngineClient, owner_for, shard_for
+from app.services.trade_journal import TradeJournal
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SHARDS = 2
+SYMBOL = "BTCUSDT"
+MATCHER = shard_for(SYMBOL, SHARDS)
+BUYER = next(user_id for user_id in range(1, 10) if owner_for(user_id, SHARDS) != MATCHER)
+SELLER = next(user_id for user_id in range(1, 10) if owner_for(user_id, SHARDS) == MATCHER)
+
+
+class MemoryJournal(TradeJournal):
+    def __init__(self):
+        super().__init__(1, 1000)
+        self.balances = {}
+    
+    async def write_batch(self, inserts, trades, orders, cancels, wallets, balances, lsn=0):
+        for key, (available, locked) in balances.items():
+            total = self.balances.setdefault(key, [0, 0])
+            total[0] += available
+            total[1] += locked
+
+
+def order(order_id: int, user_id: int, side: OrderSide, quantity: str, price: str) -> Order:
+    return Order(id=order_id, user_id=user_id, symbol=SYMBOL, order_type=OrderType.LIMIT, side=side,
+                 status=OrderStatus.PENDING, quantity=Decimal(quantity), price=Decimal(price),
+                 filled_quantity=Decimal("0"), remaining_quantity=Decimal(quantity),
+                 created_at=datetime.now(timezone.utc))
+
+
+@pytest.fixture
+async def shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "engine_shards", SHARDS)
+    monkeypatch.setattr(settings, "engine_data_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "engine_wal_enabled", False)
+    monkeypatch.setattr(settings, "engine_capture_path", None)
+    monkeypatch.setattr(settings, "engine_reserve_balances", True)
+    
+    servers = [EngineShardServer(index) for index in range(SHARDS)]
+    listeners = []
+    for server in servers:
+        server.engine.journal = server.escrow.journal = MemoryJournal()
+        listeners.append(await asyncio.start_unix_server(server.handle_client, path=server.path))
+    
+    client = ShardedEngineClient(SHARDS, str(tmp_path))
+    yield servers, client
+    
+    await client.stop()
+    for server, listener in zip(servers, listeners):
+        listener.close()
+        await server.balances.close()
+        await server.engine.journal.stop()
+
+
+def fund(servers, user_id: int, currency: str, available: int):
+    owner = servers[owner_for(user_id, SHARDS)].balances.owner
+    owner.users.add(user_id)
+    owner.accounts[(user_id, currency)] = Account(available, 0)
+
+
+def balance(servers, user_id: int, currency: str):
+    account = servers[owner_for(user_id, SHARDS)].balances.owner.accounts.get((user_id, currency), Account(0, 0))
+    return account.available, account.locked
+
+
+async def drain(servers):
+    for _ in range(10):
+        for server in servers:
+            server.balances.flush()
+        await asyncio.sleep(0.01)
+
+
+async def test_fill_settles_into_each_users_owner_shard(shards):
+    servers, client = shards
+    units = servers[0].balances.owner.to_units
+    fund(servers, BUYER, "USDT", units(Decimal("100.1")))
+    fund(servers, SELLER, "BTC", units(Decimal("1")))
+    
+    sell = order(1, SELLER, OrderSide.SELL, "1", "100")
+    buy = order(2, BUYER, OrderSide.BUY, "1", "100")
+    assert await client.place_order(sell) == []
+    assert len(await client.place_order(buy)) == 1
+    await drain(servers)
+    
+    assert buy.status == OrderStatus.FILLED
+    assert balance(servers, BUYER, "USDT") == (0, 0)
+    assert balance(servers, BUYER, "BTC") == (units(Decimal("1")), 0)
+    assert balance(servers, SELLER, "BTC") == (0, 0)
+    assert balance(servers, SELLER, "USDT") == (units(Decimal("100")), 0)
+    assert not servers[MATCHER].escrow.grants
+    
+    journal = servers[MATCHER].engine.journal
+    await journal.barrier()
+    assert journal.balances[(BUYER, "USDT")] == [-units(Decimal("100.1")), 0]
+    assert journal.balances[(SELLER, "USDT")] == [units(Decimal("100")), 0]
+
+
+async def test_remote_owner_rejects_and_releases_reservations(shards):
+    servers, client = shards
+    units = servers[0].balances.owner.to_units
+    fund(servers, BUYER, "USDT", units(Decimal("100")))
+    
+    too_large = order(1, BUYER, OrderSide.BUY, "1", "100")
+    await client.place_order(too_large)
+    assert too_large.status == OrderStatus.REJECTED
+    assert balance(servers, BUYER, "USDT") == (units(Decimal("100")), 0)
+    
+    resting = order(2, BUYER, OrderSide.BUY, "0.5", "90")
+    await client.place_order(resting)
+    assert balance(servers, BUYER, "USDT") == (units(Decimal("54.955")), units(Decimal("45.045")))
+    
+    assert await client.cancel_user_orders(BUYER, SYMBOL) == 1
+    await drain(servers)
+    assert balance(servers, BUYER, "USDT") == (units(Decimal("100")), 0)
+
+
+async def test_balance_adjustments_go_to_the_owner_only(shards):
+    servers, client = shards
+    units = servers[0].balances.owner.to_units
+    fund(servers, BUYER, "USDT", 0)
+    
+    assert await client.adjust_balance(BUYER, "USDT", Decimal("5"), Decimal("0"))
+    assert not await client.adjust_balance(BUYER, "USDT", Decimal("-6"), Decimal("0"))
+    assert await client.adjust_balances([(BUYER, "USDT", Decimal("-6")), (SELLER, "USDT", Decimal("1"))]) == [
+        (BUYER, "USDT", Decimal("-6"))
+    ]
+    
+    assert balance(servers, BUYER, "USDT") == (units(Decimal("5")), 0)
+    assert (BUYER, "USDT") not in servers[1 - owner_for(BUYER, SHARDS)].balances.owner.accounts
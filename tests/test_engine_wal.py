@@ -0,0 +1,108 @@
+from app.services.engine_wal import FRAME_HEADER, EngineWAL
+import os
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def open_wal(directory) -> tuple:
+    wal = EngineWAL(str(directory), 1, 3600)
+    return wal, wal.recover()
+
+
+async def write_records(wal: EngineWAL, count: int):
+    for index in range(count):
+        wal.append(("place", index))
+    await wal.stop()
+
+
+async def test_recover_replays_records_and_journal_batches(tmp_path):
+    wal, _ = open_wal(tmp_path)
+    wal.append(("place", 1))
+    wal.append(("journal", "batch"))
+    wal.append(("cancel", 2))
+    await wal.stop()
+    
+    wal, (books, records, journal) = open_wal(tmp_path)
+    
+    assert books == {}
+    assert records == [("place", 1), ("cancel", 2)]
+    assert journal == [(2, "batch")]
+    assert wal.lsn == 3
+    await wal.stop()
+
+
+async def test_recover_skips_journal_batches_already_committed(tmp_path):
+    wal, _ = open_wal(tmp_path)
+    for index in range(3):
+        wal.append(("journal", index))
+    await wal.stop()
+    
+    wal = EngineWAL(str(tmp_path), 1, 3600)
+    _, _, journal = wal.recover(journal_lsn=2)
+    
+    assert journal == [(3, 2)]
+    await wal.stop()
+
+
+@pytest.mark.parametrize("tail", [
+    FRAME_HEADER.pack(64) + b"partial",
+    FRAME_HEADER.pack(4) + b"junk",
+    b"\x01\x02"
+], ids=["partial-frame", "unpicklable-frame", "partial-header"])
+async def test_torn_tail_of_fresh_segment_is_truncated(tmp_path, tail):
+    wal, _ = open_wal(tmp_path)
+    await write_records(wal, 3)
+    with open(wal.segment_path(4), "ab") as f:
+        f.write(tail)
+    
+    wal, (_, records, _) = open_wal(tmp_path)
+    assert len(records) == 3
+    assert wal.lsn == 3
+    assert os.path.getsize(wal.segment_path(4)) == 0
+    await write_records(wal, 2)
+    
+    wal, (_, records, _) = open_wal(tmp_path)
+    assert records == [("place", 0), ("place", 1), ("place", 2), ("place", 0), ("place", 1)]
+    assert wal.lsn == 5
+    await wal.stop()
+
+
+async def test_torn_tail_inside_segment_is_truncated(tmp_path):
+    wal, _ = open_wal(tmp_path)
+    await write_records(wal, 2)
+    path = wal.segment_path(1)
+    size = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(FRAME_HEADER.pack(32) + b"torn")
+    
+    wal, (_, records, _) = open_wal(tmp_path)
+    assert os.path.getsize(path) == size
+    await write_records(wal, 1)
+    
+    wal, (_, records, _) = open_wal(tmp_path)
+    assert len(records) == 3
+    assert wal.lsn == 3
+    await wal.stop()
+
+
+async def test_checkpoint_keeps_segments_the_journal_still_needs(tmp_path):
+    wal, _ = open_wal(tmp_path)
+    wal.start(lambda: {}, lambda: 0)
+    for index in range(3):
+        wal.append(("journal", index))
+    await wal.checkpoint(lambda: {}, 1)
+    wal.append(("place", 1))
+    await wal.checkpoint(lambda: {}, 1)
+    
+    assert os.path.exists(wal.segment_path(1))
+    
+    await wal.checkpoint(lambda: {}, 4)
+    assert not os.path.exists(wal.segment_path(1))
+    await wal.stop()
+    
+    wal, (_, records, journal) = open_wal(tmp_path)
+    assert records == []
+    assert journal == []
+    assert wal.lsn == 4
+    await wal.stop()
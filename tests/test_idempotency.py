@@ -0,0 +1,137 @@
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from app.services.idempotency import REPLAYED_HEADER, UNKNOWN_OUTCOME, IdempotencyStore
+import asyncio
+import json
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class Payload(BaseModel):
+    amount: int
+
+
+class CountingHandler:
+    def __init__(self, outcome=None):
+        self.calls = 0
+        self.outcome = outcome
+    
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return {"calls": self.calls}
+
+
+def body(response) -> dict:
+    return json.loads(response.body)
+
+
+async def test_replayed_key_returns_the_stored_response():
+    store = IdempotencyStore(60, 5, 100)
+    handler = CountingHandler()
+    
+    first = await store.execute(1, "deposit", "key", Payload(amount=1), handler)
+    second = await store.execute(1, "deposit", "key", Payload(amount=1), handler)
+    
+    assert handler.calls == 1
+    assert body(first) == body(second) == {"calls": 1}
+    assert REPLAYED_HEADER.lower() not in first.headers
+    assert second.headers[REPLAYED_HEADER] == "true"
+
+
+async def test_concurrent_requests_with_one_key_run_the_handler_once():
+    store = IdempotencyStore(60, 5, 100)
+    handler = CountingHandler()
+    
+    responses = await asyncio.gather(*(
+        store.execute(1, "deposit", "key", Payload(amount=1), handler) for _ in range(5)
+    ))
+    
+    assert handler.calls == 1
+    assert all(body(response) == {"calls": 1} for response in responses)
+
+
+async def test_key_reused_with_a_different_body_is_rejected():
+    store = IdempotencyStore(60, 5, 100)
+    await store.execute(1, "deposit", "key", Payload(amount=1), CountingHandler())
+    
+    with pytest.raises(HTTPException) as error:
+        await store.execute(1, "deposit", "key", Payload(amount=2), CountingHandler())
+    assert error.value.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("code", [status.HTTP_400_BAD_REQUEST, status.HTTP_500_INTERNAL_SERVER_ERROR])
+async def test_error_responses_are_stored_and_not_re_executed(code):
+    store = IdempotencyStore(60, 5, 100)
+    handler = CountingHandler(HTTPException(status_code=code, detail="failed"))
+    
+    first = await store.execute(1, "withdraw", "key", Payload(amount=1), handler)
+    second = await store.execute(1, "withdraw", "key", Payload(amount=1), handler)
+    
+    assert handler.calls == 1
+    assert first.status_code == second.status_code == code
+    assert body(second) == {"detail": "failed"}
+
+
+async def test_unexpected_failure_poisons_the_key():
+    store = IdempotencyStore(60, 5, 100)
+    handler = CountingHandler(RuntimeError("journal write failed"))
+    
+    with pytest.raises(RuntimeError):
+        await store.execute(1, "place_order", "key", Payload(amount=1), handler)
+    replay = await store.execute(1, "place_order", "key", Payload(amount=1), handler)
+    
+    assert handler.calls == 1
+    assert replay.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert body(replay) == {"detail": UNKNOWN_OUTCOME}
+
+
+async def test_service_unavailable_releases_the_key():
+    store = IdempotencyStore(60, 5, 100)
+    handler = CountingHandler(HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="halted"))
+    
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await store.execute(1, "place_order", "key", Payload(amount=1), handler)
+    
+    handler.outcome = None
+    response = await store.execute(1, "place_order", "key", Payload(amount=1), handler)
+    
+    assert handler.calls == 3
+    assert body(response) == {"calls": 3}
+
+
+def test_rejected_withdrawal_is_replayed_without_running_again(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import wallet
+    from app.api.auth import get_current_user
+    from app.core.database import get_db
+    from app.models.user import User
+    
+    calls = []
+    
+    async def simulate_withdrawal(user_id, currency, amount, db):
+        calls.append(amount)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Insufficient balance")
+    
+    monkeypatch.setattr(wallet.wallet_service, "simulate_withdrawal", simulate_withdrawal)
+    monkeypatch.setattr(wallet, "idempotency_store", IdempotencyStore(60, 5, 100))
+    app = FastAPI()
+    app.include_router(wallet.router)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1)
+    app.dependency_overrides[get_db] = lambda: None
+    client = TestClient(app)
+    
+    responses = [
+        client.post("/wallet/withdraw", json={"currency": "USDT", "amount": "5"}, headers={"Idempotency-Key": "w1"})
+        for _ in range(2)
+    ]
+    
+    assert [response.status_code for response in responses] == [400, 400]
+    assert responses[1].json() == {"detail": "Insufficient balance"}
+    assert responses[1].headers[REPLAYED_HEADER] == "true"
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+from decimal import Decimal
+from sqlalchemy import select
+from app.models.trading import JournalPosition
+from app.models.wallet import Wallet
+from app.services.ledger import COMPACTION_POSITION, EXTERNAL, Ledger
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def deposit(ledger: Ledger, session_factory, amount: str):
+    async with session_factory() as db:
+        await ledger.append(db, {(1, "USDT"): [Decimal(amount), Decimal("0")]}, "deposit", EXTERNAL)
+        await db.commit()
+
+
+async def test_compaction_folds_once_and_keeps_its_position_across_restarts(session_factory):
+    async with session_factory() as db:
+        db.add(Wallet(user_id=1, currency="USDT", available_balance=0, locked_balance=0))
+        await db.commit()
+    
+    ledger = Ledger(60, session_factory)
+    await deposit(ledger, session_factory, "10")
+    await deposit(ledger, session_factory, "5")
+    
+    async with session_factory() as db:
+        assert await ledger.compact(db) == 0
+    async with session_factory() as db:
+        assert await ledger.compact(db) == 1
+    
+    async with session_factory() as db:
+        wallet = (await db.execute(select(Wallet))).scalar_one()
+        position = (await db.execute(
+            select(JournalPosition.lsn).where(JournalPosition.name == COMPACTION_POSITION)
+        )).scalar()
+        balances = await ledger.get_balances(db, [1])
+    
+    assert (wallet.available_balance, wallet.ledger_entry_id) == (Decimal("15"), 3)
+    assert position == 4
+    assert balances[(1, "USDT")] == (Decimal("15"), Decimal("0"))
+    
+    restarted = Ledger(60, session_factory)
+    await deposit(restarted, session_factory, "1")
+    async with session_factory() as db:
+        assert await restarted.compact(db) == 0
+        assert restarted.watermark == 4
+    async with session_factory() as db:
+        assert await restarted.compact(db) == 1
+        assert restarted.watermark == 6
+        wallet = (await db.execute(select(Wallet))).scalar_one()
+        assert (wallet.available_balance, wallet.ledger_entry_id) == (Decimal("16"), 5)
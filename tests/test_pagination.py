@@ -0,0 +1,53 @@
+from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_page, set_next_cursor, split_page
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+STARTED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+async def test_pages_walk_every_row_once_newest_first(session_factory):
+    async with session_factory() as db:
+        db.add_all(
+            Order(id=order_id, user_id=1 if order_id % 4 else 2, symbol="BTCUSDT", order_type=OrderType.LIMIT,
+                  side=OrderSide.BUY, status=OrderStatus.PENDING, quantity=Decimal("1"), price=Decimal("100"),
+                  remaining_quantity=Decimal("1"), created_at=STARTED + timedelta(seconds=order_id // 3))
+            for order_id in range(1, 12)
+        )
+        await db.commit()
+    
+    seen = []
+    cursor = None
+    async with session_factory() as db:
+        while True:
+            result = await db.execute(
+                keyset_page(select(Order).where(Order.user_id == 1), Order.created_at, Order.id, cursor, 3)
+            )
+            page, cursor = split_page(result.scalars().all(), 3, "created_at")
+            seen.extend(order.id for order in page)
+            
+            response = Response()
+            set_next_cursor(response, cursor)
+            assert response.headers.get(NEXT_CURSOR_HEADER) == cursor
+            if cursor is None:
+                break
+            assert len(page) == 3
+    
+    assert seen == [11, 10, 9, 7, 6, 5, 3, 2, 1]
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    timestamp = datetime(2026, 3, 4, 5, 6, 7, 890123, tzinfo=timezone.utc)
+    cursor = encode_cursor(timestamp, 42)
+    
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (timestamp, 42)
+    for garbage in ["", "not-a-cursor", encode_cursor(timestamp, 1)[:-3] + "!!!"]:
+        with pytest.raises(HTTPException) as raised:
+            decode_cursor(garbage)
+        assert raised.value.status_code == 400
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.models.wallet import LedgerEntry, Transaction, Wallet
+from app.services.balance_book import Account, BalanceBook
+from app.services.ledger import ledger
+from app.services.trade_journal import TradeJournal
+from app.services.trade_tape import TradeTape
+from app.services.trading_engine import TradingEngine
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+BUYER, SELLER = 1, 2
+FUNDED = {(BUYER, "USDT"): Decimal("1000"), (BUYER, "BTC"): Decimal("0"),
+          (SELLER, "USDT"): Decimal("0"), (SELLER, "BTC"): Decimal("3")}
+WALLETS = sorted(FUNDED)
+
+
+def limit_order(order_id: int, user_id: int, side: OrderSide, quantity: str, price: str) -> Order:
+    return Order(id=order_id, user_id=user_id, symbol="BTCUSDT", order_type=OrderType.LIMIT, side=side,
+                 status=OrderStatus.PENDING, quantity=Decimal(quantity), price=Decimal(price),
+                 filled_quantity=Decimal("0"), remaining_quantity=Decimal(quantity),
+                 created_at=datetime.now(timezone.utc))
+
+
+async def test_fills_in_a_batch_post_once_per_account(session_factory):
+    async with session_factory() as db:
+        db.add_all(Wallet(user_id=user_id, currency=currency, available_balance=amount, locked_balance=0)
+                   for (user_id, currency), amount in FUNDED.items())
+        await db.commit()
+    
+    journal = TradeJournal(1000, 1000, session_factory=session_factory)
+    balances = BalanceBook(journal, session_factory=session_factory)
+    engine = TradingEngine(journal=journal, tape=TradeTape(100), balances=balances)
+    order_book = engine.order_books["BTCUSDT"]
+    balances.users.update({BUYER, SELLER})
+    for key, amount in FUNDED.items():
+        balances.accounts[key] = Account(balances.to_units(amount), 0)
+    
+    for order_id in range(10, 13):
+        engine.process_order(limit_order(order_id, SELLER, OrderSide.SELL, "1", "100"), order_book)
+    trades = engine.process_order(limit_order(1, BUYER, OrderSide.BUY, "3", "100"), order_book)
+    await journal.barrier()
+    
+    async with session_factory() as db:
+        postings = (await db.execute(
+            select(LedgerEntry.user_id, LedgerEntry.currency, LedgerEntry.account, func.count())
+            .group_by(LedgerEntry.user_id, LedgerEntry.currency, LedgerEntry.account)
+        )).all()
+        posting_ids = (await db.execute(select(func.count(LedgerEntry.posting_id.distinct())))).scalar()
+        transactions = (await db.execute(
+            select(Transaction.user_id, Transaction.currency, func.count())
+            .group_by(Transaction.user_id, Transaction.currency)
+        )).all()
+        settled = await ledger.get_balances(db, [BUYER, SELLER])
+    
+    assert len(trades) == 3
+    assert posting_ids == 1
+    assert sorted((user_id, currency) for user_id, currency, _, _ in postings if user_id) == WALLETS
+    assert all(count == 1 for *_, count in postings)
+    assert sorted((user_id, currency) for user_id, currency, count in transactions if count == 1) == WALLETS
+    assert settled[(BUYER, "USDT")] == (Decimal("699.7"), Decimal("0"))
+    assert settled[(BUYER, "BTC")] == (Decimal("3"), Decimal("0"))
+    assert settled[(SELLER, "USDT")] == (Decimal("300"), Decimal("0"))
+    assert settled[(SELLER, "BTC")] == (Decimal("0"), Decimal("0"))
+    await journal.stop()
@@ -0,0 +1,33 @@
+from decimal import Decimal
+from app.models.trading import OrderSide, OrderType
+from app.services.stop_triggers import TriggerIndex, TriggerOrder
+
+
+def trigger(order_id: int, side: OrderSide, order_type: OrderType, stop_price: int) -> TriggerOrder:
+    return TriggerOrder(order_id, 1, "BTCUSDT", side, order_type, Decimal("1"), Decimal("100"), stop_price)
+
+
+def test_falling_stops_release_highest_stop_first_and_fifo_within_a_price():
+    index = TriggerIndex()
+    for order_id, stop_price in [(1, 95), (2, 97), (3, 95), (4, 90), (5, 97)]:
+        index.arm(trigger(order_id, OrderSide.SELL, OrderType.STOP_LOSS, stop_price))
+    index.disarm(5)
+    
+    assert not index.crossed(98)
+    assert index.crossed(97)
+    assert [order.id for order in index.release(95)] == [2, 1, 3]
+    assert list(index.armed) == [4]
+    assert index.last_price == 95
+
+
+def test_rising_and_falling_stops_are_released_by_the_same_price():
+    index = TriggerIndex()
+    index.arm(trigger(1, OrderSide.BUY, OrderType.STOP_LOSS, 105))
+    index.arm(trigger(2, OrderSide.SELL, OrderType.TAKE_PROFIT, 103))
+    index.arm(trigger(3, OrderSide.BUY, OrderType.TAKE_PROFIT, 100))
+    index.arm(trigger(4, OrderSide.SELL, OrderType.STOP_LOSS, 99))
+    
+    assert [order.id for order in index.release(104)] == [2]
+    assert [order.id for order in index.release(99)] == [3, 4]
+    assert [order.id for order in index.release(106)] == [1]
+    assert not index.armed and not index.user_orders
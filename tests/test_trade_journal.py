@@ -0,0 +1,118 @@
+from decimal import Decimal
+from datetime import datetime, timezone
+from sqlalchemy import exc
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.services.trade_journal import JournalHaltedError, TradeJournal
+from app.services.trading_engine import TradingEngine
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingJournal(TradeJournal):
+    def __init__(self):
+        super().__init__(1, 1000, halt_retry_ms=1)
+        self.written = []
+        self.bad = set()
+        self.outages = 0
+    
+    async def write_batch(self, inserts, trades, orders, cancels, wallets, balances, lsn=0):
+        if self.outages:
+            self.outages -= 1
+            raise exc.OperationalError("INSERT", {}, ConnectionResetError("connection reset"))
+        if self.bad.intersection(cancels):
+            raise exc.IntegrityError("INSERT", {}, ValueError("duplicate key"))
+        self.written.append(list(cancels))
+
+
+def close_batch(journal: TradeJournal, order_id: int, lsn: int):
+    journal.record_cancellations([order_id])
+    return journal.barrier(lsn)
+
+
+async def test_unwritable_batch_halts_the_journal_instead_of_being_dropped():
+    journal = RecordingJournal()
+    journal.bad.add(2)
+    waiters = [close_batch(journal, order_id, order_id) for order_id in (1, 2, 3)]
+    
+    await journal.flush()
+    
+    assert journal.written == [[1]]
+    assert isinstance(journal.halted, exc.IntegrityError)
+    assert journal.committed_lsn == 1
+    assert [batch.cancels for batch in journal.closed] == [[2], [3]]
+    assert waiters[0].done()
+    assert not waiters[1].done() and not waiters[2].done()
+    
+    await journal.flush()
+    assert journal.committed_lsn == 1
+    assert journal.halted is not None
+    
+    journal.bad.clear()
+    await journal.flush()
+    
+    assert journal.written[1:] == [[2, 3]]
+    assert journal.halted is None
+    assert journal.committed_lsn == 3
+    assert all(waiter.done() and waiter.exception() is None for waiter in waiters)
+    await journal.stop()
+
+
+async def test_transient_failure_retries_the_whole_batch_without_halting():
+    journal = RecordingJournal()
+    journal.outages = 1000
+    waiters = [close_batch(journal, order_id, order_id) for order_id in (1, 2, 3)]
+    
+    await journal.flush()
+    await journal.flush()
+    
+    assert journal.written == []
+    assert journal.halted is None
+    assert [batch.cancels for batch in journal.closed] == [[1], [2], [3]]
+    assert not any(waiter.done() for waiter in waiters)
+    
+    journal.outages = 0
+    await journal.flush()
+    
+    assert journal.written == [[1, 2, 3]]
+    assert journal.committed_lsn == 3
+    assert all(waiter.done() for waiter in waiters)
+    await journal.stop()
+
+
+async def test_rejected_batch_is_bisected_so_its_neighbours_commit():
+    journal = RecordingJournal()
+    journal.bad.add(3)
+    waiters = [close_batch(journal, order_id, order_id) for order_id in (1, 2, 3, 4)]
+    
+    await journal.flush()
+    
+    assert journal.written == [[1, 2]]
+    assert journal.committed_lsn == 2
+    assert [batch.cancels for batch in journal.closed] == [[3], [4]]
+    assert [waiter.done() for waiter in waiters] == [True, True, False, False]
+    
+    journal.bad.clear()
+    await journal.flush()
+    
+    assert journal.written[1:] == [[3, 4]]
+    assert journal.committed_lsn == 4
+    await journal.stop()
+
+
+async def test_halted_journal_refuses_new_orders():
+    journal = RecordingJournal()
+    journal.halted = exc.IntegrityError("INSERT", {}, ValueError("duplicate key"))
+    engine = TradingEngine(journal=journal)
+    order = Order(id=1, user_id=1, symbol="BTCUSDT", order_type=OrderType.LIMIT, side=OrderSide.BUY,
+                  status=OrderStatus.PENDING, quantity=Decimal("1"), price=Decimal("100"),
+                  filled_quantity=Decimal("0"), remaining_quantity=Decimal("1"),
+                  created_at=datetime.now(timezone.utc))
+    
+    with pytest.raises(JournalHaltedError):
+        await engine.place_order(order)
+    
+    assert order.status == OrderStatus.PENDING
+    assert not engine.order_books["BTCUSDT"].order_map
+    await engine.stop()
+    await journal.stop()
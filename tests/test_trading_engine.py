@@ -0,0 +1,106 @@
+from decimal import Decimal
+from datetime import datetime, timezone
+from typing import Optional
+from app.models.trading import Order, OrderSide, OrderStatus, OrderType
+from app.services.balance_book import Account, BalanceBook
+from app.services.trade_journal import TradeJournal
+from app.services.trade_tape import TradeTape
+from app.services.trading_engine import TradingEngine
+import pytest
+
+BUYER, SELLER = 1, 2
+
+
+def make_order(order_id: int, user_id: int, side: OrderSide, quantity: str, price: Optional[str],
+               order_type: OrderType = OrderType.LIMIT, stop_price: Optional[str] = None) -> Order:
+    return Order(id=order_id, user_id=user_id, symbol="BTCUSDT", order_type=order_type, side=side,
+                 status=OrderStatus.PENDING, quantity=Decimal(quantity),
+                 price=Decimal(price) if price else None, stop_price=Decimal(stop_price) if stop_price else None,
+                 filled_quantity=Decimal("0"), remaining_quantity=Decimal(quantity),
+                 created_at=datetime.now(timezone.utc))
+
+
+@pytest.fixture
+def engine():
+    journal = TradeJournal(1, 1000)
+    balances = BalanceBook(journal)
+    balances.users.update({BUYER, SELLER})
+    for key in [(BUYER, "USDT"), (SELLER, "BTC")]:
+        balances.accounts[key] = Account(balances.to_units(Decimal("1000")), 0)
+    return TradingEngine(journal=journal, tape=TradeTape(100), balances=balances)
+
+
+def balance(engine: TradingEngine, user_id: int, currency: str):
+    account = engine.balances.accounts.get((user_id, currency), Account(0, 0))
+    return engine.balances.from_units(account.available), engine.balances.from_units(account.locked)
+
+
+def test_buy_taker_matches_best_price_first_and_pays_the_fee(engine):
+    order_book = engine.order_books["BTCUSDT"]
+    for order in [make_order(1, SELLER, OrderSide.SELL, "1", "101"), make_order(2, SELLER, OrderSide.SELL, "1", "100"),
+                  make_order(3, SELLER, OrderSide.SELL, "1", "100")]:
+        assert engine.process_order(order, order_book) == []
+    
+    buy = make_order(4, BUYER, OrderSide.BUY, "2.5", "101")
+    trades = engine.process_order(buy, order_book)
+    
+    assert [(trade.maker_order_id, trade.quantity, trade.price) for trade in trades] == [
+        (2, Decimal("1"), Decimal("100")), (3, Decimal("1"), Decimal("100")), (1, Decimal("0.5"), Decimal("101"))
+    ]
+    assert [trade.fee for trade in trades] == [Decimal("0.1"), Decimal("0.1"), Decimal("0.0505")]
+    assert buy.status == OrderStatus.FILLED
+    assert balance(engine, BUYER, "USDT") == (Decimal("1000") - Decimal("250.7505"), 0)
+    assert balance(engine, BUYER, "BTC") == (Decimal("2.5"), 0)
+    assert balance(engine, SELLER, "USDT") == (Decimal("250.5"), 0)
+    assert balance(engine, SELLER, "BTC") == (Decimal("997"), Decimal("0.5"))
+
+
+def test_sell_taker_pays_the_fee_out_of_its_proceeds_and_maker_gets_its_fee_back(engine):
+    order_book = engine.order_books["BTCUSDT"]
+    engine.process_order(make_order(1, BUYER, OrderSide.BUY, "2", "100"), order_book)
+    
+    sell = make_order(2, SELLER, OrderSide.SELL, "1", "99")
+    trades = engine.process_order(sell, order_book)
+    
+    assert [(trade.quantity, trade.price, trade.fee) for trade in trades] == [(Decimal("1"), Decimal("100"),
+                                                                              Decimal("0.1"))]
+    assert balance(engine, SELLER, "USDT") == (Decimal("99.9"), 0)
+    assert balance(engine, BUYER, "BTC") == (Decimal("1"), 0)
+    assert balance(engine, BUYER, "USDT") == (Decimal("1000") - Decimal("200.1"), Decimal("100.1"))
+
+
+def test_maker_pays_no_fee_and_cancel_releases_the_rest(engine):
+    order_book = engine.order_books["BTCUSDT"]
+    buy = make_order(1, BUYER, OrderSide.BUY, "1", "100")
+    engine.process_order(buy, order_book)
+    engine.process_order(make_order(2, SELLER, OrderSide.SELL, "0.4", "100"), order_book)
+    
+    assert engine.process_cancel(buy, order_book)
+    assert not order_book.order_map
+    assert balance(engine, BUYER, "USDT") == (Decimal("1000") - Decimal("40"), 0)
+
+
+def test_unfunded_order_is_rejected_without_resting(engine):
+    order_book = engine.order_books["BTCUSDT"]
+    buy = make_order(1, BUYER, OrderSide.BUY, "10", "100")
+    
+    assert engine.process_order(buy, order_book) == []
+    assert buy.status == OrderStatus.REJECTED
+    assert not order_book.order_map
+    assert balance(engine, BUYER, "USDT") == (Decimal("1000"), 0)
+
+
+def test_triggered_stops_execute_in_crossing_order_then_in_arrival_order(engine):
+    order_book = engine.order_books["BTCUSDT"]
+    for order_id, price in enumerate(["100", "101", "102"], start=1):
+        engine.process_order(make_order(order_id, SELLER, OrderSide.SELL, "1", price), order_book)
+    for order_id, stop_price in [(10, "99"), (11, "98"), (12, "99"), (13, "105")]:
+        stop = make_order(order_id, BUYER, OrderSide.BUY, "1", "110", OrderType.STOP_LOSS, stop_price)
+        assert engine.process_order(stop, order_book) == []
+    
+    trades = engine.process_tick(order_book.instrument.to_ticks(Decimal("99")), order_book)
+    
+    assert [(trade.order_id, trade.price) for trade in trades] == [
+        (11, Decimal("100")), (10, Decimal("101")), (12, Decimal("102"))
+    ]
+    assert list(engine.triggers["BTCUSDT"].armed) == [13]
@@ -0,0 +1,29 @@
+from decimal import Decimal
+from sqlalchemy import func, select
+from app.models.wallet import LedgerEntry, Transaction
+from app.services.ledger import ledger
+from app.services.wallet_service import wallet_service
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_balance_updates_are_guarded_by_the_ledger_balance(session_factory):
+    async with session_factory() as db:
+        assert await wallet_service.apply_balance_update(1, "USDT", Decimal("10"), "deposit", db)
+        assert await wallet_service.apply_balance_update(1, "USDT", Decimal("4"), "lock", db)
+        assert not await wallet_service.apply_balance_update(1, "USDT", Decimal("6.00000001"), "withdrawal", db)
+        assert not await wallet_service.apply_balance_update(1, "USDT", Decimal("5"), "unlock", db)
+        assert await wallet_service.apply_balance_update(1, "USDT", Decimal("6"), "withdrawal", db)
+        assert not await wallet_service.apply_balance_update(2, "USDT", Decimal("1"), "withdrawal", db)
+    
+    async with session_factory() as db:
+        balances = await ledger.get_balances(db, [1])
+        transactions = (await db.execute(select(Transaction.type).order_by(Transaction.id))).scalars().all()
+        unbalanced = (await db.execute(
+            select(LedgerEntry.posting_id).group_by(LedgerEntry.posting_id).having(func.sum(LedgerEntry.amount) != 0)
+        )).all()
+    
+    assert balances[(1, "USDT")] == (Decimal("0"), Decimal("4"))
+    assert transactions == ["deposit", "lock", "withdrawal"]
+    assert not unbalanced